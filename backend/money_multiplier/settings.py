@@ -371,6 +371,12 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
     'cache-control',
     'pragma',
+    'idempotency-key',
+]
+
+# Response headers readable by the frontend
+CORS_EXPOSE_HEADERS = [
+    'idempotent-replayed',
 ]
 
 # Allow specific methods
@@ -408,3 +414,122 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.JSONParser',
     ],
 }
+
+# Kite Connect API root; point at `python manage.py run_kite_simulator` for offline testing
+KITE_API_ROOT = os.getenv('KITE_API_ROOT', 'https://api.kite.trade')
+
+# Kite Connect client pool
+# Seconds a pooled client trusts its cached credentials before re-reading the Authenticator row
+KITE_CLIENT_TTL = int(os.getenv('KITE_CLIENT_TTL', '60'))
+# Keep-alive connections per user client (should cover the bulk order concurrency)
+KITE_HTTP_POOL_SIZE = int(os.getenv('KITE_HTTP_POOL_SIZE', '10'))
+# Seconds before a Kite HTTP request times out
+KITE_HTTP_TIMEOUT = float(os.getenv('KITE_HTTP_TIMEOUT', '7'))
+# Attempts per Kite call (first try included) and full-jitter backoff bounds in seconds;
+# order POSTs are only retried when Kite never received them (see circuit_breaker)
+KITE_RETRY_MAX_ATTEMPTS = int(os.getenv('KITE_RETRY_MAX_ATTEMPTS', '3'))
+KITE_RETRY_BASE_DELAY = float(os.getenv('KITE_RETRY_BASE_DELAY', '0.2'))
+KITE_RETRY_MAX_DELAY = float(os.getenv('KITE_RETRY_MAX_DELAY', '2'))
+# Consecutive transient failures that open a user's breaker for an endpoint class, and
+# seconds it stays open before a probe call is let through
+KITE_BREAKER_FAILURE_THRESHOLD = int(os.getenv('KITE_BREAKER_FAILURE_THRESHOLD', '5'))
+KITE_BREAKER_RESET_TIMEOUT = float(os.getenv('KITE_BREAKER_RESET_TIMEOUT', '30'))
+
+# Local instrument master (memory-mapped, shared by all workers); refresh daily with
+# `python manage.py refresh_instruments`
+INSTRUMENT_MASTER_DIR = os.getenv('INSTRUMENT_MASTER_DIR', str(BASE_DIR / 'data' / 'instruments'))
+
+# Per-process quote cache: seconds a quote is reused, seconds an unknown symbol is
+# remembered, and LRU capacity
+QUOTE_CACHE_TTL = float(os.getenv('QUOTE_CACHE_TTL', '2'))
+QUOTE_CACHE_NEGATIVE_TTL = float(os.getenv('QUOTE_CACHE_NEGATIVE_TTL', '300'))
+QUOTE_CACHE_MAX_ENTRIES = int(os.getenv('QUOTE_CACHE_MAX_ENTRIES', '5000'))
+
+# Kite API rate limits (requests per second per API key), shared by all processes on the host
+KITE_RATE_LIMITS = {
+    'quote': float(os.getenv('KITE_QUOTE_RATE_LIMIT', '1')),
+    'historical': float(os.getenv('KITE_HISTORICAL_RATE_LIMIT', '3')),
+    'order': float(os.getenv('KITE_ORDER_RATE_LIMIT', '10')),
+    'gtt': float(os.getenv('KITE_GTT_RATE_LIMIT', '10')),
+    'default': float(os.getenv('KITE_DEFAULT_RATE_LIMIT', '10')),
+}
+KITE_RATE_LIMIT_DIR = os.getenv('KITE_RATE_LIMIT_DIR', '/tmp/kite-ratelimit')
+# Longest a caller waits for a token before giving up
+KITE_RATE_LIMIT_MAX_WAIT = float(os.getenv('KITE_RATE_LIMIT_MAX_WAIT', '10'))
+
+# Bulk order placement
+BULK_ORDER_MAX_WORKERS = int(os.getenv('BULK_ORDER_MAX_WORKERS', '8'))
+BULK_ORDER_MAX_BASKET = int(os.getenv('BULK_ORDER_MAX_BASKET', '100'))
+# Concurrent GTT requests when arming all open trades
+BULK_GTT_MAX_WORKERS = int(os.getenv('BULK_GTT_MAX_WORKERS', '8'))
+# Users reconciled in parallel by `python manage.py reconcile_gtts`
+GTT_RECONCILE_MAX_WORKERS = int(os.getenv('GTT_RECONCILE_MAX_WORKERS', '4'))
+# Users synced in parallel by `python manage.py sync_portfolio`
+PORTFOLIO_SYNC_MAX_WORKERS = int(os.getenv('PORTFOLIO_SYNC_MAX_WORKERS', '4'))
+
+# Chartink screener client: session/CSRF token lifetime if Chartink's cookies do not say,
+# request timeout and keep-alive connections
+CHARTINK_BASE_URL = os.getenv('CHARTINK_BASE_URL', 'https://chartink.com')
+CHARTINK_SESSION_TTL = int(os.getenv('CHARTINK_SESSION_TTL', '3600'))
+CHARTINK_TIMEOUT = float(os.getenv('CHARTINK_TIMEOUT', '15'))
+CHARTINK_MAX_CONNECTIONS = int(os.getenv('CHARTINK_MAX_CONNECTIONS', '8'))
+
+# Screener result cache: entries live until the scan clause's next candle close (IST
+# market hours) plus a grace period for Chartink to publish the closed candle
+SCREENER_CACHE_MAX_ENTRIES = int(os.getenv('SCREENER_CACHE_MAX_ENTRIES', '500'))
+SCREENER_CACHE_CLOSE_GRACE = int(os.getenv('SCREENER_CACHE_CLOSE_GRACE', '120'))
+# Exchange holidays (ISO dates, comma separated) on which no candles close
+NSE_HOLIDAYS = [day.strip() for day in os.getenv('NSE_HOLIDAYS', '').split(',') if day.strip()]
+
+# Screener scheduler (`python manage.py run_screener_scheduler`): seconds between
+# checks for due screeners, and before a failed screener is tried again
+SCREENER_SCHEDULER_INTERVAL = float(os.getenv('SCREENER_SCHEDULER_INTERVAL', '30'))
+SCREENER_SCHEDULER_RETRY_DELAY = int(os.getenv('SCREENER_SCHEDULER_RETRY_DELAY', '300'))
+
+# Where screeners run: "chartink" (POST every clause to chartink.com), "local" (evaluate
+# clauses with the local scan engine over the OHLCV store) or "auto" (local when the
+# clause is supported and the store has the latest session, Chartink otherwise)
+SCREENER_ENGINE = os.getenv('SCREENER_ENGINE', 'chartink')
+
+# OHLCV store: directory of memory-mapped candle files, and how many daily dates the
+# local scan engine's panel holds
+OHLCV_STORE_DIR = os.getenv('OHLCV_STORE_DIR', str(BASE_DIR / 'data' / 'ohlcv'))
+OHLCV_PANEL_DAYS = int(os.getenv('OHLCV_PANEL_DAYS', '500'))
+# Concurrent kite.historical_data calls of `python manage.py download_history` (they
+# also wait on the historical rate limit above)
+HISTORICAL_DOWNLOAD_WORKERS = int(os.getenv('HISTORICAL_DOWNLOAD_WORKERS', '3'))
+# Worker processes for `python manage.py backtest_screener` parameter sweeps
+BACKTEST_WORKERS = int(os.getenv('BACKTEST_WORKERS', str(os.cpu_count() or 1)))
+# Scan clauses that set Trade.rsi / Trade.volume to "Yes" when they match the stock on
+# its entry date (empty to stop filling that field)
+TRADE_RSI_CLAUSE = os.getenv('TRADE_RSI_CLAUSE', 'latest rsi( 14 ) > 60')
+TRADE_VOLUME_CLAUSE = os.getenv('TRADE_VOLUME_CLAUSE', 'latest volume > 1 day ago sma( volume,20 ) * 1.5')
+
+# Idempotency-Key rows for order endpoints (shared by all workers through the database):
+# how long a stored response is replayed, and how long an unfinished request holds its key
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))
+IDEMPOTENCY_CLAIM_TTL = int(os.getenv('IDEMPOTENCY_CLAIM_TTL', '120'))
+# How long a duplicate waits for the original request to finish
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', '30'))
+
+# Order job worker (`python manage.py run_order_worker`)
+ORDER_WORKER_THREADS = int(os.getenv('ORDER_WORKER_THREADS', '4'))
+ORDER_WORKER_POLL_INTERVAL = float(os.getenv('ORDER_WORKER_POLL_INTERVAL', '0.5'))
+# Seconds after which a job still marked running is considered abandoned by a dead worker
+ORDER_JOB_STALE_AFTER = int(os.getenv('ORDER_JOB_STALE_AFTER', '300'))
+
+# Fill-aware GTT watcher (`python manage.py watch_buy_orders`)
+GTT_WATCHER_INTERVAL = float(os.getenv('GTT_WATCHER_INTERVAL', '2'))
+GTT_WATCHER_MAX_WORKERS = int(os.getenv('GTT_WATCHER_MAX_WORKERS', '4'))
+
+# Shared-memory LTP table written by `python manage.py stream_ltp` (KiteTicker)
+LTP_CACHE_PATH = os.getenv(
+    'LTP_CACHE_PATH', '/dev/shm/kite-ltp.bin' if os.path.isdir('/dev/shm') else '/tmp/kite-ltp.bin'
+)
+# Slots in the table (power of two; at most 70% are used)
+LTP_CACHE_CAPACITY = int(os.getenv('LTP_CACHE_CAPACITY', '8192'))
+# Readers ignore the table if the streamer has not refreshed its heartbeat for this long
+LTP_CACHE_HEARTBEAT_TIMEOUT = float(os.getenv('LTP_CACHE_HEARTBEAT_TIMEOUT', '15'))
+# ...and any price without a tick for this long (seconds), falling back to a REST quote
+LTP_CACHE_MAX_AGE = float(os.getenv('LTP_CACHE_MAX_AGE', '300'))
+LTP_STREAM_REFRESH_INTERVAL = float(os.getenv('LTP_STREAM_REFRESH_INTERVAL', '60'))
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Authenticator, Trade, GlobalParameters, UserRoi, Screener
+from .models import User, Authenticator, Trade, GlobalParameters, UserRoi, Screener, ScreenerRun, OrderJob, BuyOrderWatch
 
 # Register your models here.
 
@@ -68,6 +68,10 @@ class TradeAdmin(admin.ModelAdmin):
             'fields': ('remarks',),
             'classes': ('collapse',)
         }),
+        ('Kite', {
+            'fields': ('kite_key', 'synced_at', 'gtt_id'),
+            'classes': ('collapse',)
+        }),
     )
     
     def get_queryset(self, request):
@@ -126,6 +130,28 @@ class ScreenerAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('created_by')
 
+@admin.register(ScreenerRun)
+class ScreenerRunAdmin(admin.ModelAdmin):
+    list_display = ('screener', 'ran_at', 'stock_count', 'latency_ms', 'expires_at', 'error')
+    list_filter = ('ran_at', 'screener')
+    search_fields = ('screener__screener_name', 'error')
+    ordering = ('-ran_at',)
+    date_hierarchy = 'ran_at'
+    readonly_fields = ('clause_hash',)
+
+    fieldsets = (
+        ('Run', {
+            'fields': ('screener', 'ran_at', 'expires_at', 'latency_ms', 'clause_hash', 'error')
+        }),
+        ('Results', {
+            'fields': ('symbols', 'prices')
+        }),
+    )
+
+    def stock_count(self, obj):
+        return len(obj.symbols)
+    stock_count.short_description = 'Stocks'
+
 @admin.register(GlobalParameters)
 class GlobalParametersAdmin(admin.ModelAdmin):
     list_display = ('key', 'value_preview', 'value_length')
@@ -148,6 +174,51 @@ class GlobalParametersAdmin(admin.ModelAdmin):
         return len(obj.value) if obj.value else 0
     value_length.short_description = 'Value Length'
 
+@admin.register(OrderJob)
+class OrderJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user_id', 'kind', 'status', 'step', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind', 'created_at')
+    search_fields = ('id', 'user_id', 'error')
+    ordering = ('-created_at',)
+    readonly_fields = ('id', 'created_at', 'updated_at', 'started_at', 'finished_at')
+    
+    fieldsets = (
+        ('Job', {
+            'fields': ('id', 'user_id', 'kind', 'status', 'step')
+        }),
+        ('Data', {
+            'fields': ('payload', 'result', 'error')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at', 'started_at', 'finished_at'),
+            'classes': ('collapse',)
+        }),
+    )
+
+@admin.register(BuyOrderWatch)
+class BuyOrderWatchAdmin(admin.ModelAdmin):
+    list_display = ('order_id', 'user_id', 'tradingsymbol', 'quantity', 'filled_quantity', 'gtt_id', 'gtt_quantity', 'status')
+    list_filter = ('status', 'order_status', 'created_at')
+    search_fields = ('order_id', 'user_id', 'tradingsymbol')
+    ordering = ('-created_at',)
+    readonly_fields = ('created_at', 'updated_at')
+    
+    fieldsets = (
+        ('Order', {
+            'fields': ('user_id', 'order_id', 'tradingsymbol', 'quantity', 'buy_price', 'job')
+        }),
+        ('Protection', {
+            'fields': ('stop_loss', 'target', 'gtt_id', 'gtt_quantity')
+        }),
+        ('State', {
+            'fields': ('status', 'order_status', 'filled_quantity', 'error')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at'),
+            'classes': ('collapse',)
+        }),
+    )
+
 # Customize Admin Site Headers
 admin.site.site_header = "Kite AlgoTrading Admin"
 admin.site.site_title = "Kite AlgoTrading Admin Portal"
@@ -0,0 +1,41 @@
+"""
+Django management command to place stop-loss/target GTTs for all open trades of a user
+"""
+from django.core.management.base import BaseCommand
+from trading.utils.bulk_gtt import arm_open_trades
+
+
+class Command(BaseCommand):
+    help = 'Place OCO GTTs (slp/tgtp) for every open trade of a user, skipping already protected ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='User ID whose open trades are armed')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and report without placing GTTs')
+        parser.add_argument(
+            '--no-skip-protected',
+            action='store_true',
+            help='Place GTTs even where an active GTT with the same symbol and quantity exists',
+        )
+
+    def handle(self, *args, **options):
+        results = arm_open_trades(
+            options['user'],
+            dry_run=options['dry_run'],
+            skip_protected=not options['no_skip_protected'],
+        )
+        if not results:
+            self.stdout.write('No open trades')
+            return
+        for result in results:
+            line = (f"{result['trade_id']:>6} {result['stock']:<15} qty={result['quantity']:<6} "
+                    f"sl={result['stop_loss']} tgt={result['target']} -> {result['status']}")
+            if result.get('gtt_id'):
+                line += f" (GTT {result['gtt_id']})"
+            if result.get('error'):
+                line += f": {result['error']}"
+            self.stdout.write(line)
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        summary = ', '.join(f'{count} {status}' for status, count in sorted(counts.items()))
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(results)} open trades: {summary}'))
@@ -0,0 +1,146 @@
+"""
+Django management command to backtest screeners over the local OHLCV store
+"""
+import itertools
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from trading.models import Screener, UserRoi
+from trading.utils.backtest import (
+    DEFAULT_MAX_HOLD, DEFAULT_STOP_PCT, DEFAULT_TARGET_PCT, OUTCOMES, backtest, load_backtest_panel, run_sweep,
+)
+from trading.utils.scan_engine import ScanClauseError, compile_clause
+
+
+def _numbers(values, default, cast=float):
+    """
+    ["2,3", "4"] -> [2.0, 3.0, 4.0]
+    """
+    if not values:
+        return [default]
+    try:
+        return [cast(number) for value in values for number in value.split(',') if number.strip()]
+    except ValueError:
+        raise CommandError(f"Invalid number in {values}")
+
+
+class Command(BaseCommand):
+    help = 'Backtest stored screeners (or a scan clause) on daily candles with the 3% stop / 9% target rules'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--screener', action='append', help='Screener to test (repeatable; default: all)')
+        parser.add_argument('--clause', help='Test this scan clause instead of stored screeners')
+        parser.add_argument('--from', dest='start', type=date.fromisoformat,
+                            help='First signal date, YYYY-MM-DD (default: five years ago)')
+        parser.add_argument('--to', dest='end', type=date.fromisoformat, help='Last date (default: today)')
+        parser.add_argument('--stop', action='append', help=f'Stop loss %% below entry (default {DEFAULT_STOP_PCT:g}); '
+                                                            'comma-separated or repeated values are swept')
+        parser.add_argument('--target', action='append', help=f'Target %% above entry (default {DEFAULT_TARGET_PCT:g}); swept')
+        parser.add_argument('--max-hold', action='append', help=f'Sessions before a trade is closed at the close '
+                                                                f'(default {DEFAULT_MAX_HOLD}); swept')
+        parser.add_argument('--entry', choices=['open', 'close'], default='open',
+                            help="Enter at the next session's open (default) or the signal day's close")
+        parser.add_argument('--user', help="Size positions with this user's UserRoi (rpt, ipt, total_capital)")
+        parser.add_argument('--capital', type=float, help='Capital for portfolio returns (overrides --user)')
+        parser.add_argument('--rpt', type=float, help='Risk per trade (overrides --user)')
+        parser.add_argument('--ipt', type=float, help='Investment per trade (overrides --user)')
+        parser.add_argument('--workers', type=int, help='Processes for sweeps (defaults to BACKTEST_WORKERS)')
+        parser.add_argument('--trades', type=int, default=0, help='Print up to this many trades of a single backtest')
+
+    def handle(self, *args, **options):
+        end = options['end'] or date.today()
+        start = options['start'] or end - timedelta(days=5 * 365)
+        if start > end:
+            raise CommandError('--from must not be after --to')
+
+        if options['clause']:
+            clauses = {'clause': options['clause']}
+        else:
+            screeners = Screener.objects.all()
+            if options['screener']:
+                screeners = screeners.filter(screener_name__in=options['screener'])
+            clauses = dict(screeners.values_list('screener_name', 'scan_clause'))
+        for name, scan_clause in list(clauses.items()):
+            try:
+                compile_clause(scan_clause or '')
+            except ScanClauseError as e:
+                self.stdout.write(f'  {name:<30} not supported locally: {e}')
+                del clauses[name]
+        if not clauses:
+            raise CommandError('No scan clause to backtest')
+
+        sizing = self._sizing(options)
+        capital = sizing.pop('capital')
+        grid = [
+            {'stop_pct': stop, 'target_pct': target, 'max_hold': hold, 'entry': options['entry'], **sizing}
+            for stop, target, hold in itertools.product(
+                _numbers(options['stop'], DEFAULT_STOP_PCT),
+                _numbers(options['target'], DEFAULT_TARGET_PCT),
+                _numbers(options['max_hold'], DEFAULT_MAX_HOLD, int),
+            )
+        ]
+
+        started = time.perf_counter()
+        single = None
+        if len(clauses) * len(grid) == 1:
+            panel, start_index = load_backtest_panel(start, end)
+            if not len(panel):
+                raise CommandError('No daily candles in the OHLCV store; run download_history first')
+            (name, scan_clause), = clauses.items()
+            result = backtest(scan_clause, panel, start_index, capital=capital, **grid[0])
+            results = [(name, result['params'], result['metrics'])]
+            single = (result['trades'], panel)
+            universe = f'{len(panel)} symbols'
+        else:
+            results = run_sweep(clauses, grid, start, end, capital=capital, max_workers=options['workers'])
+            universe = 'the stored symbols'
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{'screener':<24} {'stop':>5} {'tgt':>5} {'hold':>5} {'trades':>7} {'win%':>6} {'PF':>6} "
+            f"{'avg%':>6} {'P/L':>12} {'ret%':>8} {'maxDD%':>7} {'days':>5}  exits"
+        )
+        for name, params, metrics in results:
+            prefix = f"{name[:24]:<24} {params['stop_pct']:>5g} {params['target_pct']:>5g} {params['max_hold']:>5}"
+            if not metrics['trades']:
+                self.stdout.write(f'{prefix} {0:>7}')
+                continue
+            exits = ' '.join(f'{outcome}={count}' for outcome, count in metrics['exits'].items())
+            self.stdout.write(
+                f"{prefix} {metrics['trades']:>7} {metrics['win_rate']:>6} {metrics['profit_factor'] or '-':>6} "
+                f"{metrics['avg_return_pct']:>6} {metrics['total_pnl']:>12,.0f} {metrics['return_pct']:>8} "
+                f"{metrics['max_drawdown_pct']:>7} {metrics['avg_hold_days']:>5}  {exits}"
+            )
+        if single and options['trades']:
+            self._print_trades(*single, options['trades'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {len(results)} backtest(s) from {start} to {end} over {universe} in {elapsed:.2f}s'
+        ))
+
+    def _sizing(self, options):
+        sizing = {'capital': None, 'rpt': None, 'ipt': None}
+        if options['user']:
+            roi = UserRoi.objects.filter(user__user_id=options['user']).first()
+            if roi is None:
+                raise CommandError(f"No UserRoi for user {options['user']}")
+            sizing.update(
+                capital=float(roi.total_capital or 0) or None, rpt=float(roi.rpt or 0) or None, ipt=float(roi.ipt or 0) or None,
+            )
+        for name in sizing:
+            if options[name] is not None:
+                sizing[name] = options[name]
+        return sizing
+
+    def _print_trades(self, trades, panel, limit):
+        dates = panel.dates.astype(str)
+        for index in range(min(limit, len(trades['pnl']))):
+            self.stdout.write(
+                f"  {panel.symbols[trades['symbol'][index]]:<15} {dates[trades['entry_index'][index]]} "
+                f"{trades['entry_price'][index]:>10.2f} -> {dates[trades['exit_index'][index]]} "
+                f"{trades['exit_price'][index]:>10.2f} x{int(trades['shares'][index]):<6} "
+                f"{OUTCOMES[trades['outcome'][index]]:<8} {trades['pnl'][index]:>12,.2f}"
+            )
+        if len(trades['pnl']):
+            self.stdout.write(f"  ... {len(trades['pnl'])} trades, P/L {np.sum(trades['pnl']):,.2f}")
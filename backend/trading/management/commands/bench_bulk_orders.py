@@ -0,0 +1,85 @@
+"""
+Django management command to benchmark bulk order placement against the Kite simulator
+"""
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from trading.models import Authenticator
+from trading.utils.bulk_orders import place_market_orders_bulk
+from trading.utils.kite_client_pool import kite_client_pool
+from trading.utils.kite_simulator import DEFAULT_SYMBOLS, KiteSimulator
+
+from .run_kite_simulator import parse_rate_limits
+
+
+class Command(BaseCommand):
+    help = 'Measure bulk market order throughput and p50/p95/p99 latency per basket size (never hits live Kite)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='User ID whose Authenticator credentials the client uses')
+        parser.add_argument('--sizes', default='1,10,25,50,100', help='Comma-separated basket sizes')
+        parser.add_argument('--repeat', type=int, default=3, help='Baskets per size')
+        parser.add_argument('--workers', type=int, help='Concurrent requests (defaults to BULK_ORDER_MAX_WORKERS)')
+        parser.add_argument('--root', help='URL of an already running simulator (default: start one in-process)')
+        parser.add_argument('--latency-ms', type=float, default=30, help='In-process simulator base latency')
+        parser.add_argument('--jitter-ms', type=float, default=20, help='In-process simulator mean extra latency')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='In-process simulator 503 rate')
+        parser.add_argument('--rate-limit', action='append', metavar='CLASS=N',
+                            help='In-process simulator limit override, e.g. order=0')
+
+    def handle(self, *args, **options):
+        if not Authenticator.objects.filter(user_id=options['user']).exclude(api_key__isnull=True).exists():
+            raise CommandError(f"No Authenticator credentials for user {options['user']}")
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+
+        simulator = None
+        root = options['root']
+        if root:
+            if urlsplit(root).hostname and urlsplit(root).hostname.endswith('kite.trade'):
+                raise CommandError('Refusing to benchmark against live Kite; point --root at a simulator')
+        else:
+            simulator = KiteSimulator(
+                latency_ms=options['latency_ms'],
+                jitter_ms=options['jitter_ms'],
+                error_rate=options['error_rate'],
+                rate_limits=parse_rate_limits(options['rate_limit']),
+            ).start()
+            root = simulator.url
+
+        try:
+            with override_settings(KITE_API_ROOT=root):
+                kite_client_pool.clear()
+                self.stdout.write(f'Benchmarking against {root}')
+                self.stdout.write(f"{'size':>6} {'orders':>7} {'errors':>7} {'wall s':>8} {'orders/s':>9} "
+                                  f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+                for size in sizes:
+                    self._run_size(options['user'], size, options['repeat'], options['workers'])
+        finally:
+            kite_client_pool.clear()
+            if simulator:
+                simulator.stop()
+
+    def _run_size(self, user_id, size, repeat, workers):
+        latencies = []
+        errors = 0
+        wall = 0.0
+        for run in range(repeat):
+            orders = [
+                {'stock_name': DEFAULT_SYMBOLS[i % len(DEFAULT_SYMBOLS)], 'quantity': 1}
+                for i in range(size)
+            ]
+            started = time.perf_counter()
+            results = place_market_orders_bulk(user_id, orders, workers)
+            wall += time.perf_counter() - started
+            latencies.extend(result['elapsed_ms'] for result in results)
+            errors += sum(1 for result in results if result['status'] != 'success')
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        total = size * repeat
+        self.stdout.write(f'{size:>6} {total:>7} {errors:>7} {wall:>8.2f} {total / wall:>9.1f} '
+                          f'{p50:>8.1f} {p95:>8.1f} {p99:>8.1f}')
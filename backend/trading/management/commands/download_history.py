@@ -0,0 +1,124 @@
+"""
+Django management command to backfill Kite historical candles into the OHLCV store
+"""
+import signal
+import threading
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from trading.models import Authenticator
+from trading.utils.historical_download import (
+    MAX_DAYS, download_history, nse_equity_tokens, open_journal, plan_downloads,
+)
+from trading.utils.kite_client_pool import kite_client_pool
+from trading.utils.kite_simulator import KiteSimulator
+from trading.utils.ohlcv_store import get_ohlcv_store
+
+
+class Command(BaseCommand):
+    help = 'Download historical candles from Kite into the OHLCV store, resuming where the last run stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='User ID whose Kite session is used')
+        parser.add_argument('--symbols', action='append',
+                            help='Comma-separated NSE symbols (repeatable; default: every NSE equity)')
+        parser.add_argument('--interval', action='append', choices=list(MAX_DAYS),
+                            help='Candle interval (repeatable; default: day)')
+        parser.add_argument('--from', dest='start', type=date.fromisoformat,
+                            help='First date, YYYY-MM-DD (default: five years ago)')
+        parser.add_argument('--to', dest='end', type=date.fromisoformat, help='Last date (default: today)')
+        parser.add_argument('--workers', type=int, help='Concurrent requests (defaults to HISTORICAL_DOWNLOAD_WORKERS)')
+        parser.add_argument('--simulator', action='store_true',
+                            help='Download from an in-process Kite simulator instead of KITE_API_ROOT')
+
+    def handle(self, *args, **options):
+        if not Authenticator.objects.filter(user_id=options['user']).exclude(api_key__isnull=True).exists():
+            raise CommandError(f"No Authenticator credentials for user {options['user']}")
+        end = options['end'] or date.today()
+        start = options['start'] or end - timedelta(days=5 * 365)
+        if start > end:
+            raise CommandError('--from must not be after --to')
+        intervals = options['interval'] or ['day']
+        symbols = [
+            symbol.strip().upper() for value in options['symbols'] or [] for symbol in value.split(',') if symbol.strip()
+        ]
+
+        simulator = None
+        if options['simulator']:
+            simulator = KiteSimulator(symbols=symbols or None).start()
+            self.stdout.write(f'Downloading from the Kite simulator at {simulator.url}')
+        try:
+            with override_settings(**({'KITE_API_ROOT': simulator.url} if simulator else {})):
+                kite_client_pool.clear()
+                self._download(options, symbols, intervals, start, end, simulator is not None)
+        finally:
+            kite_client_pool.clear()
+            if simulator:
+                simulator.stop()
+
+    def _download(self, options, symbols, intervals, start, end, simulated):
+        kite = kite_client_pool.get(options['user'])
+        # The simulator's instrument tokens are its own, so ask it rather than the local master
+        tokens = {} if simulated else nse_equity_tokens()
+        if not tokens:
+            tokens = nse_equity_tokens(kite)
+        if symbols:
+            unknown = [symbol for symbol in symbols if symbol not in tokens]
+            if unknown:
+                self.stderr.write(f"Not NSE equities, skipped: {', '.join(unknown)}")
+            tokens = {symbol: tokens[symbol] for symbol in symbols if symbol in tokens}
+        if not tokens:
+            raise CommandError('No symbols to download')
+
+        store = get_ohlcv_store()
+        journal = open_journal(store)
+        try:
+            plan = plan_downloads(tokens, intervals, start, end, store, journal)
+            total = sum(len(chunks) for chunks in plan.values())
+            self.stdout.write(
+                f"{len(tokens)} symbol(s) x {len(intervals)} interval(s) from {start} to {end}: "
+                f"{total} request(s) to make, {len(tokens) * len(intervals) - len(plan)} series up to date"
+            )
+            if plan.skipped:
+                self.stderr.write(
+                    f"{len(plan.skipped)} series start after {start}; older candles cannot be added to them:"
+                )
+                for chunk in plan.skipped[:10]:
+                    self.stderr.write(f'  {chunk.symbol} {chunk.interval} {chunk.start} to {chunk.end}')
+                if len(plan.skipped) > 10:
+                    self.stderr.write(f'  ... and {len(plan.skipped) - 10} more')
+
+            stop_event = threading.Event()
+
+            def _stop(signum, frame):
+                self.stdout.write('Stopping after the requests in flight; run again to resume')
+                stop_event.set()
+
+            signal.signal(signal.SIGINT, _stop)
+            signal.signal(signal.SIGTERM, _stop)
+
+            report_every = max(1, total // 20)
+
+            def _progress(stats):
+                if stats.done % report_every == 0:
+                    self.stdout.write(
+                        f'  {stats.done}/{total} requests, {stats.candles} candles, '
+                        f'{stats.candles_per_second:.0f} candles/s'
+                    )
+
+            stats = download_history(kite, plan, store, journal, options['workers'], stop_event, _progress)
+        finally:
+            journal.close()
+
+        for chunk, error in stats.failed:
+            self.stderr.write(f'  {chunk.symbol} {chunk.interval} from {chunk.start}: {error}')
+        elapsed = stats.elapsed
+        message = (
+            f'{stats.done}/{total} requests, {stats.candles} candles ({stats.stored} new) in {elapsed:.1f}s: '
+            f'{stats.candles_per_second:.0f} candles/s, {stats.done / elapsed if elapsed else 0:.1f} requests/s'
+        )
+        if stats.failed or stats.done < total:
+            self.stdout.write(self.style.WARNING(f'⚠️ {message}; {len(stats.failed)} series failed, run again to resume'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ {message}'))
@@ -0,0 +1,42 @@
+"""
+Django management command to reconcile Kite GTTs with open trades
+"""
+from django.core.management.base import BaseCommand
+from trading.utils.gtt_reconciler import reconcile_all, reconcile_user
+
+
+class Command(BaseCommand):
+    help = 'Report (and optionally fix) unprotected trades, stale GTTs and quantity/trigger mismatches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Reconcile only this user (default: every user with open trades)')
+        parser.add_argument('--fix', action='store_true', help='Place missing GTTs and correct mismatched ones')
+        parser.add_argument('--delete-stale', action='store_true', help='Cancel active GTTs no open trade accounts for')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            reports = [reconcile_user(options['user'], fix=options['fix'], delete_stale=options['delete_stale'])]
+        else:
+            reports = reconcile_all(fix=options['fix'], delete_stale=options['delete_stale'])
+        if not reports:
+            self.stdout.write('No users with open trades')
+            return
+        for report in reports:
+            if 'error' in report:
+                self.stderr.write(f"User {report['user_id']}: {report['error']}")
+                continue
+            self.stdout.write(
+                f"User {report['user_id']}: {len(report['ok'])} ok, {len(report['unprotected'])} unprotected, "
+                f"{len(report['mismatched'])} mismatched, {len(report['stale'])} stale, {report['linked']} relinked"
+            )
+            for kind in ('unprotected', 'mismatched', 'stale'):
+                for entry in report[kind]:
+                    line = f"  {kind:<12} {entry['stock']:<15} trade={entry.get('trade_id')} gtt={entry.get('gtt_id')}"
+                    if entry.get('problems'):
+                        line += f" ({'; '.join(entry['problems'])})"
+                    if entry.get('fix'):
+                        line += f" -> {entry['fix']}"
+                    if entry.get('fix_error'):
+                        line += f" -> failed: {entry['fix_error']}"
+                    self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f'✅ Reconciled {len(reports)} user(s)'))
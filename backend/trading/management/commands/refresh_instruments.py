@@ -0,0 +1,49 @@
+"""
+Django management command to rebuild the local instrument master
+"""
+from django.core.management.base import BaseCommand, CommandError
+from trading.models.authenticator import Authenticator
+from trading.utils.instrument_master import build_instrument_master, build_instrument_master_from_csv
+from trading.utils.kite_transaction_manager import get_kite_client
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the memory-mapped instrument master from Kite (run once a day before market open)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--csv',
+            type=str,
+            help='Build from a local instruments CSV dump instead of calling kite.instruments()',
+        )
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='user_id whose Kite session is used to download instruments (defaults to any logged-in user)',
+        )
+        parser.add_argument(
+            '--keep',
+            type=int,
+            default=2,
+            help='Number of master versions to keep on disk',
+        )
+
+    def handle(self, *args, **options):
+        if options['csv']:
+            self.stdout.write(f"Building instrument master from {options['csv']}")
+            path = build_instrument_master_from_csv(options['csv'], keep_versions=options['keep'])
+        else:
+            user_id = options['user']
+            if not user_id:
+                authenticator = Authenticator.objects.exclude(access_token='').first()
+                if not authenticator:
+                    raise CommandError('No user with an access token found. Use --user or --csv.')
+                user_id = authenticator.user_id
+            self.stdout.write(f'Downloading instruments with the session of user {user_id}')
+            try:
+                instruments = get_kite_client(user_id).instruments()
+            except Exception as e:
+                raise CommandError(f'Failed to download instruments: {e}')
+            path = build_instrument_master(instruments, keep_versions=options['keep'])
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Instrument master published at {path}'))
@@ -0,0 +1,63 @@
+"""
+Django management command to serve a local Kite Connect API simulator
+"""
+from django.core.management.base import BaseCommand, CommandError
+from trading.utils.kite_simulator import DEFAULT_RATE_LIMITS, KiteSimulator
+
+
+def parse_rate_limits(values):
+    """
+    ["order=5", "quote=0"] -> {"order": 5.0, "quote": 0.0}
+    """
+    limits = {}
+    for value in values or []:
+        endpoint, _, rate = value.partition('=')
+        if endpoint not in DEFAULT_RATE_LIMITS or not rate:
+            raise CommandError(f"Invalid --rate-limit '{value}'. Use CLASS=N with CLASS in {', '.join(DEFAULT_RATE_LIMITS)}")
+        limits[endpoint] = float(rate)
+    return limits
+
+
+class Command(BaseCommand):
+    help = 'Run a local Kite Connect API simulator (set KITE_API_ROOT to its URL to use it)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8765, help='Port (default: 8765)')
+        parser.add_argument('--latency-ms', type=float, default=0, help='Fixed delay added to every response')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='Mean of an extra exponential delay (long tail)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+        parser.add_argument(
+            '--rate-limit',
+            action='append',
+            metavar='CLASS=N',
+            help='Override a per-second limit, e.g. --rate-limit order=5 (0 disables). Repeatable',
+        )
+        parser.add_argument('--symbols', help='Comma-separated tradable symbols (default: a NIFTY 50 subset)')
+        parser.add_argument('--strict-auth', action='store_true', help='Only accept tokens issued by /session/token')
+        parser.add_argument('--seed', type=int, help='Random seed for prices and error injection')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['error_rate'] <= 1:
+            raise CommandError('--error-rate must be between 0 and 1')
+        symbols = [s.strip().upper() for s in options['symbols'].split(',') if s.strip()] if options['symbols'] else None
+        simulator = KiteSimulator(
+            host=options['host'],
+            port=options['port'],
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'],
+            rate_limits=parse_rate_limits(options['rate_limit']),
+            symbols=symbols,
+            strict_auth=options['strict_auth'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ Kite simulator listening on {simulator.url}'))
+        self.stdout.write(f'   export KITE_API_ROOT={simulator.url}')
+        try:
+            simulator.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            simulator.server.server_close()
+        self.stdout.write('Kite simulator stopped')
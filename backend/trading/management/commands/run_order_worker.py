@@ -0,0 +1,38 @@
+"""
+Django management command to execute queued order jobs
+"""
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from trading.utils.order_jobs import run_order_workers
+
+
+class Command(BaseCommand):
+    help = 'Run the order job worker pool outside the web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            help='Number of worker threads (defaults to ORDER_WORKER_THREADS)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            help='Seconds to sleep when the queue is empty (defaults to ORDER_WORKER_POLL_INTERVAL)',
+        )
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+
+        def _stop(signum, frame):
+            self.stdout.write(self.style.WARNING('Stopping after the jobs in progress finish...'))
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, _stop)
+        signal.signal(signal.SIGTERM, _stop)
+
+        self.stdout.write(self.style.SUCCESS('Order worker started'))
+        run_order_workers(options['threads'], options['poll_interval'], stop_event)
+        self.stdout.write('Order worker stopped')
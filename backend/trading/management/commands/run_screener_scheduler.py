@@ -0,0 +1,59 @@
+"""
+Django management command to run stored screeners on the market calendar
+"""
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from trading.utils.screener_scheduler import run_due_screeners
+
+
+class Command(BaseCommand):
+    help = 'Run every screener after each candle close and at market open, saving ScreenerRun rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Seconds between checks for due screeners (defaults to SCREENER_SCHEDULER_INTERVAL)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the screeners that are due once and exit',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='With --once, run every screener whether or not it is due',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval'] if options['interval'] is not None else settings.SCREENER_SCHEDULER_INTERVAL
+        if options['once']:
+            runs = run_due_screeners(force=options['all'])
+            for run in runs:
+                outcome = f"error: {run.error}" if run.error else f"{len(run.symbols)} stocks"
+                self.stdout.write(f"  {run.screener_id:<30} {run.latency_ms:>6}ms  {outcome}")
+            self.stdout.write(self.style.SUCCESS(f'✅ Ran {len(runs)} screener(s)'))
+            return
+
+        stop_event = threading.Event()
+
+        def _stop(signum, frame):
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, _stop)
+        signal.signal(signal.SIGTERM, _stop)
+
+        self.stdout.write(self.style.SUCCESS('Screener scheduler started'))
+        while not stop_event.is_set():
+            close_old_connections()
+            try:
+                run_due_screeners()
+            except Exception as e:
+                self.stderr.write(f'Scheduler tick failed: {e}')
+            stop_event.wait(interval)
+        self.stdout.write('Screener scheduler stopped')
@@ -0,0 +1,57 @@
+"""
+Django management command to run screeners with the local scan engine
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from trading.models import Screener
+from trading.utils.ohlcv_panel import PanelUnavailable
+from trading.utils.ohlcv_store import get_panel
+from trading.utils.scan_engine import ScanClauseError, compile_clause, evaluate_many
+
+
+class Command(BaseCommand):
+    help = 'Evaluate stored screeners (or a scan clause) over the local OHLCV store, without Chartink'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--screener', action='append', help='Screener to run (repeatable; default: all)')
+        parser.add_argument('--clause', help='Evaluate this scan clause instead of stored screeners')
+        parser.add_argument('--show', type=int, default=0, help='Print up to this many matching symbols per clause')
+
+    def handle(self, *args, **options):
+        try:
+            panel = get_panel()
+        except PanelUnavailable as e:
+            raise CommandError(str(e))
+
+        if options['clause']:
+            clauses = [('clause', options['clause'])]
+        else:
+            screeners = Screener.objects.all()
+            if options['screener']:
+                screeners = screeners.filter(screener_name__in=options['screener'])
+            clauses = list(screeners.values_list('screener_name', 'scan_clause'))
+
+        supported = []
+        for name, scan_clause in clauses:
+            try:
+                compile_clause(scan_clause or '')
+                supported.append((name, scan_clause))
+            except ScanClauseError as e:
+                self.stdout.write(f"  {name:<30} not supported locally: {e}")
+
+        for name, scan_clause in supported:
+            started = time.perf_counter()
+            stocks = evaluate_many([scan_clause], panel)[0]
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(f"  {name:<30} {len(stocks):>5} stocks {elapsed:>8.1f}ms")
+            for stock in stocks[:options['show']]:
+                self.stdout.write(f"      {stock['symbol']:<15} {stock['price']}")
+
+        started = time.perf_counter()
+        evaluate_many([scan_clause for _, scan_clause in supported], panel)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Evaluated {len(supported)} clause(s) over {len(panel)} symbols up to {panel.latest_date} '
+            f'in {elapsed:.1f}ms (one pass)'
+        ))
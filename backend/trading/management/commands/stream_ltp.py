@@ -0,0 +1,53 @@
+"""
+Django management command to stream last traded prices into the shared LTP table
+"""
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from trading.models import GlobalParameters
+from trading.utils.ltp_stream import LtpStreamer
+
+
+class Command(BaseCommand):
+    help = 'Subscribe to held and watched instruments over KiteTicker and publish LTPs to shared memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help="User whose Kite session is used for the websocket (defaults to the 'logged-in-user' parameter)",
+        )
+        parser.add_argument(
+            '--symbols',
+            help='Comma-separated extra symbols to stream',
+        )
+        parser.add_argument(
+            '--refresh-interval',
+            type=float,
+            help='Seconds between subscription refreshes (defaults to LTP_STREAM_REFRESH_INTERVAL)',
+        )
+
+    def handle(self, *args, **options):
+        user_id = options['user']
+        if not user_id:
+            param = GlobalParameters.objects.filter(key='logged-in-user').first()
+            user_id = param.value if param else None
+        if not user_id:
+            raise CommandError('No --user given and no logged-in-user parameter set')
+        extra = [s for s in (options['symbols'] or '').split(',') if s.strip()]
+
+        stop_event = threading.Event()
+
+        def _stop(signum, frame):
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, _stop)
+        signal.signal(signal.SIGTERM, _stop)
+
+        streamer = LtpStreamer(user_id, extra)
+        self.stdout.write(self.style.SUCCESS(f'✅ Streaming LTPs for user {user_id} into {streamer.writer.path}'))
+        reason = streamer.run(stop_event, options['refresh_interval'])
+        if reason:
+            # Non-zero exit so the process manager restarts us with fresh credentials
+            raise CommandError(reason)
+        self.stdout.write('LTP stream stopped')
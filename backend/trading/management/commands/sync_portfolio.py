@@ -0,0 +1,38 @@
+"""
+Django management command to sync Kite holdings and positions into Trade rows
+"""
+from django.core.management.base import BaseCommand
+from trading.utils.portfolio_sync import sync_all, sync_user
+
+
+class Command(BaseCommand):
+    help = 'Upsert Kite holdings/positions into trades for every user with a Kite session (or one user)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Sync only this user (default: every Authenticator with an access token)')
+        parser.add_argument('--full', action='store_true', help='Ignore the sync cursor and diff every row')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            reports = [sync_user(options['user'], full=options['full'])]
+        else:
+            reports = sync_all(full=options['full'])
+        if not reports:
+            self.stdout.write('No users with a Kite session')
+            return
+        for report in reports:
+            if 'error' in report:
+                self.stderr.write(f"User {report['user_id']}: {report['error']}")
+                continue
+            if report['unchanged']:
+                self.stdout.write(f"User {report['user_id']}: unchanged since last sync")
+                continue
+            self.stdout.write(
+                f"User {report['user_id']}: {report['positions']} held, {report['created']} created, "
+                f"{report['updated']} updated, {report['adopted']} adopted, {len(report['closed'])} closed"
+            )
+            for entry in report['closed']:
+                self.stdout.write(f"  closed {entry['stock']:<15} trade={entry['trade_id']} {entry['pl']} {entry['booked']}")
+            for entry in report['gone']:
+                self.stdout.write(f"  gone   {entry['stock']:<15} trade={entry['trade_id']} (no sell fills to close it at)")
+        self.stdout.write(self.style.SUCCESS(f'✅ Synced {len(reports)} user(s)'))
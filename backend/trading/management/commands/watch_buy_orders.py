@@ -0,0 +1,51 @@
+"""
+Django management command to place GTTs for limit buys as they fill
+"""
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from trading.utils.gtt_watcher import watch_pending_orders
+
+
+class Command(BaseCommand):
+    help = 'Watch pending limit buy orders and place/resize their OCO GTT for the filled quantity'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Seconds between order book polls (defaults to GTT_WATCHER_INTERVAL)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run a single poll and exit',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval'] if options['interval'] is not None else settings.GTT_WATCHER_INTERVAL
+        if options['once']:
+            users = watch_pending_orders()
+            self.stdout.write(self.style.SUCCESS(f'✅ Checked pending buy orders for {users} user(s)'))
+            return
+
+        stop_event = threading.Event()
+
+        def _stop(signum, frame):
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, _stop)
+        signal.signal(signal.SIGTERM, _stop)
+
+        self.stdout.write(self.style.SUCCESS('GTT watcher started'))
+        while not stop_event.is_set():
+            close_old_connections()
+            try:
+                watch_pending_orders()
+            except Exception as e:
+                self.stderr.write(f'Watcher tick failed: {e}')
+            stop_event.wait(interval)
+        self.stdout.write('GTT watcher stopped')
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0016_orderjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderjob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('waiting', 'Waiting for fill'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='BuyOrderWatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(max_length=20)),
+                ('order_id', models.CharField(max_length=32, unique=True)),
+                ('tradingsymbol', models.CharField(max_length=50)),
+                ('quantity', models.IntegerField()),
+                ('buy_price', models.FloatField()),
+                ('stop_loss', models.FloatField()),
+                ('target', models.FloatField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('protected', 'Protected'), ('closed', 'Closed')], default='pending', max_length=20)),
+                ('order_status', models.CharField(blank=True, default='', max_length=30)),
+                ('filled_quantity', models.IntegerField(default=0)),
+                ('gtt_id', models.BigIntegerField(blank=True, null=True)),
+                ('gtt_quantity', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='buy_watches', to='trading.orderjob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'user_id'], name='trading_buy_status_b80de5_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0017_buyorderwatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trade',
+            name='gtt_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
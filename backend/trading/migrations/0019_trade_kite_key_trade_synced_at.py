@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0018_trade_gtt_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trade',
+            name='kite_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
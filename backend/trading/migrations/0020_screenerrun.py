@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0019_trade_kite_key_trade_synced_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScreenerRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clause_hash', models.CharField(max_length=64)),
+                ('ran_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('symbols', models.JSONField(default=list)),
+                ('prices', models.JSONField(default=dict)),
+                ('latency_ms', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('screener', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='trading.screener')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['screener', '-ran_at'], name='trading_scr_screene_553657_idx')],
+            },
+        ),
+    ]
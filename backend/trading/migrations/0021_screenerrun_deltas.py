@@ -0,0 +1,55 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:51
+
+from django.db import migrations, models
+
+
+def store_deltas(apps, schema_editor):
+    """
+    Turn the full results of existing runs into deltas, keeping them on the newest run only.
+    """
+    ScreenerRun = apps.get_model('trading', 'ScreenerRun')
+    runs = ScreenerRun.objects.filter(error__isnull=True).order_by('screener_id', 'ran_at')
+    previous = None
+    for run in runs:
+        if previous is not None and previous.screener_id != run.screener_id:
+            previous = None
+        previous_symbols = set(previous.symbols) if previous else set()
+        run.count = len(run.symbols)
+        run.entered = {symbol: run.prices.get(symbol) for symbol in sorted(set(run.symbols) - previous_symbols)}
+        run.exited = sorted(previous_symbols - set(run.symbols))
+        run.clause_changed = previous is not None and previous.clause_hash != run.clause_hash
+        run.save(update_fields=['count', 'entered', 'exited', 'clause_changed'])
+        if previous is not None:
+            ScreenerRun.objects.filter(pk=previous.pk).update(symbols=[], prices={})
+        previous = run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0020_screenerrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='screenerrun',
+            name='clause_changed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='screenerrun',
+            name='count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='screenerrun',
+            name='entered',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='screenerrun',
+            name='exited',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(store_deltas, migrations.RunPython.noop),
+    ]
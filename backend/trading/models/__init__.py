@@ -5,3 +5,7 @@ from .trade import Trade
 from .global_parameters import GlobalParameters
 from .user_roi import UserRoi
 from .screener import Screener
+from .screener_run import ScreenerRun
+from .order_job import OrderJob
+from .buy_order_watch import BuyOrderWatch
+from .idempotency_key import IdempotencyKey
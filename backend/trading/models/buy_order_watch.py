@@ -0,0 +1,38 @@
+from django.db import models
+
+
+class BuyOrderWatch(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_PROTECTED = 'protected'
+    STATUS_CLOSED = 'closed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROTECTED, 'Protected'),
+        (STATUS_CLOSED, 'Closed'),
+    ]
+
+    user_id = models.CharField(max_length=20)
+    order_id = models.CharField(max_length=32, unique=True)
+    tradingsymbol = models.CharField(max_length=50)
+    quantity = models.IntegerField()
+    buy_price = models.FloatField()
+    stop_loss = models.FloatField()
+    target = models.FloatField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    order_status = models.CharField(max_length=30, blank=True, default='')
+    filled_quantity = models.IntegerField(default=0)
+    gtt_id = models.BigIntegerField(null=True, blank=True)
+    gtt_quantity = models.IntegerField(default=0)
+    job = models.ForeignKey('OrderJob', on_delete=models.SET_NULL, null=True, blank=True, related_name='buy_watches')
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'trading'
+        indexes = [
+            models.Index(fields=['status', 'user_id']),
+        ]
+
+    def __str__(self):
+        return f"Buy {self.order_id} {self.tradingsymbol} x{self.quantity} for {self.user_id} - {self.status}"
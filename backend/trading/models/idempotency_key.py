@@ -0,0 +1,27 @@
+from django.db import models
+
+
+class IdempotencyKey(models.Model):
+    """
+    An Idempotency-Key claimed by an order request (see utils/idempotency.py), shared by
+    every worker process through the unique (path, key) constraint.
+    """
+    path = models.CharField(max_length=255)
+    key = models.CharField(max_length=255)
+    # sha256 of the request body, so reusing a key for a different request is rejected
+    fingerprint = models.CharField(max_length=64)
+    # The stored response; status_code stays null while the first request is running
+    status_code = models.IntegerField(null=True, blank=True)
+    content = models.BinaryField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        app_label = 'trading'
+        constraints = [
+            models.UniqueConstraint(fields=['path', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.path} {self.key} - {self.status_code or 'in flight'}"
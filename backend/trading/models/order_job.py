@@ -0,0 +1,49 @@
+import uuid
+
+from django.db import models
+
+
+class OrderJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_WAITING = 'waiting'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_WAITING, 'Waiting for fill'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    KIND_MARKET_BUY = 'market_buy'
+    KIND_LIMIT_WITH_GTT = 'limit_with_gtt'
+    KIND_GTT_OCO = 'gtt_oco'
+    KIND_CHOICES = [
+        (KIND_MARKET_BUY, 'Market Buy'),
+        (KIND_LIMIT_WITH_GTT, 'Limit Buy with GTT'),
+        (KIND_GTT_OCO, 'GTT OCO'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user_id = models.CharField(max_length=20)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    step = models.CharField(max_length=50, blank=True, default='')
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'trading'
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} for {self.user_id} - {self.status}"
@@ -0,0 +1,37 @@
+from django.db import models
+
+
+class ScreenerRun(models.Model):
+    screener = models.ForeignKey('Screener', on_delete=models.CASCADE, related_name='runs')
+    # sha256 of the canonical scan clause the run used (see screener_cache.clause_key)
+    clause_hash = models.CharField(max_length=64)
+    ran_at = models.DateTimeField()
+    # Next candle close of the clause's timeframe: the run's results are current until then
+    expires_at = models.DateTimeField(null=True, blank=True)
+    # Full results are kept on a screener's newest successful run only; once a newer run
+    # is saved they are cleared and the run keeps just its delta (see screener_changes)
+    symbols = models.JSONField(default=list)
+    prices = models.JSONField(default=dict)
+    # Change from the previous successful run: {symbol: price} that entered, [symbol] that exited
+    entered = models.JSONField(default=dict)
+    exited = models.JSONField(default=list)
+    count = models.IntegerField(default=0)
+    clause_changed = models.BooleanField(default=False)
+    latency_ms = models.IntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        app_label = 'trading'
+        indexes = [
+            models.Index(fields=['screener', '-ran_at']),
+        ]
+
+    def stocks(self):
+        """
+        The run's results in the shape Chartink screeners return: [{"symbol", "price"}, ...].
+        """
+        return [{"symbol": symbol, "price": self.prices.get(symbol)} for symbol in self.symbols]
+
+    def __str__(self):
+        outcome = f"error: {self.error}" if self.error else f"{self.count} stocks, +{len(self.entered)} -{len(self.exited)}"
+        return f"{self.screener_id} at {self.ran_at:%Y-%m-%d %H:%M} - {outcome}"
@@ -24,6 +24,10 @@ class Trade(models.Model):
     exit_date = models.DateField(null=True, blank=True)
     tenure = models.IntegerField(null=True, blank=True)
     remarks = models.TextField(blank=True, null=True)
+    gtt_id = models.BigIntegerField(blank=True, null=True)
+    # "<user_id>:<exchange>:<symbol>:<product>" for rows synced from Kite holdings/positions
+    kite_key = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    synced_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         app_label = 'trading'
@@ -1,6 +1,8 @@
 from .models.screener import Screener
 from rest_framework import serializers
 from .models import UserRoi, User, Trade
+from .utils.ltp_cache import get_symbol_ltp
+from .utils.trade_indicators import autofill_indicators
 class ScreenerSerializer(serializers.ModelSerializer):
     user_id = serializers.CharField(write_only=True)
     created_by = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -59,7 +61,19 @@ class TradeSerializer(serializers.ModelSerializer):
         ],
         required=False, allow_null=True
     )
+    # Live price from the shared LTP table (null when the stream is not running)
+    ltp = serializers.SerializerMethodField()
 
     class Meta:
         model = Trade
         fields = '__all__'
+
+    def get_ltp(self, obj):
+        return get_symbol_ltp(obj.stock) if obj.stock else None
+
+    # rsi / volume left empty are filled from the OHLCV store (see trade_indicators)
+    def create(self, validated_data):
+        return super().create(autofill_indicators(validated_data))
+
+    def update(self, instance, validated_data):
+        return super().update(instance, autofill_indicators(validated_data, instance))
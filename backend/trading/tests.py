@@ -1,3 +1,691 @@
-from django.test import TestCase
+import hashlib
+import json
+import logging.config
+import os
+import tempfile
+import time
+import threading
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .models.authenticator import Authenticator
+from .models.buy_order_watch import BuyOrderWatch
+from .models.idempotency_key import IdempotencyKey
+from .models.screener import Screener
+from .models.trade import Trade
+from .models.user import User
+from .utils import backtest, instrument_master, ltp_cache, ohlcv_store, scan_engine
+from .utils.gtt_watcher import handle_order_update
+from .utils.historical_download import download_history, nse_equity_tokens, open_journal, plan_downloads
+from .utils.kite_client_pool import kite_client_pool
+from .utils.kite_simulator import KiteSimulator
+from .utils.kite_transaction_manager import place_oco_gtt
+from .utils.ohlcv_panel import OhlcvPanel
+from .utils.quote_cache import QuoteCache
+from .utils.screener_cache import ScreenerCache
+
+TEST_USER = 'SIM001'
+
+
+def setUpModule():
+    # Keep simulator traffic and expected errors out of the log files under backend/logs
+    logging.config.dictConfig({
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {'null': {'class': 'logging.NullHandler'}},
+        'loggers': {name: {'handlers': ['null'], 'propagate': False} for name in settings.LOGGING['loggers']},
+    })
+
+
+def tearDownModule():
+    logging.config.dictConfig(settings.LOGGING)
+
+
+class SimulatorTestCase(TestCase):
+    """
+    Runs each test against an in-process KiteSimulator with a stored session for TEST_USER.
+    """
+
+    def setUp(self):
+        self.simulator = KiteSimulator(seed=1).start()
+        self.addCleanup(self.simulator.stop)
+        settings_override = override_settings(KITE_API_ROOT=self.simulator.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        kite_client_pool.clear()
+        self.addCleanup(kite_client_pool.clear)
+        Authenticator.objects.create(user_id=TEST_USER, api_key='test-key', api_secret='test-secret',
+                                     access_token='test-token')
+        self.kite = kite_client_pool.get(TEST_USER)
+
+    def requests(self, endpoint):
+        """
+        Requests the simulator served (a 429 from a client outrunning it is not one).
+        """
+        stats = self.simulator.stats().get(endpoint, {})
+        return stats.get('requests', 0) - stats.get('rate_limited', 0)
+
+
+class GttWatcherTests(SimulatorTestCase):
+    def _watch(self):
+        return BuyOrderWatch.objects.create(
+            user_id=TEST_USER, order_id='1001', tradingsymbol='RELIANCE', quantity=10,
+            buy_price=100, stop_loss=97, target=109,
+        )
+
+    def _order(self, status, filled):
+        return {'order_id': '1001', 'status': status, 'filled_quantity': filled, 'average_price': 100}
+
+    def test_stale_copy_does_not_place_a_second_gtt(self):
+        watch = self._watch()
+        # The watcher loaded its copy before the postback protected the fill
+        stale = BuyOrderWatch.objects.get(pk=watch.pk)
+        handle_order_update(self.kite, watch, self._order('OPEN', 4))
+        handle_order_update(self.kite, stale, self._order('OPEN', 4))
+
+        gtts = self.simulator.market.list_gtts()
+        self.assertEqual(len(gtts), 1)
+        watch.refresh_from_db()
+        self.assertEqual(watch.gtt_id, gtts[0]['id'])
+        self.assertEqual(watch.gtt_quantity, 4)
+
+    def test_older_snapshot_is_skipped(self):
+        watch = self._watch()
+        handle_order_update(self.kite, watch, self._order('OPEN', 6))
+        handle_order_update(self.kite, BuyOrderWatch.objects.get(pk=watch.pk), self._order('OPEN', 2))
+
+        watch.refresh_from_db()
+        self.assertEqual(watch.filled_quantity, 6)
+        self.assertEqual(watch.gtt_quantity, 6)
+        self.assertEqual(self.simulator.market.list_gtts()[0]['orders'][0]['quantity'], 6)
+
+    def test_closed_watch_is_not_reopened(self):
+        watch = self._watch()
+        stale = BuyOrderWatch.objects.get(pk=watch.pk)
+        handle_order_update(self.kite, watch, self._order('COMPLETE', 10))
+        handle_order_update(self.kite, stale, self._order('COMPLETE', 10))
+
+        watch.refresh_from_db()
+        self.assertEqual(watch.status, BuyOrderWatch.STATUS_PROTECTED)
+        self.assertEqual(len(self.simulator.market.list_gtts()), 1)
+
+
+class IdempotencyTests(SimulatorTestCase):
+    def _body(self, user_id=TEST_USER):
+        return json.dumps({'user_id': user_id, 'stock_name': 'RELIANCE', 'quantity': 1})
+
+    def _buy(self, key, user_id=TEST_USER):
+        return self.client.post('/api/stock/buy', self._body(user_id), content_type='application/json',
+                                headers={'Idempotency-Key': key})
+
+    def test_retry_replays_without_a_second_order(self):
+        first = self._buy('buy-1')
+        retry = self._buy('buy-1')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['order_id'], first.json()['order_id'])
+        self.assertEqual(self.requests('order'), 1)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self._buy('buy-1')
+        body = {'user_id': TEST_USER, 'stock_name': 'TCS', 'quantity': 1}
+        response = self.client.post('/api/stock/buy', json.dumps(body), content_type='application/json',
+                                    headers={'Idempotency-Key': 'buy-1'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.requests('order'), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0.3)
+    def test_key_claimed_by_another_worker_is_not_run_again(self):
+        IdempotencyKey.objects.create(
+            path='/api/stock/buy', key='buy-1', fingerprint=hashlib.sha256(self._body().encode()).hexdigest(),
+            expires_at=timezone.now() + timedelta(minutes=1),
+        )
+        response = self._buy('buy-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.requests('order'), 0)
+
+    def test_error_before_any_order_is_not_replayed(self):
+        # No Kite session yet, e.g. the user never logged in
+        failed = self._buy('buy-1', user_id='SIM002')
+        Authenticator.objects.create(user_id='SIM002', api_key='test-key-2', api_secret='test-secret',
+                                     access_token='test-token')
+        retry = self._buy('buy-1', user_id='SIM002')
+
+        self.assertEqual(failed.status_code, 500)
+        self.assertEqual(retry.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', retry)
+        self.assertEqual(self.requests('order'), 1)
+
+
+    def test_order_rejected_by_kite_is_not_replayed(self):
+        body = json.dumps({'user_id': TEST_USER, 'stock_name': 'NOSUCHSTOCK', 'quantity': 1})
+        for _ in range(2):
+            response = self.client.post('/api/stock/buy', body, content_type='application/json',
+                                        headers={'Idempotency-Key': 'buy-1'})
+            self.assertEqual(response.status_code, 500)
+            self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(self.requests('order'), 2)
+
+    @override_settings(KITE_HTTP_TIMEOUT=0.3)
+    def test_timeout_after_the_order_was_sent_is_replayed(self):
+        kite_client_pool.clear()
+        # Kite places the order but answers after the client gave up
+        self.simulator.latency_ms = 1000
+        failed = self._buy('buy-1')
+        self.simulator.latency_ms = 0
+        deadline = time.monotonic() + 5
+        while not self.simulator.market.orders and time.monotonic() < deadline:
+            time.sleep(0.05)
+        retry = self._buy('buy-1')
+
+        self.assertEqual(failed.status_code, 500)
+        self.assertEqual(retry.status_code, 500)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.requests('order'), 1)
+        self.assertEqual(len(self.simulator.market.orders), 1)
+
+class LtpCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'ltp.bin')
+        settings_override = override_settings(LTP_CACHE_PATH=path, LTP_CACHE_MAX_AGE=60)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.writer = ltp_cache.LtpTableWriter(path, 64)
+        self.writer.beat()
+        # Make get_ltp_table() open this test's table
+        ltp_cache._table_checked_at = float('-inf')
+        self.addCleanup(setattr, ltp_cache, '_table_checked_at', float('-inf'))
+
+    def test_fresh_price_is_served(self):
+        self.writer.update(256265, 101.5)
+        self.assertEqual(ltp_cache.get_ltp(256265), 101.5)
+
+    def test_old_price_is_ignored_while_the_stream_is_live(self):
+        self.writer.update(256265, 101.5, updated_at=time.time() - 3600)
+        self.assertIsNone(ltp_cache.get_ltp(256265))
+
+    def test_unsubscribed_price_is_cleared(self):
+        self.writer.update(256265, 101.5)
+        self.writer.update(738561, 2500.0)
+        self.writer.clear([256265])
+        self.assertIsNone(ltp_cache.get_ltp(256265))
+        self.assertEqual(ltp_cache.get_ltp(738561), 2500.0)
+
+
+class HistoricalDownloadTests(SimulatorTestCase):
+    START, END = date(2012, 1, 2), date(2025, 6, 30)
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(OHLCV_STORE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        ohlcv_store._store = None
+        self.addCleanup(setattr, ohlcv_store, '_store', None)
+        self.store = ohlcv_store.get_ohlcv_store()
+        tokens = nse_equity_tokens(self.kite)
+        self.tokens = {symbol: tokens[symbol] for symbol in ('RELIANCE', 'TCS')}
+
+    def _run(self, stop_event=None, progress=None, max_workers=None):
+        journal = open_journal(self.store)
+        try:
+            plan = plan_downloads(self.tokens, ['day'], self.START, self.END, self.store, journal)
+            download_history(self.kite, plan, self.store, journal, max_workers, stop_event, progress)
+        finally:
+            journal.close()
+        return plan
+
+    def test_second_run_makes_no_requests(self):
+        plan = self._run()
+        self.assertEqual([len(chunks) for chunks in plan.values()], [3, 3])
+        self.assertEqual(self.requests('historical'), 6)
+        candles = self.store.candles('RELIANCE')
+        self.assertEqual(str(candles['time'][0].astype('M8[D]')), '2012-01-02')
+        self.assertEqual(str(candles['time'][-1].astype('M8[D]')), '2025-06-30')
+
+        self.assertEqual(self._run(), {})
+        self.assertEqual(self.requests('historical'), 6)
+        self.assertEqual(len(self.store.candles('RELIANCE')), len(candles))
+
+    def test_interrupted_run_resumes_at_the_next_chunk(self):
+        stop_event = threading.Event()
+        self._run(stop_event, progress=lambda stats: stop_event.set(), max_workers=1)
+        self.assertEqual(self.requests('historical'), 1)
+        (symbol,) = self.store.symbols()
+        journal = open_journal(self.store)
+        through = journal.checkpoint(symbol, 'day')
+        journal.close()
+
+        plan = self._run()
+        self.assertEqual(len(plan[(symbol, 'day')]), 2)
+        self.assertEqual(plan[(symbol, 'day')][0].start, through + timedelta(days=1))
+        self.assertEqual(sum(len(chunks) for chunks in plan.values()), 5)
+        self.assertEqual(self.requests('historical'), 6)
+        for symbol in self.tokens:
+            times = self.store.candles(symbol)['time']
+            self.assertTrue((times[1:] > times[:-1]).all())
+            self.assertEqual(str(times[-1].astype('M8[D]')), '2025-06-30')
+
+
+    def test_history_before_the_first_candle_is_reported(self):
+        self._run()
+        journal = open_journal(self.store)
+        try:
+            plan = plan_downloads(self.tokens, ['day'], date(2010, 1, 1), self.END, self.store, journal)
+        finally:
+            journal.close()
+        self.assertEqual(plan, {})
+        self.assertEqual(
+            sorted((chunk.symbol, chunk.start, chunk.end) for chunk in plan.skipped),
+            [('RELIANCE', date(2010, 1, 1), date(2012, 1, 1)), ('TCS', date(2010, 1, 1), date(2012, 1, 1))],
+        )
+
+    def test_worker_errors_are_raised(self):
+        def progress(stats):
+            raise RuntimeError('progress callback failed')
+
+        with self.assertRaisesMessage(RuntimeError, 'progress callback failed'):
+            self._run(progress=progress, max_workers=1)
+
+
+class ScreenerCacheStreamTests(TestCase):
+    CLAUSE = '( {cash} ( latest close > 100 ) )'
+    STOCKS = [{'symbol': 'INFY', 'price': 1500}, {'symbol': 'TCS', 'price': 3500}]
+
+    def setUp(self):
+        self.cache = ScreenerCache(max_entries=10)
+        self.calls = 0
+        self.release = threading.Event()
+
+    def _fetch(self, clause):
+        self.calls += 1
+        for stock in self.STOCKS:
+            yield stock
+            self.release.wait(5)
+
+    def _waiter(self, results):
+        thread = threading.Thread(target=lambda: results.append(list(self.cache.stream(self.CLAUSE, self._fetch))))
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        return thread
+
+    def test_concurrent_streams_share_one_fetch(self):
+        owner = self.cache.stream(self.CLAUSE, self._fetch)
+        self.assertEqual(next(owner), self.STOCKS[0])
+        results = []
+        waiter = self._waiter(results)
+        waiter.join(0.2)
+        self.assertTrue(waiter.is_alive())
+
+        self.release.set()
+        self.assertEqual([self.STOCKS[0], *owner], self.STOCKS)
+        waiter.join(5)
+        self.assertEqual(results, [self.STOCKS])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.stats()['coalesced'], 1)
+
+    def test_waiters_fetch_again_if_the_owner_goes_away(self):
+        owner = self.cache.stream(self.CLAUSE, self._fetch)
+        next(owner)
+        results = []
+        waiter = self._waiter(results)
+        waiter.join(0.2)
+        owner.close()
+        self.release.set()
+        waiter.join(5)
+        self.assertEqual(results, [self.STOCKS])
+        self.assertEqual(self.calls, 2)
+
+    def test_failed_fetch_streams_stale_results(self):
+        self.cache.put(self.CLAUSE, self.STOCKS, fetched_at=1, expires_at=2)
+
+        def _fail(clause):
+            raise ConnectionError('Chartink is down')
+            yield
+
+        stream = self.cache.stream(self.CLAUSE, _fail)
+        self.assertEqual(list(stream), self.STOCKS)
+        self.assertEqual(self.cache.stats()['stale_served'], 1)
+
+
+class GttReconcileTests(SimulatorTestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create(user_id=TEST_USER, email='sim001@example.com')
+        self.trade = Trade.objects.create(user=user, stock='RELIANCE', sb=10, slp=97, tgtp=109)
+        self.gtt_id = place_oco_gtt(self.kite, 'RELIANCE', 10, 97, 109, 100)
+
+    def test_get_reports_links_without_saving_them(self):
+        response = self.client.get('/api/gtt/reconcile/', {'user_id': TEST_USER})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['linked'], 1)
+        self.trade.refresh_from_db()
+        self.assertIsNone(self.trade.gtt_id)
+
+    def test_post_saves_links(self):
+        response = self.client.post('/api/gtt/reconcile/', json.dumps({'user_id': TEST_USER}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['linked'], 1)
+        self.trade.refresh_from_db()
+        self.assertEqual(self.trade.gtt_id, self.gtt_id)
+
+
+class ScreenerChangesTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(user_id=TEST_USER, email='sim001@example.com')
+        Screener.objects.create(screener_name='breakout', scan_clause='( {cash} ( latest close > 100 ) )', created_by=user)
+
+    def test_invalid_since_is_rejected(self):
+        for since in ('inf', '1e20', 'nan', '2024-13-45T00:00', 'yesterday'):
+            response = self.client.get('/api/screener/breakout/changes/', {'since': since})
+            self.assertEqual(response.status_code, 400, since)
+
+    def test_valid_since_is_accepted(self):
+        for since in ('1717386300', '2024-06-03T09:15'):
+            response = self.client.get('/api/screener/breakout/changes/', {'since': since})
+            self.assertEqual(response.status_code, 200, since)
+
+
+def candles(closes, start=date(2024, 6, 3)):
+    return [(start + timedelta(days=index), close, close + 1, close - 1, close, 1000) for index, close in enumerate(closes)]
+
+
+class ScanEngineTests(SimpleTestCase):
+    def setUp(self):
+        # AAA rises every day; BBB falls for four days, then jumps back above its average
+        self.panel = OhlcvPanel.from_candles({
+            'AAA': candles([10, 11, 12, 13, 14, 15]),
+            'BBB': candles([20, 18, 16, 14, 12, 19]),
+        })
+
+    def latest(self, expression):
+        # The value node of "<expression> > 0", evaluated at the latest date
+        node = scan_engine.compile_clause(f'{expression} > 0')[2]
+        return scan_engine._Evaluation(self.panel).value(node, 1)[:, -1].tolist()
+
+    def matching(self, scan_clause):
+        return [row['symbol'] for row in scan_engine.evaluate(scan_clause, self.panel)]
+
+    def test_unsupported_clauses_are_rejected(self):
+        for scan_clause in (
+            'latest close > weekly close',
+            'latest close > 1 week ago close',
+            'latest close > 15 minute close',
+            '[0] 5 minute close > 10',
+            '[1] close > 10',
+            'latest sma( close ) > 10',
+            'latest rsi( 14,2 ) > 50',
+            'latest sma( close,0 ) > 10',
+            'latest ema( close,0 ) > 10',
+        ):
+            with self.assertRaises(scan_engine.ScanClauseError, msg=scan_clause):
+                scan_engine.compile_clause(scan_clause)
+
+    def test_indicators_match_hand_computed_values(self):
+        self.assertEqual(self.latest('latest sma( close,3 )'), [14.0, 15.0])
+        self.assertEqual(self.latest('1 day ago sma( close,3 )'), [13.0, 14.0])
+        # Seeded with the first close: e = e + 2/3 * (close - e) over the six closes
+        for actual, expected in zip(self.latest('latest ema( close,2 )'), [3524 / 243, 4130 / 243]):
+            self.assertAlmostEqual(actual, expected)
+        # BBB: average loss 2 -> 1 and average gain 0 -> 3.5 on the last day (Wilder, period 2)
+        rsi = self.latest('latest rsi( 2 )')
+        self.assertEqual(rsi[0], 100.0)
+        self.assertAlmostEqual(rsi[1], 100 - 100 / 4.5)
+        self.assertEqual(self.latest('latest count( 5, 1 where latest close > 1 day ago close )'), [5.0, 1.0])
+
+    def test_cross_and_count_conditions(self):
+        self.assertEqual(self.matching('latest close crossed above latest sma( close,3 )'), ['BBB'])
+        self.assertEqual(self.matching('latest close crossed below latest sma( close,3 )'), [])
+        self.assertEqual(self.matching('( {cash} ( latest count( 5, 1 where latest close > 1 day ago close ) >= 5 ) )'), ['AAA'])
+        self.assertEqual(scan_engine.evaluate('latest rsi( 2 ) < 80', self.panel), [{'symbol': 'BBB', 'price': 19.0}])
+
+    def test_evaluate_many_shares_sub_expressions(self):
+        with mock.patch.object(scan_engine, '_sma', wraps=scan_engine._sma) as sma:
+            results = scan_engine.evaluate_many([
+                'latest close > latest sma( close,3 )',
+                'latest close crossed above latest sma( close,3 )',
+                'latest sma( close,3 ) > 14.5',
+            ], self.panel)
+        self.assertEqual([[row['symbol'] for row in rows] for rows in results], [['AAA', 'BBB'], ['BBB'], ['BBB']])
+        # One sma over the two latest dates (for the cross) and one over the latest date
+        self.assertEqual(sma.call_count, 2)
+
+
+class BacktestTests(SimpleTestCase):
+    START = date(2024, 6, 3)
+    FLAT = (100, 101, 99, 100, 1000)
+
+    def make_panel(self, days=10, **moves):
+        # Every symbol trades flat at 100 except on the days given as {day: (open, high, low, close, volume)}
+        return OhlcvPanel.from_candles({
+            symbol: [(self.START + timedelta(days=day), *overrides.get(day, self.FLAT)) for day in range(days)]
+            for symbol, overrides in moves.items()
+        })
+
+    def simulate(self, panel, signal_days, **params):
+        signals = np.zeros((len(panel.symbols), len(panel.dates)), dtype=bool)
+        for row, symbol in enumerate(panel.symbols):
+            signals[row, signal_days.get(symbol, [])] = True
+        return backtest.simulate_trades(signals, panel, **params)
+
+    def test_gaps_fill_at_the_open_and_the_stop_wins_ties(self):
+        panel = self.make_panel(
+            BOTH={2: (100, 110, 96, 100, 1000)},
+            GAPDOWN={2: (95, 96, 94, 95, 1000)},
+            GAPUP={2: (112, 113, 111, 112, 1000)},
+            TOUCH={2: (100, 109, 99, 108, 1000)},
+        )
+        trades = self.simulate(panel, {symbol: [0] for symbol in panel.symbols})
+        self.assertEqual([panel.symbols[index] for index in trades['symbol']], ['BOTH', 'GAPDOWN', 'GAPUP', 'TOUCH'])
+        self.assertEqual(trades['entry_index'].tolist(), [1, 1, 1, 1])
+        self.assertEqual(trades['exit_index'].tolist(), [2, 2, 2, 2])
+        self.assertEqual(trades['slp'].tolist(), [97.0] * 4)
+        self.assertEqual(trades['tgtp'].tolist(), [109.0] * 4)
+        self.assertEqual(trades['exit_price'].tolist(), [97.0, 95.0, 112.0, 109.0])
+        self.assertEqual(trades['outcome'].tolist(), [backtest.STOP, backtest.STOP, backtest.TARGET, backtest.TARGET])
+
+    def test_one_position_per_symbol(self):
+        panel = self.make_panel(AAA={2: (100, 101, 96, 97, 1000), 4: (100, 110, 99, 105, 1000)})
+        # Day 1's signal comes while the day 0 position is open, day 7's while the day 5 one is
+        trades = self.simulate(panel, {'AAA': [0, 1, 2, 5, 7]}, max_hold=3)
+        self.assertEqual(trades['entry_index'].tolist(), [1, 3, 6])
+        self.assertEqual(trades['exit_index'].tolist(), [2, 4, 8])
+        self.assertEqual(trades['exit_price'].tolist(), [97.0, 109.0, 100.0])
+        self.assertEqual(trades['outcome'].tolist(), [backtest.STOP, backtest.TARGET, backtest.TIMEOUT])
+        self.assertEqual(trades['pnl'].tolist(), [-3.0, 9.0, 0.0])
+
+        taken = backtest._one_per_symbol(
+            np.array([0, 0, 0, 1, 1]), np.array([1, 2, 5, 0, 3]), np.array([3, 4, 6, 4, 5]), 10
+        )
+        self.assertEqual(taken.tolist(), [0, 2, 3])
+
+    def test_position_sizing(self):
+        panel = self.make_panel(AAA={2: (100, 110, 99, 105, 1000)})
+        # Entry 100, slp 97: stb_sl = floor(rpt / 3), stb_ipt = floor(ipt / 100)
+        for params, shares in (({'rpt': 100}, 33), ({'ipt': 2000}, 20), ({'rpt': 100, 'ipt': 2000}, 20),
+                               ({'rpt': 100, 'ipt': 5000}, 33), ({}, 1)):
+            trades = self.simulate(panel, {'AAA': [0]}, **params)
+            self.assertEqual(trades['shares'].tolist(), [shares], params)
+            self.assertEqual(trades['pnl'].tolist(), [9.0 * shares], params)
+        # Not even one share fits the investment per trade
+        self.assertEqual(len(self.simulate(panel, {'AAA': [0]}, ipt=50)['symbol']), 0)
+
+    def test_trade_metrics(self):
+        panel = self.make_panel(AAA={2: (100, 101, 96, 97, 1000), 4: (100, 110, 99, 105, 1000)})
+        trades = self.simulate(panel, {'AAA': [0, 2, 5]}, max_hold=3)
+        metrics = backtest.trade_metrics(trades, len(panel.dates))
+        self.assertEqual(metrics['trades'], 3)
+        self.assertEqual(metrics['win_rate'], 33.33)
+        self.assertEqual(metrics['exits'], {'stop': 1, 'target': 1, 'timeout': 1})
+        self.assertEqual(metrics['total_pnl'], 6.0)
+        self.assertEqual(metrics['profit_factor'], 3.0)
+        self.assertEqual(metrics['avg_r'], 0.67)
+        self.assertEqual(metrics['avg_hold_days'], 1.3)
+        self.assertEqual(metrics['max_invested'], 100.0)
+        self.assertEqual(metrics['max_positions'], 1)
+        self.assertEqual(metrics['return_pct'], 6.0)
+        self.assertEqual(metrics['max_drawdown_pct'], 3.0)
+        self.assertEqual(backtest.trade_metrics(self.simulate(panel, {}), len(panel.dates)), {'trades': 0})
+
+
+class BacktestSweepTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(OHLCV_STORE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        ohlcv_store._store = None
+        self.addCleanup(setattr, ohlcv_store, '_store', None)
+        store = ohlcv_store.get_ohlcv_store()
+        start = date(2024, 6, 3)
+        for symbol, step in (('AAA', 1), ('BBB', -1)):
+            closes = [100 + step * ((day * 7) % 11) for day in range(40)]
+            store.append(symbol, [
+                (start + timedelta(days=day), close, close + 4, close - 4, close, 1000)
+                for day, close in enumerate(closes)
+            ])
+
+    def test_sweep_matches_in_process_backtests(self):
+        clauses = {'rising': 'latest close > 1 day ago close', 'falling': 'latest close < 1 day ago close'}
+        grid = [{}, {'stop_pct': 5, 'target_pct': 5, 'max_hold': 5}]
+        start, end = date(2024, 6, 10), date(2024, 7, 12)
+        results = backtest.run_sweep(clauses, grid, start, end, max_workers=1)
+
+        panel, start_index = backtest.load_backtest_panel(start, end)
+        expected = [
+            (name, params, backtest.backtest(clause, panel, start_index, **params)['metrics'])
+            for name, clause in clauses.items() for params in grid
+        ]
+        self.assertEqual(results, expected)
+        self.assertTrue(all(metrics['trades'] for _, _, metrics in results))
+
+
+class OhlcvStoreAppendTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = ohlcv_store.OhlcvStore(directory.name)
+        self.store.append('INFY', candles([10, 11, 12]))
+
+    def closes(self):
+        return self.store.records('INFY')['close'].tolist()
+
+    def test_partial_trailing_record_is_ignored_then_truncated(self):
+        path = self.store.path('INFY')
+        with open(path, 'ab') as fh:
+            fh.write(b'\x00' * (ohlcv_store.CANDLE.itemsize // 2))
+        self.assertEqual(self.closes(), [10.0, 11.0, 12.0])
+
+        self.assertEqual(self.store.append('INFY', [(date(2024, 6, 6), 13, 14, 12, 13, 1000)]), 1)
+        self.assertEqual(os.path.getsize(path), 4 * ohlcv_store.CANDLE.itemsize)
+        self.assertEqual(self.closes(), [10.0, 11.0, 12.0, 13.0])
+
+    def test_last_candle_is_rewritten_in_place(self):
+        # The day's candle fetched again after the close
+        self.assertEqual(self.store.append('INFY', [(date(2024, 6, 5), 12, 16, 11, 15, 3000)]), 0)
+        self.assertEqual(self.closes(), [10.0, 11.0, 15.0])
+        self.assertEqual(self.store.records('INFY')['volume'][-1], 3000)
+
+        added = self.store.append('INFY', [(date(2024, 6, 5), 12, 16, 11, 16, 4000), (date(2024, 6, 6), 16, 17, 15, 17, 1000)])
+        self.assertEqual(added, 1)
+        self.assertEqual(self.closes(), [10.0, 11.0, 16.0, 17.0])
+
+    def test_older_candles_are_ignored(self):
+        rows = [(date(2024, 6, 1), 1, 1, 1, 1, 1), (date(2024, 6, 4), 99, 99, 99, 99, 99)]
+        self.assertEqual(self.store.append('INFY', rows), 0)
+        self.assertEqual(self.closes(), [10.0, 11.0, 12.0])
+        self.assertEqual(str(self.store.records('INFY')['time'][0].astype('M8[D]')), '2024-06-03')
+
+    def test_cached_map_stays_valid_after_growth(self):
+        before = self.store.records('INFY')
+        self.assertIs(self.store.records('INFY'), before)
+
+        self.store.append('INFY', [(date(2024, 6, 6), 13, 14, 12, 13, 1000)])
+        after = self.store.records('INFY')
+        self.assertIsNot(after, before)
+        self.assertEqual(after['close'].tolist(), [10.0, 11.0, 12.0, 13.0])
+        # The old map still reads the records it covered
+        self.assertEqual(before['close'].tolist(), [10.0, 11.0, 12.0])
+        self.assertEqual(len(self.store.candles('INFY', start=date(2024, 6, 5))), 2)
+
+
+class QuoteCacheCoalescingTests(SimpleTestCase):
+    QUOTE = {'symbol': 'INFY', 'last_price': 1500.0}
+
+    def test_waiter_does_not_inherit_the_owners_error(self):
+        cache = QuoteCache(ttl=60, negative_ttl=60, max_entries=10)
+        release = threading.Event()
+        calls = []
+
+        def fetch_quotes(kite, symbols):
+            calls.append(kite)
+            if kite == 'expired-session':
+                release.wait(5)
+                raise PermissionError('Incorrect api_key or access_token')
+            return {'INFY': self.QUOTE}
+
+        results = {}
+
+        def get(kite):
+            try:
+                results[kite] = cache.get_many(kite, ['INFY'])
+            except Exception as e:
+                results[kite] = e
+
+        with mock.patch('trading.utils.quote_cache.fetch_quotes', side_effect=fetch_quotes):
+            owner = threading.Thread(target=get, args=('expired-session',))
+            owner.start()
+            while not calls:
+                time.sleep(0.01)
+            waiter = threading.Thread(target=get, args=('valid-session',))
+            waiter.start()
+            while not cache.stats()['coalesced']:
+                time.sleep(0.01)
+            release.set()
+            owner.join(5)
+            waiter.join(5)
+
+        self.assertIsInstance(results['expired-session'], PermissionError)
+        self.assertEqual(results['valid-session'], {'INFY': self.QUOTE})
+        self.assertEqual(calls, ['expired-session', 'valid-session'])
+        stats = cache.stats()
+        self.assertEqual((stats['fetches'], stats['errors'], stats['size']), (2, 1, 1))
+
+
+class InstrumentMasterReloadTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(INSTRUMENT_MASTER_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for name in ('_master', '_master_checked_at'):
+            self.addCleanup(setattr, instrument_master, name, getattr(instrument_master, name))
+            setattr(instrument_master, name, None)
+
+    def test_missing_master_is_checked_once_per_interval(self):
+        with mock.patch('trading.utils.instrument_master.open', side_effect=FileNotFoundError, create=True) as opened:
+            self.assertIsNone(instrument_master.get_instrument_master())
+            self.assertIsNone(instrument_master.get_instrument_master())
+        self.assertEqual(opened.call_count, 1)
+
+        instrument_master.build_instrument_master([
+            {'instrument_token': 408065, 'exchange': 'NSE', 'tradingsymbol': 'INFY', 'name': 'INFOSYS'},
+        ])
+        self.assertIsNone(instrument_master.get_instrument_master())
+        instrument_master._master_checked_at -= instrument_master.RELOAD_CHECK_INTERVAL
+        master = instrument_master.get_instrument_master()
+        self.assertEqual(len(master), 1)
@@ -5,7 +5,7 @@ from .utils.generate_token_api import generate_token,check_token
 from .utils.kite_authenticator import register_user, get_all_users, set_logged_in_user
 from .views_user_roi import user_roi
 from .screener_api import screener
-from .views import stocks_by_screener, buy_stock, set_gtt
+from .views import stocks_by_screener, stocks_by_screener_batch, screener_run_changes, buy_stock, buy_stock_bulk, set_gtt, set_gtt_bulk, reconcile_gtts, sync_portfolio, quotes, quote_cache_stats, kite_breakers, ltp, search_instruments, ohlcv, submit_order, job_status, kite_postback
 
 urlpatterns = [
     path('health/', health_check, name='health_check'),
@@ -16,9 +16,24 @@ urlpatterns = [
     path('generate-token/', generate_token, name='generate_token'),
     path('user_roi/', user_roi, name='user-roi'),
     path('screener/', screener, name='screener'),
+    path('screener/<str:screener_name>/changes/', screener_run_changes, name='screener-changes'),
     path('stocks/', stocks_by_screener, name='stocks-by-screener'),
+    path('stocks/batch/', stocks_by_screener_batch, name='stocks-by-screener-batch'),
     path('stock/buy', buy_stock, name='buy-stock'),
+    path('stock/buy/bulk', buy_stock_bulk, name='buy-stock-bulk'),
+    path('quotes/', quotes, name='quotes'),
+    path('quotes/cache-stats/', quote_cache_stats, name='quote-cache-stats'),
+    path('kite/breakers/', kite_breakers, name='kite-breakers'),
+    path('ltp/', ltp, name='ltp'),
+    path('instruments/search/', search_instruments, name='search-instruments'),
+    path('ohlcv/<str:symbol>/', ohlcv, name='ohlcv'),
     path('gtt/', set_gtt, name='set-gtt'),
+    path('gtt/bulk/', set_gtt_bulk, name='set-gtt-bulk'),
+    path('gtt/reconcile/', reconcile_gtts, name='reconcile-gtts'),
+    path('portfolio/sync/', sync_portfolio, name='sync-portfolio'),
+    path('orders/jobs/', submit_order, name='submit-order'),
+    path('jobs/<uuid:job_id>/', job_status, name='job-status'),
+    path('kite/postback/', kite_postback, name='kite-postback'),
     path('check_token', check_token, name='check_token'),
     path('register-user', register_user, name='register-user'),
     path('users', get_all_users, name='get-all-users'),
@@ -0,0 +1,278 @@
+"""
+Vectorised backtests of scan clauses over the daily candles in the OHLCV store.
+
+A clause is evaluated at every date at once (scan_engine.evaluate_history), and each
+match is a trade entered the way the trade table does it: at the next session's open
+(or the signal day's close), with stop loss slp = floor(cmp * 0.97) and target
+tgtp = floor(cmp * 1.09) by default, and shares = min(stb_sl, stb_ipt) where
+stb_sl = floor(rpt / (cmp - slp)) and stb_ipt = floor(ipt / cmp).
+
+Exits for all signals are found together: the lows and highs of the next `max_hold`
+sessions are gathered into one (signals x max_hold) array and the first session that
+touches slp or tgtp is the exit (the stop wins when both are touched on one day; a gap
+through a level fills at the open). Trades still open after max_hold sessions exit at
+that close. Only one position per symbol is held at a time: each round picks every
+symbol's first signal after its previous exit with one searchsorted over all symbols.
+
+Portfolio metrics treat every trade as taken (no cash limit); max_invested shows how
+much capital that would have needed. run_sweep() fans (clause, parameters) runs out
+over a process pool, each worker reading the store through its own memory maps.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+
+from .ohlcv_store import get_ohlcv_store
+from .scan_engine import evaluate_history
+
+logger = logging.getLogger('trading')
+
+DEFAULT_STOP_PCT = 3.0
+DEFAULT_TARGET_PCT = 9.0
+DEFAULT_MAX_HOLD = 60
+# Calendar days loaded before the backtest start so indicators (e.g. sma 200) are warm
+WARMUP_DAYS = 400
+# Signals whose exit windows are gathered at once, to bound memory
+EXIT_BATCH = 20000
+TRADING_DAYS_PER_YEAR = 252
+
+STOP, TARGET, TIMEOUT = 0, 1, 2
+OUTCOMES = ('stop', 'target', 'timeout')
+
+
+def load_backtest_panel(start, end, symbols=None):
+    """
+    Daily panel from WARMUP_DAYS before `start` to `end`, and the index of the first
+    date on or after `start`.
+    """
+    panel = get_ohlcv_store().panel(symbols, start=start - timedelta(days=WARMUP_DAYS), end=end)
+    return panel, int(np.searchsorted(panel.dates, np.datetime64(start, 'D')))
+
+
+def _levels(price, stop_pct, target_pct):
+    """
+    (slp, tgtp) rounded down to whole rupees like the trade form, unless rounding would
+    put the target at or below the entry (prices under ~12).
+    """
+    slp = np.floor(price * (1 - stop_pct / 100))
+    tgtp = np.floor(price * (1 + target_pct / 100))
+    tgtp = np.where(tgtp > price, tgtp, price * (1 + target_pct / 100))
+    return slp, tgtp
+
+
+def _shares(price, slp, rpt, ipt):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stb_sl = np.floor(rpt / (price - slp)) if rpt else np.zeros_like(price)
+        stb_ipt = np.floor(ipt / price) if ipt else np.zeros_like(price)
+    stb_sl = np.where(stb_sl > 0, stb_sl, np.inf)
+    stb_ipt = np.where(stb_ipt > 0, stb_ipt, np.inf)
+    shares = np.minimum(stb_sl, stb_ipt)
+    return np.where(np.isfinite(shares), shares, 0)
+
+
+def _exits(panel, closes, symbol, first, slp, tgtp, max_hold):
+    """
+    (exit index, exit price, outcome) for positions whose first session that can exit is
+    `first`, checking up to max_hold sessions.
+    """
+    fields = panel.fields
+    dates = len(panel.dates)
+    exit_index = np.empty(len(symbol), dtype=np.int64)
+    exit_price = np.empty(len(symbol))
+    outcome = np.empty(len(symbol), dtype=np.int8)
+    offsets = np.arange(max_hold)
+    for lo in range(0, len(symbol), EXIT_BATCH):
+        rows = slice(lo, lo + EXIT_BATCH)
+        sessions = first[rows, None] + offsets
+        inside = sessions < dates
+        sessions = np.minimum(sessions, dates - 1)
+        rows_index = symbol[rows, None]
+        low = np.where(inside, fields['low'][rows_index, sessions], np.nan)
+        high = np.where(inside, fields['high'][rows_index, sessions], np.nan)
+        stopped = low <= slp[rows, None]
+        reached = high >= tgtp[rows, None]
+        hit = stopped | reached
+        any_hit = hit.any(axis=1)
+        step = hit.argmax(axis=1)
+        batch = np.arange(len(step))
+        hit_at = sessions[batch, step]
+        opened = fields['open'][symbol[rows], hit_at]
+        is_stop = stopped[batch, step]
+        # A gap through the level fills at the open
+        price = np.where(is_stop, np.fmin(opened, slp[rows]), np.fmax(opened, tgtp[rows]))
+
+        last = np.minimum(first[rows] + max_hold - 1, dates - 1)
+        exit_index[rows] = np.where(any_hit, hit_at, last)
+        exit_price[rows] = np.where(any_hit, price, closes[symbol[rows], last])
+        outcome[rows] = np.where(any_hit, np.where(is_stop, STOP, TARGET), TIMEOUT)
+    return exit_index, exit_price, outcome
+
+
+def _one_per_symbol(symbol, entry_index, exit_index, dates):
+    """
+    Indices of the signals taken when a symbol is only re-entered after its previous
+    exit. symbol/entry_index must be sorted by (symbol, entry_index).
+    """
+    keys = symbol * (dates + 2) + entry_index
+    pending = np.unique(symbol)
+    cursor = np.zeros(len(pending), dtype=np.int64)
+    taken = []
+    while len(pending):
+        position = np.searchsorted(keys, pending * (dates + 2) + cursor)
+        found = position < len(keys)
+        found[found] = symbol[position[found]] == pending[found]
+        position, pending = position[found], pending[found]
+        taken.append(position)
+        cursor = exit_index[position] + 1
+    return np.sort(np.concatenate(taken)) if taken else np.empty(0, dtype=np.int64)
+
+
+def simulate_trades(signals, panel, start_index=0, stop_pct=DEFAULT_STOP_PCT, target_pct=DEFAULT_TARGET_PCT,
+                    max_hold=DEFAULT_MAX_HOLD, rpt=None, ipt=None, entry='open'):
+    """
+    Trades for a (symbols x dates) signal array, as a dict of equal-length arrays:
+    symbol, entry_index, exit_index (panel indices), entry_price, exit_price, slp, tgtp,
+    shares, pnl, outcome (STOP / TARGET / TIMEOUT). Signals before start_index are ignored.
+    Without rpt and ipt every trade is one share.
+    """
+    fields = panel.fields
+    dates = len(panel.dates)
+    symbol, day = np.nonzero(signals[:, start_index:])
+    day = day + start_index
+    if entry == 'open':
+        entry_index, first = day + 1, day + 1
+        inside = entry_index < dates
+        symbol, entry_index, first = symbol[inside], entry_index[inside], first[inside]
+        price = fields['open'][symbol, entry_index]
+    else:
+        entry_index, first = day, day + 1
+        price = fields['close'][symbol, entry_index]
+    valid = np.isfinite(price) & (price > 0)
+    symbol, entry_index, first, price = symbol[valid], entry_index[valid], first[valid], price[valid]
+
+    slp, tgtp = _levels(price, stop_pct, target_pct)
+    shares = _shares(price, slp, rpt, ipt) if rpt or ipt else np.ones_like(price)
+    affordable = shares > 0
+    symbol, entry_index, first, price, slp, tgtp, shares = (
+        array[affordable] for array in (symbol, entry_index, first, price, slp, tgtp, shares)
+    )
+
+    # Suspended days have no candle; a timeout on one exits at the last known close
+    closes = fields['close']
+    carried = np.where(np.isnan(closes), 0, np.arange(dates))
+    np.maximum.accumulate(carried, axis=1, out=carried)
+    closes = closes[np.arange(len(closes))[:, None], carried]
+
+    exit_index, exit_price, outcome = _exits(panel, closes, symbol, first, slp, tgtp, max_hold)
+    taken = _one_per_symbol(symbol, entry_index, exit_index, dates)
+    trades = {
+        'symbol': symbol, 'entry_index': entry_index, 'exit_index': exit_index, 'entry_price': price,
+        'exit_price': exit_price, 'slp': slp, 'tgtp': tgtp, 'shares': shares, 'outcome': outcome,
+    }
+    trades = {name: values[taken] for name, values in trades.items()}
+    trades['pnl'] = (trades['exit_price'] - trades['entry_price']) * trades['shares']
+    return trades
+
+
+def trade_metrics(trades, dates, start_index=0, capital=None):
+    """
+    Trade-level and portfolio metrics of simulate_trades() output over `dates` sessions.
+    """
+    pnl = trades['pnl']
+    count = len(pnl)
+    if not count:
+        return {'trades': 0}
+    entry, exit_ = trades['entry_price'], trades['exit_price']
+    invested = entry * trades['shares']
+    returns = (exit_ / entry - 1) * 100
+    wins, losses = pnl > 0, pnl < 0
+    gross_win, gross_loss = pnl[wins].sum(), -pnl[losses].sum()
+    held = trades['exit_index'] - trades['entry_index']
+
+    # Capital and positions in use per session, from +/- steps at entry and after exit
+    steps = dates + 1
+    in_use = np.cumsum(
+        np.bincount(trades['entry_index'], invested, steps) - np.bincount(trades['exit_index'] + 1, invested, steps)
+    )
+    open_positions = np.cumsum(
+        np.bincount(trades['entry_index'], minlength=steps) - np.bincount(trades['exit_index'] + 1, minlength=steps)
+    )
+    capital = capital or float(in_use.max())
+    realised = np.bincount(trades['exit_index'], pnl, dates)[start_index:]
+    equity = capital + np.cumsum(realised)
+    peak = np.maximum.accumulate(np.maximum(equity, capital))
+    daily = realised / capital
+    years = max(len(realised), 1) / TRADING_DAYS_PER_YEAR
+    final = equity[-1] if len(equity) else capital
+
+    return {
+        'trades': count,
+        'win_rate': round(float(wins.mean() * 100), 2),
+        'avg_return_pct': round(float(returns.mean()), 2),
+        'avg_win_pct': round(float(returns[wins].mean()), 2) if wins.any() else None,
+        'avg_loss_pct': round(float(returns[losses].mean()), 2) if losses.any() else None,
+        'profit_factor': round(float(gross_win / gross_loss), 2) if gross_loss else None,
+        'expectancy': round(float(pnl.mean()), 2),
+        'avg_r': round(float(np.mean((exit_ - entry) / (entry - trades['slp']))), 2),
+        'avg_hold_days': round(float(held.mean()), 1),
+        'exits': {name: int((trades['outcome'] == code).sum()) for code, name in enumerate(OUTCOMES)},
+        'total_pnl': round(float(pnl.sum()), 2),
+        'return_pct': round(float((final / capital - 1) * 100), 2),
+        'cagr_pct': round(float(((final / capital) ** (1 / years) - 1) * 100), 2) if final > 0 else None,
+        'max_drawdown_pct': round(float(((peak - equity) / peak).max() * 100), 2) if len(equity) else 0.0,
+        'sharpe': round(float(daily.mean() / daily.std() * np.sqrt(TRADING_DAYS_PER_YEAR)), 2) if daily.std() else None,
+        'capital': round(capital, 2),
+        'max_invested': round(float(in_use.max()), 2),
+        'max_positions': int(open_positions.max()),
+    }
+
+
+def backtest(scan_clause, panel, start_index=0, signals=None, capital=None, **params):
+    """
+    Backtest one clause over a panel (see simulate_trades for params). Returns
+    {"params", "metrics", "trades"}; pass precomputed `signals` to reuse them.
+    """
+    if signals is None:
+        signals = evaluate_history(scan_clause, panel)
+    trades = simulate_trades(signals, panel, start_index, **params)
+    return {
+        'params': params,
+        'metrics': trade_metrics(trades, len(panel.dates), start_index, capital),
+        'trades': trades,
+    }
+
+
+_worker_panel = None
+_worker_signals = {}
+
+
+def _init_worker(start, end, symbols):
+    global _worker_panel
+    import django
+    django.setup()
+    _worker_panel = load_backtest_panel(start, end, symbols)
+
+
+def _run_in_worker(name, scan_clause, capital, params):
+    panel, start_index = _worker_panel
+    signals = _worker_signals.get(scan_clause)
+    if signals is None:
+        signals = _worker_signals[scan_clause] = evaluate_history(scan_clause, panel)
+    result = backtest(scan_clause, panel, start_index, signals, capital, **params)
+    return name, result['params'], result['metrics']
+
+
+def run_sweep(scan_clauses, grid, start, end, symbols=None, capital=None, max_workers=None):
+    """
+    Backtest every {name: scan_clause} with every parameter dict in `grid` on a process
+    pool. Returns [(name, params, metrics), ...] in (clause, grid) order; raises
+    ScanClauseError if a clause is not supported locally.
+    """
+    tasks = [(name, clause, capital, params) for name, clause in scan_clauses.items() for params in grid]
+    workers = min(max_workers or settings.BACKTEST_WORKERS, len(tasks)) or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(start, end, symbols)) as executor:
+        futures = [executor.submit(_run_in_worker, *task) for task in tasks]
+        return [future.result() for future in futures]
@@ -0,0 +1,172 @@
+"""
+Re-arm stop-loss/target GTTs for every open trade of a user in one pass.
+
+Open trades are Trade rows with no pl yet and shares bought (sb > 0). Their triggers
+come from slp (stop-loss price) and tgtp (target price). All symbols are priced with
+one batched quote call, existing active GTTs are fetched once so trades that are
+already protected are skipped, and the remaining GTTs are placed concurrently; the
+pooled client's GTT rate limiter keeps the burst within Kite's limit. The GTT id is
+stored on each trade (Trade.gtt_id).
+"""
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db.models import Q
+
+from ..models.trade import Trade
+from .kite_transaction_manager import get_kite_client, place_oco_gtt
+from .quote_cache import quote_cache
+
+logger = logging.getLogger('trading')
+
+
+def open_trades(user_id):
+    """
+    Open trades of a user: pl not set yet and a positive share count.
+    """
+    return (
+        Trade.objects.filter(user__user_id=user_id, sb__gt=0)
+        .filter(Q(pl__isnull=True) | Q(pl=''))
+        .exclude(stock__isnull=True).exclude(stock='')
+        .order_by('id')
+    )
+
+
+def fetch_active_oco_gtts(kite):
+    """
+    Active two-leg GTTs whose legs are all sells, i.e. stop-loss/target protection.
+    """
+    return [
+        gtt for gtt in kite.get_gtts()
+        if gtt.get('status') == 'active'
+        and gtt.get('type') == kite.GTT_TYPE_OCO
+        and all(order.get('transaction_type') == kite.TRANSACTION_TYPE_SELL for order in gtt.get('orders', []))
+    ]
+
+
+def index_by_symbol(gtts, exclude_ids=()):
+    """
+    {symbol: [(trigger_id, quantity), ...]} for the given GTTs.
+    """
+    index = defaultdict(list)
+    for gtt in gtts:
+        if gtt['id'] not in exclude_ids:
+            index[gtt['condition']['tradingsymbol']].append((gtt['id'], int(gtt['orders'][0]['quantity'])))
+    return index
+
+
+def plan_trade(trade, quote):
+    """
+    Work out the GTT for one trade. Returns (plan, error).
+    """
+    symbol = trade.stock.strip().upper()
+    plan = {
+        'trade_id': trade.id,
+        'stock': symbol,
+        'quantity': int(trade.sb),
+        'stop_loss': trade.slp,
+        'target': trade.tgtp,
+    }
+    if trade.slp is None or trade.tgtp is None:
+        return plan, 'Trade has no stop loss (slp) or target (tgtp) price'
+    if trade.slp >= trade.tgtp:
+        return plan, 'Stop loss must be below target'
+    if quote is None:
+        return plan, f'Instrument {symbol} not found on NSE or BSE'
+    last_price = quote['last_price']
+    plan.update({'exchange': quote['exchange'], 'last_price': last_price})
+    if last_price is not None and not trade.slp < last_price < trade.tgtp:
+        return plan, f'Last price {last_price} is outside stop loss {trade.slp} / target {trade.tgtp}'
+    return plan, None
+
+
+def arm_open_trades(user_id, dry_run=False, skip_protected=True, max_workers=None):
+    """
+    Place an OCO GTT for each open trade of the user.
+
+    Args:
+        user_id: User ID for authentication
+        dry_run: Validate and report without placing anything
+        skip_protected: Leave trades alone whose linked GTT is still active, or that have
+            an unlinked active OCO GTT with the same symbol and quantity
+        max_workers: Concurrent GTT requests (defaults to settings.BULK_GTT_MAX_WORKERS)
+
+    Returns:
+        list: One result per open trade with status "placed", "planned" (dry run),
+        "skipped" (already protected) or "error"
+    """
+    trades = list(open_trades(user_id))
+    if not trades:
+        return []
+    kite = get_kite_client(user_id)
+    quotes = quote_cache.get_many(kite, [trade.stock for trade in trades])
+    active = fetch_active_oco_gtts(kite) if skip_protected else []
+    active_ids = {gtt['id'] for gtt in active}
+    linked_ids = {trade.gtt_id for trade in trades if trade.gtt_id in active_ids}
+    # GTTs already linked to a trade are only ever matched to that trade
+    existing = index_by_symbol(active, exclude_ids=linked_ids)
+
+    results = []
+    to_place = []
+    for trade in trades:
+        plan, error = plan_trade(trade, quotes.get(trade.stock.strip().upper()))
+        if error:
+            results.append({**plan, 'status': 'error', 'error': error})
+            continue
+        if trade.gtt_id in linked_ids:
+            results.append({**plan, 'status': 'skipped', 'gtt_id': trade.gtt_id})
+            continue
+        match = next((gtt for gtt in existing.get(plan['stock'], []) if gtt[1] == plan['quantity']), None)
+        if match:
+            # Each existing GTT covers only one trade
+            existing[plan['stock']].remove(match)
+            results.append({**plan, 'status': 'skipped', 'gtt_id': match[0]})
+            continue
+        result = {**plan, 'status': 'planned'}
+        results.append(result)
+        to_place.append(result)
+
+    if not dry_run:
+        place_planned_gtts(kite, to_place, max_workers)
+    link_trade_gtts(results)
+    placed = sum(1 for result in to_place if result['status'] == 'placed')
+    logger.info(f"Armed {placed}/{len(to_place)} GTTs for user {user_id} ({len(trades)} open trades)")
+    return results
+
+
+def place_planned_gtts(kite, plans, max_workers=None):
+    """
+    Place the GTTs for planned results concurrently, updating each result in place with
+    status "placed" and gtt_id, or "error" and error.
+    """
+    def _place(result):
+        try:
+            result['gtt_id'] = place_oco_gtt(
+                kite, result['stock'], result['quantity'], result['stop_loss'], result['target'],
+                result['last_price'] or (result['stop_loss'] + result['target']) / 2, result['exchange']
+            )
+            result['status'] = 'placed'
+        except Exception as e:
+            logger.error(f"Bulk GTT failed for trade {result['trade_id']} ({result['stock']}): {e}")
+            result['status'] = 'error'
+            result['error'] = str(e)
+
+    if not plans:
+        return
+    workers = min(max_workers or settings.BULK_GTT_MAX_WORKERS, len(plans))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bulk-gtt') as executor:
+        list(executor.map(_place, plans))
+
+
+def link_trade_gtts(results):
+    """
+    Store the GTT id of every placed/skipped result on its trade, in one bulk update.
+    """
+    trades = [
+        Trade(id=result['trade_id'], gtt_id=result['gtt_id'])
+        for result in results if result.get('gtt_id') and result['status'] in ('placed', 'skipped')
+    ]
+    if trades:
+        Trade.objects.bulk_update(trades, ['gtt_id'])
@@ -0,0 +1,57 @@
+"""
+Concurrent placement of a basket of market orders for one user.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+from .kite_client_pool import kite_client_pool
+from .kite_transaction_manager import place_market_order
+
+logger = logging.getLogger('trading')
+
+
+def _place_one(user_id, order):
+    stock_name = order['stock_name']
+    quantity = order['quantity']
+    result = {'stock_name': stock_name, 'quantity': quantity}
+    started = time.perf_counter()
+    try:
+        result['order_id'] = place_market_order(user_id, stock_name, quantity, order.get('transaction_type', 'BUY'))
+        result['status'] = 'success'
+    except Exception as e:
+        logger.error(f"Bulk order failed for {stock_name}: {e}")
+        result['status'] = 'error'
+        result['error'] = str(e)
+    finally:
+        # Includes time spent waiting on the order rate limiter
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        # Worker threads get their own DB connections; don't leak them
+        connections.close_all()
+    return result
+
+
+def place_market_orders_bulk(user_id, orders, max_workers=None):
+    """
+    Place many market orders concurrently. The pooled client waits on the shared order
+    rate limiter, so the burst stays under Kite's orders-per-second limit.
+
+    Args:
+        user_id: User ID for authentication
+        orders: List of {"stock_name": ..., "quantity": ..., "transaction_type": "BUY"|"SELL"}
+        max_workers: Concurrent requests in flight (defaults to settings.BULK_ORDER_MAX_WORKERS)
+
+    Returns:
+        list: One result dict per order, in input order, with status "success" (and order_id)
+        or "error" (and error), and elapsed_ms
+    """
+    if not orders:
+        return []
+    # Resolve the pooled client once up front so every thread shares the warm session
+    kite_client_pool.get(user_id)
+    workers = min(max_workers or settings.BULK_ORDER_MAX_WORKERS, len(orders))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bulk-order') as executor:
+        return list(executor.map(lambda order: _place_one(user_id, order), orders))
@@ -0,0 +1,163 @@
+"""
+Shared Chartink HTTP client.
+
+Chartink's /screener/process is a Laravel endpoint: it needs the session cookies and
+the CSRF token that the homepage embeds in a <meta name="csrf-token"> tag. The client
+keeps one keep-alive requests.Session per process and loads the homepage only when it
+has no token yet, when its session cookies have expired, or when Chartink answers 419
+(CSRF token mismatch) or 403. Each screener run is then a single POST. At most
+CHARTINK_MAX_CONNECTIONS POSTs are in flight at once, however many threads call in.
+iter_rows() parses the response rows as they arrive instead of loading the whole body.
+"""
+import logging
+import re
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .json_stream import decode_chunks, iter_json_array
+
+logger = logging.getLogger('trading')
+
+_CSRF_META = re.compile(
+    r'<meta\s+(?:name=["\']csrf-token["\']\s+content=["\']([^"\']+)["\']'
+    r'|content=["\']([^"\']+)["\']\s+name=["\']csrf-token["\'])',
+    re.IGNORECASE,
+)
+# Laravel answers 419 when the CSRF token no longer matches the session
+REFRESH_STATUSES = {403, 419}
+STREAM_CHUNK_SIZE = 8192
+
+
+class ChartinkError(Exception):
+    pass
+
+
+def _read_as_available(response):
+    """
+    Body chunks of a streamed response as soon as they arrive (iter_content blocks until
+    it has a full chunk), decompressed.
+    """
+    while True:
+        chunk = response.raw.read1(STREAM_CHUNK_SIZE, decode_content=True)
+        if not chunk:
+            return
+        yield chunk
+
+
+class ChartinkClient:
+    def __init__(self, base_url=None, session_ttl=None, timeout=None, max_connections=None):
+        self.base_url = (base_url or settings.CHARTINK_BASE_URL).rstrip('/')
+        self.session_ttl = session_ttl if session_ttl is not None else settings.CHARTINK_SESSION_TTL
+        self.timeout = timeout or settings.CHARTINK_TIMEOUT
+        self.max_connections = max_connections or settings.CHARTINK_MAX_CONNECTIONS
+        self._session = None
+        self._csrf_token = None
+        self._expires_at = 0.0
+        self._generation = 0  # bumped on every refresh, so concurrent 419s refresh only once
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(('requests', 'refreshes', 'csrf_rejections'), 0)
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'User-Agent': 'Mozilla/5.0'})
+        return session
+
+    def _refresh(self):
+        """
+        Start a fresh session and read its CSRF token from the homepage. Call with the lock held.
+        """
+        if self._session is not None:
+            self._session.close()
+        session = self._new_session()
+        homepage = session.get(f'{self.base_url}/', timeout=self.timeout)
+        homepage.raise_for_status()
+        match = _CSRF_META.search(homepage.text)
+        if not match:
+            raise ChartinkError("Could not find Chartink CSRF token")
+        expiries = [cookie.expires for cookie in session.cookies if cookie.expires]
+        expires_at = time.time() + self.session_ttl
+        if expiries:
+            # Refresh a minute before the first session cookie runs out
+            expires_at = min(expires_at, min(expiries) - 60)
+        self._session = session
+        self._csrf_token = match.group(1) or match.group(2)
+        self._expires_at = expires_at
+        self._generation += 1
+        self._stats['refreshes'] += 1
+        logger.info(f"Refreshed Chartink session (valid for {max(0, expires_at - time.time()):.0f}s)")
+
+    def _credentials(self, stale_generation=None):
+        """
+        (session, csrf_token, generation), refreshing if there is none, it expired, or the
+        caller saw it rejected (stale_generation) and nobody has refreshed it since.
+        """
+        with self._lock:
+            if (
+                self._session is None
+                or time.time() >= self._expires_at
+                or stale_generation == self._generation
+            ):
+                self._refresh()
+            return self._session, self._csrf_token, self._generation
+
+    def _post(self, scan_clause, screener_name=None, stream=False):
+        """
+        POST a scan clause, refreshing the session once if Chartink rejects it. The caller
+        holds one of the connection slots.
+        """
+        session, csrf_token, generation = self._credentials()
+        referer = f'{self.base_url}/screener/{screener_name}' if screener_name else f'{self.base_url}/screener'
+        for attempt in range(2):
+            response = session.post(
+                f'{self.base_url}/screener/process',
+                data={'scan_clause': scan_clause},
+                headers={'x-csrf-token': csrf_token, 'Referer': referer, 'X-Requested-With': 'XMLHttpRequest'},
+                timeout=self.timeout,
+                stream=stream,
+            )
+            with self._lock:
+                self._stats['requests'] += 1
+            if response.status_code not in REFRESH_STATUSES or attempt:
+                break
+            response.close()
+            with self._lock:
+                self._stats['csrf_rejections'] += 1
+            logger.info(f"Chartink rejected the session ({response.status_code}), refreshing")
+            session, csrf_token, generation = self._credentials(stale_generation=generation)
+        if not response.ok:
+            response.close()
+        response.raise_for_status()
+        return response
+
+    def process(self, scan_clause, screener_name=None):
+        """
+        Run a scan clause. Returns Chartink's JSON response ({"data": [...], ...}).
+        """
+        with self._slots:
+            return self._post(scan_clause, screener_name).json()
+
+    def iter_rows(self, scan_clause, screener_name=None):
+        """
+        Run a scan clause and yield its "data" rows as they are parsed off the wire.
+        """
+        with self._slots:
+            with self._post(scan_clause, screener_name, stream=True) as response:
+                chunks = _read_as_available(response)
+                yield from iter_json_array(decode_chunks(chunks, response.encoding or 'utf-8'), 'data')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['session_expires_in'] = round(max(0.0, self._expires_at - time.time())) if self._session else None
+        return stats
+
+
+chartink_client = ChartinkClient()
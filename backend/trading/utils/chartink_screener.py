@@ -1,17 +1,30 @@
-import requests
-from bs4 import BeautifulSoup
-import re
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import combinations
+
+from django.conf import settings
+from django.utils import timezone
+
+from .chartink_client import chartink_client
 from .chartink_scan_clause import open_chartink_browser_and_print_scan_clause
+from .market_calendar import latest_session
+from .ohlcv_panel import PanelUnavailable
+from .ohlcv_store import get_panel
+from .scan_engine import ScanClauseError, evaluate
+from .screener_cache import clause_key, screener_cache
 
 # Add import for Screener model
 from ..models.screener import Screener
+from ..models.screener_run import ScreenerRun
 
+logger = logging.getLogger('trading')
 
-def fetch_chartink_screener(screener_name):
+
+def get_scan_clause(screener_name):
     """
-    Given a screener_name, fetch the scan_clause from the Screener table and run the screener to get stocks.
+    Fetch the scan_clause of a screener from the Screener table; raises HTTPError (404) if it has none.
     """
-    # Fetch scan_clause from the Screener table
     try:
         screener_obj = Screener.objects.filter(screener_name=screener_name).first()
     except Exception as e:
@@ -23,45 +36,269 @@ def fetch_chartink_screener(screener_name):
     if scan_clause is None or (isinstance(scan_clause, str) and scan_clause.strip() == ""):
         from requests.exceptions import HTTPError
         raise HTTPError("404 Client Error: screener is not present. Please verify the screener name", response=None)
+    return scan_clause
+
+
+def run_scan_clause(scan_clause, screener_name=None):
+    """
+    Run a scan clause (on Chartink, or locally per SCREENER_ENGINE) and return
+    [{"symbol", "price"}, ...]; raises on failure.
+    """
+    local = run_locally(scan_clause)
+    if local is not None:
+        return local
+    # Session cookies and CSRF token are reused across calls (see chartink_client)
+    data = chartink_client.process(scan_clause, screener_name)
+    return [_stock(row) for row in data["data"]]
+
+
+def run_locally(scan_clause):
+    """
+    Results of the local scan engine over the OHLCV panel, or None if the clause should
+    go to Chartink: SCREENER_ENGINE is "chartink", or it is "auto" and the clause is not
+    supported locally or the panel lacks the latest session. With "local" those raise.
+    """
+    engine = settings.SCREENER_ENGINE
+    if engine == 'chartink':
+        return None
+    try:
+        panel = get_panel()
+        if engine == 'auto' and (panel.latest_date is None or panel.latest_date < latest_session()):
+            raise PanelUnavailable(f"OHLCV panel ends on {panel.latest_date}, before the latest session")
+        return evaluate(scan_clause, panel)
+    except (ScanClauseError, PanelUnavailable) as e:
+        if engine == 'local':
+            raise
+        logger.info(f"Running scan clause on Chartink: {e}")
+        return None
+
+
+def _stock(row):
+    # Try 'close' first, fallback to 'per_chg'
+    return {"symbol": row["nsecode"], "price": row.get("close", row.get("per_chg", "N/A"))}
+
+
+def load_latest_runs(scan_clauses):
+    """
+    Seed the screener cache from the newest unexpired ScreenerRun of each screener in
+    {screener_name: scan_clause} that the cache has nothing current for, so results the
+    scheduler (or another process) fetched are served without calling Chartink. Only the
+    newest run keeps full results, and it is ignored if the clause has been edited since.
+    """
+    missing = {name: clause for name, clause in scan_clauses.items() if screener_cache.peek(clause) is None}
+    if not missing:
+        return
+    runs = ScreenerRun.objects.filter(
+        screener_id__in=list(missing), error__isnull=True, expires_at__gt=timezone.now()
+    ).order_by('screener_id', '-ran_at')
+    for run in runs:
+        scan_clause = missing.pop(run.screener_id, None)
+        if scan_clause is not None and run.clause_hash == clause_key(scan_clause):
+            screener_cache.put(scan_clause, run.stocks(), run.ran_at.timestamp(), run.expires_at.timestamp())
 
-    # Step 1: Load the homepage to get the CSRF token
-    session = requests.Session()
-    homepage = session.get("https://chartink.com/")
-    soup = BeautifulSoup(homepage.text, "html.parser")
-
-    token_input = soup.find("meta", {"name": "csrf-token"})
-    if not token_input or not token_input.get("content"):
-        print("Could not find CSRF token")
-        return []
-    csrf_token = token_input["content"]
-
-    headers = {
-        "x-csrf-token": csrf_token,
-        "User-Agent": "Mozilla/5.0",
-        "Referer": f"https://chartink.com/screener/{screener_name}"
-    }
 
-    payload = {
-        "scan_clause": scan_clause
+def _cached_results(screener_name, scan_clause, refresh=False):
+    """
+    Run a scan clause through the screener cache; raises if Chartink failed and nothing was cached.
+    """
+    result = screener_cache.get(
+        scan_clause, lambda clause: run_scan_clause(clause, screener_name), refresh=refresh
+    )
+    return {"stocks": result.stocks, **_freshness(result)}
+
+
+def _freshness(result):
+    now = time.time()
+    return {
+        "cached": result.cached,
+        "stale": result.stale,
+        "age_seconds": round(now - result.fetched_at, 1),
+        "expires_in": round(max(0.0, result.expires_at - now), 1),
     }
 
+
+def screener_results(screener_name, refresh=False):
+    """
+    Stocks for a screener, served from the screener cache (or the latest scheduled
+    ScreenerRun) until its next candle closes.
+
+    Returns:
+        dict: {"stocks", "cached", "stale", "age_seconds", "expires_in"}; stocks is empty
+        (and the rest None) if Chartink failed and nothing was cached
+    """
+    scan_clause = get_scan_clause(screener_name)
     try:
-        response = session.post("https://chartink.com/screener/process", data=payload, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        stocks_with_prices = []
-        print(f"Stocks from screener: ")
-        for row in data["data"]:
-            stock_symbol = row["nsecode"]
-            stock_price = row.get("close", row.get("per_chg", "N/A"))  # Try 'close' first, fallback to 'per_chg'
-            stocks_with_prices.append({"symbol": stock_symbol, "price": stock_price})
-            print(f"{stock_symbol}: ₹{stock_price}")
-        
-        # Return stocks with prices instead of just symbols
-        return stocks_with_prices
+        if not refresh:
+            load_latest_runs({screener_name: scan_clause})
+        results = _cached_results(screener_name, scan_clause, refresh)
     except Exception as e:
         print("Failed to fetch screener data:", e)
-        return []
+        return {"stocks": [], "cached": False, "stale": False, "age_seconds": None, "expires_in": None}
+    print(f"Stocks from screener {screener_name}: {len(results['stocks'])}{' (cached)' if results['cached'] else ''}")
+    return results
+
+
+def _batch_runner(screener_names, refresh):
+    """
+    Load the scan clauses of several screeners in one query and return a function that
+    runs one of them through the screener cache, returning its _cached_results() dict or
+    {"error"}. The function does not touch the database, so it can run on worker threads.
+    """
+    scan_clauses = dict(
+        Screener.objects.filter(screener_name__in=screener_names).values_list('screener_name', 'scan_clause')
+    )
+    if not refresh:
+        load_latest_runs({name: clause for name, clause in scan_clauses.items() if clause and clause.strip()})
+
+    def _run(screener_name):
+        scan_clause = scan_clauses.get(screener_name)
+        if not scan_clause or not scan_clause.strip():
+            return {"error": "screener is not present. Please verify the screener name"}
+        try:
+            return _cached_results(screener_name, scan_clause, refresh)
+        except Exception as e:
+            print(f"Failed to fetch screener {screener_name}: {e}")
+            return {"error": str(e)}
+    return _run
+
+
+def _batch_executor(screener_names):
+    workers = max(1, min(settings.CHARTINK_MAX_CONNECTIONS, len(screener_names)))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chartink')
+
+
+def _overlap(screener_names, matched):
+    """
+    {name: {other name: number of symbols both matched}} from {name: set of symbols}.
+    """
+    overlap = {screener_name: {} for screener_name in screener_names}
+    for first, second in combinations(screener_names, 2):
+        overlap[first][second] = overlap[second][first] = len(matched[first] & matched[second])
+    return overlap
+
+
+def batch_screener_results(screener_names, refresh=False):
+    """
+    Run several screeners concurrently (at most CHARTINK_MAX_CONNECTIONS at a time) and
+    merge their stocks.
+
+    Returns:
+        dict: {
+            "stocks": [{"symbol", "price", "screeners": [names that matched]}, ...],
+                most matched first,
+            "screeners": {name: {"count", "cached", "stale", "age_seconds", "expires_in"}
+                or {"error"}},
+            "overlap": {name: {other name: symbols both matched}},
+        }
+    """
+    screener_names = list(dict.fromkeys(screener_names))
+    run = _batch_runner(screener_names, refresh)
+    with _batch_executor(screener_names) as executor:
+        results = dict(zip(screener_names, executor.map(run, screener_names)))
+
+    stocks = {}
+    matched = {}
+    for screener_name, result in results.items():
+        symbols = matched[screener_name] = set()
+        for stock in result.get("stocks", []):
+            symbols.add(stock["symbol"])
+            merged = stocks.setdefault(stock["symbol"], {"symbol": stock["symbol"], "price": stock["price"], "screeners": []})
+            if screener_name not in merged["screeners"]:
+                merged["screeners"].append(screener_name)
+        if "stocks" in result:
+            result["count"] = len(symbols)
+            del result["stocks"]
+
+    return {
+        "stocks": sorted(stocks.values(), key=lambda stock: (-len(stock["screeners"]), stock["symbol"])),
+        "screeners": results,
+        "overlap": _overlap(screener_names, matched),
+    }
+
+
+def stream_screener_results(screener_name, refresh=False):
+    """
+    Stocks for a screener as a generator of NDJSON records, for streaming responses:
+        {"type": "stock", "screener_name", "symbol", "price"}  one per stock, as Chartink's
+            response is parsed (or from the cache, or once a concurrent request's call is done)
+        {"type": "screener", "screener_name", "count", "cached", "stale", "age_seconds", "expires_in"}
+            once all the stocks were sent
+        {"type": "error", "screener_name", "error"}  instead, if Chartink failed; stocks
+            already sent are incomplete
+    Looks up the scan clause (raising like get_scan_clause) before returning.
+    """
+    scan_clause = get_scan_clause(screener_name)
+    if not refresh:
+        load_latest_runs({screener_name: scan_clause})
+    return _stream_rows(screener_name, scan_clause, refresh)
+
+
+def _stream_rows(screener_name, scan_clause, refresh):
+    def _iter_stocks(clause):
+        local = run_locally(clause)
+        return local if local is not None else map(_stock, chartink_client.iter_rows(clause, screener_name))
+
+    def _record(stock):
+        return {"type": "stock", "screener_name": screener_name, **stock}
+
+    try:
+        # A miss goes through the cache's single flight, so concurrent requests share one Chartink call
+        result = yield from screener_cache.stream(scan_clause, _iter_stocks, refresh, _record)
+    except Exception as e:
+        logger.error(f"Failed to stream screener {screener_name}: {e}")
+        yield {"type": "error", "screener_name": screener_name, "error": str(e)}
+        return
+    if not result.cached:
+        logger.info(f"Stocks from screener {screener_name}: {len(result.stocks)} (streamed)")
+    yield {"type": "screener", "screener_name": screener_name, "count": len(result.stocks), **_freshness(result)}
+
+
+def stream_batch_screener_results(screener_names, refresh=False):
+    """
+    Run several screeners concurrently like batch_screener_results, as a generator of
+    NDJSON records that sends each screener's stocks as soon as that screener finishes:
+        {"type": "stock", "screener_name", "symbol", "price"}
+        {"type": "screener", "screener_name", "count", "cached", "stale", "age_seconds", "expires_in"}
+        {"type": "error", "screener_name", "error"}
+    and finally
+        {"type": "summary", "overlap": {name: {other name: count}},
+         "matched_by": {symbol: [names]} for symbols more than one screener matched}
+    Loads the scan clauses before returning.
+    """
+    screener_names = list(dict.fromkeys(screener_names))
+    return _stream_batch(screener_names, _batch_runner(screener_names, refresh))
+
+
+def _stream_batch(screener_names, run):
+    matched = {screener_name: set() for screener_name in screener_names}
+    matched_by = {}
+    with _batch_executor(screener_names) as executor:
+        futures = {executor.submit(run, screener_name): screener_name for screener_name in screener_names}
+        for future in as_completed(futures):
+            screener_name = futures[future]
+            result = future.result()
+            if "error" in result:
+                yield {"type": "error", "screener_name": screener_name, "error": result["error"]}
+                continue
+            for stock in result["stocks"]:
+                if stock["symbol"] not in matched[screener_name]:
+                    matched[screener_name].add(stock["symbol"])
+                    matched_by.setdefault(stock["symbol"], []).append(screener_name)
+                yield {"type": "stock", "screener_name": screener_name, **stock}
+            freshness = {key: value for key, value in result.items() if key != "stocks"}
+            yield {"type": "screener", "screener_name": screener_name, "count": len(matched[screener_name]), **freshness}
+    yield {
+        "type": "summary",
+        "overlap": _overlap(screener_names, matched),
+        "matched_by": {symbol: names for symbol, names in sorted(matched_by.items()) if len(names) > 1},
+    }
+
+
+def fetch_chartink_screener(screener_name):
+    """
+    Given a screener_name, fetch the scan_clause from the Screener table and run the screener to get stocks.
+    """
+    return screener_results(screener_name)["stocks"]
 
 # Example usage:
 # stocks = fetch_chartink_screener("bittu-daily-trading")
@@ -0,0 +1,198 @@
+"""
+Retry classification and per-user, per-endpoint circuit breakers for Kite calls.
+
+Every request made by a pooled ThrottledKiteConnect goes through here. Failures fall
+into three classes:
+    not sent    the connection could not be opened, or Kite rejected the request with
+                429 before acting on it. Every method is retried, including order POSTs.
+    transient   timeouts, dropped connections and 5xx from Kite (NetworkException,
+                DataException, GeneralException). Only requests that are safe to repeat
+                (GET, PUT, DELETE) are retried, because a POST may already have placed
+                an order.
+    business    token, input, permission and order errors. These are never retried and
+                count as a success for the breaker, since Kite answered.
+A 429 neither trips nor resets the breaker.
+Retries use exponential backoff with full jitter.
+
+A breaker per (user_id, endpoint class) opens after KITE_BREAKER_FAILURE_THRESHOLD
+consecutive transient failures. While it is open, calls fail at once with
+BrokerUnavailable instead of waiting for the HTTP timeout. After
+KITE_BREAKER_RESET_TIMEOUT seconds one probe call is let through (half-open). A
+success closes the breaker and a failure opens it again. Breakers are per process.
+"""
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from kiteconnect.exceptions import DataException, GeneralException, KiteException, NetworkException
+from requests.exceptions import ConnectionError, ConnectTimeout, Timeout
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger('trading')
+
+# Methods that are safe to send twice
+IDEMPOTENT_METHODS = {'GET', 'PUT', 'DELETE', 'HEAD'}
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class BrokerUnavailable(NetworkException):
+    """
+    Raised without calling Kite while the breaker for this user and endpoint is open.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message, code=503)
+        self.retry_after = retry_after
+
+
+def is_rate_limited(exc):
+    return isinstance(exc, KiteException) and exc.code == 429
+
+
+def _not_sent(exc):
+    """
+    True if the request certainly never reached Kite.
+    """
+    if isinstance(exc, ConnectTimeout) or is_rate_limited(exc):
+        return True
+    if isinstance(exc, ConnectionError):
+        # requests wraps urllib3's MaxRetryError(reason=NewConnectionError)
+        reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+def is_transient(exc):
+    """
+    Failures that say Kite (or the path to it) is unhealthy; these trip the breaker.
+    """
+    if isinstance(exc, (ConnectionError, Timeout, NetworkException, DataException)):
+        return not is_rate_limited(exc)
+    return isinstance(exc, GeneralException) and exc.code >= 500
+
+
+def is_retryable(exc, method):
+    if _not_sent(exc):
+        return True
+    return is_transient(exc) and method.upper() in IDEMPOTENT_METHODS
+
+
+def order_not_placed(exc):
+    """
+    True if a failed order request certainly placed nothing: it never reached Kite, or
+    Kite answered with a business error (token, input, permission, order, 429).
+    """
+    if isinstance(exc, BrokerUnavailable) or _not_sent(exc):
+        return True
+    return isinstance(exc, KiteException) and not is_transient(exc)
+
+
+def backoff_delay(attempt):
+    """
+    Full-jitter exponential backoff for the given retry (1 = first retry).
+    """
+    ceiling = min(settings.KITE_RETRY_MAX_DELAY, settings.KITE_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.KITE_BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout if reset_timeout is not None else settings.KITE_BREAKER_RESET_TIMEOUT
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raise BrokerUnavailable if the call must not be made. In half-open state only
+        one caller gets through as the probe.
+        """
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == STATE_OPEN and retry_in <= 0:
+                self.state = STATE_HALF_OPEN
+            if self.state == STATE_HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+        raise BrokerUnavailable(
+            f"Kite {self.name} are failing ({self.last_error}); retry in {max(retry_in, 0):.0f}s",
+            retry_after=max(retry_in, 0),
+        )
+
+    def record_success(self):
+        with self._lock:
+            if self.state != STATE_CLOSED:
+                logger.info(f"Kite breaker closed for {self.name}")
+            self.state = STATE_CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self, exc):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(exc)[:200]
+            self._probing = False
+            if self.state == STATE_HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != STATE_OPEN:
+                    logger.warning(f"Kite breaker opened for {self.name} after {self.failures} failures: {self.last_error}")
+                self.state = STATE_OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """
+        Give back a half-open probe slot without an outcome (the call was never sent).
+        """
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == STATE_OPEN:
+                retry_in = round(max(0.0, self.opened_at + self.reset_timeout - time.monotonic()), 1)
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'retry_in': retry_in,
+                'rejected': self.rejected,
+                'last_error': self.last_error,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(user_id, endpoint):
+    key = (str(user_id), endpoint)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(f'{endpoint} calls for user {user_id}')
+        return breaker
+
+
+def breaker_states(user_id=None):
+    """
+    [{"user_id", "endpoint", "state", ...}] for every breaker this process has used.
+    """
+    with _breakers_lock:
+        items = sorted(_breakers.items())
+    return [
+        {'user_id': key[0], 'endpoint': key[1], **breaker.snapshot()}
+        for key, breaker in items if user_id is None or key[0] == str(user_id)
+    ]
@@ -5,9 +5,11 @@ from ..models import GlobalParameters
 from ..models import User
 import requests
 import json
-from kiteconnect import KiteConnect
 from datetime import date
+from django.conf import settings
 from ..models.authenticator import Authenticator
+from .kite_client_pool import kite_client_pool, ThrottledKiteConnect
+from .rate_limiter import throttle
 
 @csrf_exempt
 def check_token(request):
@@ -32,12 +34,13 @@ def check_token(request):
         return JsonResponse({'error': 'Invalid method'}, status=405)
     
 def get_kite_user_details_internal(api_key, access_token):
-    url = 'https://api.kite.trade/user/profile'
+    url = f'{settings.KITE_API_ROOT}/user/profile'
     headers = {
         'X-Kite-Version': '3',
         'Authorization': f'token {api_key}:{access_token}'
     }
     try:
+        throttle(api_key, 'default')
         response = requests.get(url, headers=headers)
         response.raise_for_status()
         user_data = response.json().get('data', {})
@@ -79,7 +82,7 @@ def generate_token(request):
     
     # Call Kite API to generate access token
     try:
-        kite = KiteConnect(api_key=api_key)
+        kite = ThrottledKiteConnect(api_key=api_key, root=settings.KITE_API_ROOT, user_id=user_id)
         
         # Debug: Log the parameters being used
         print(f"Debug - API Key: {api_key[:10]}...")  # Only show first 10 chars for security
@@ -122,6 +125,8 @@ def generate_token(request):
             access_token=access_token
         )
         print(f"Debug - Authenticator update result: {auth_update_result} record(s) updated")
+        # Drop the cached client so the next order picks up the new token
+        kite_client_pool.invalidate(user_id)
         
         # Return response with the correct user_id
         return JsonResponse({
@@ -0,0 +1,224 @@
+"""
+Reconcile protective GTTs on Kite with open trades in the Trade table.
+
+Per user: one kite.get_gtts() call and one query for open trades. Both sides are
+indexed (GTTs by id and by symbol) and diffed in a single pass:
+    ok           trade linked to an active GTT matching its quantity and slp/tgtp
+    unprotected  open trade with no active GTT
+    mismatched   linked GTT whose quantity or triggers differ from the trade
+    stale        active sell GTT no open trade accounts for
+Unlinked GTTs are adopted by symbol (same quantity preferred) and, unless
+save_links=False (a report-only run), the links are saved to Trade.gtt_id in one bulk
+update. With fix=True unprotected trades get a GTT and
+mismatched GTTs are modified to match the trade; stale GTTs are only cancelled with
+delete_stale=True since they may have been set by hand.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+from ..models.authenticator import Authenticator
+from ..models.buy_order_watch import BuyOrderWatch
+from ..models.trade import Trade
+from .bulk_gtt import (
+    fetch_active_oco_gtts,
+    index_by_symbol,
+    link_trade_gtts,
+    open_trades,
+    place_planned_gtts,
+    plan_trade,
+)
+from .gtt_watcher import cancel_gtts
+from .kite_transaction_manager import get_kite_client, modify_oco_gtt
+from .quote_cache import quote_cache
+
+logger = logging.getLogger('trading')
+
+# Trigger prices within this distance of the trade's slp/tgtp count as matching
+TRIGGER_TOLERANCE = 0.01
+
+
+def _gtt_entry(gtt):
+    stop_loss, target = sorted(gtt['condition']['trigger_values'])
+    return {
+        'gtt_id': gtt['id'],
+        'stock': gtt['condition']['tradingsymbol'],
+        'quantity': int(gtt['orders'][0]['quantity']),
+        'stop_loss': stop_loss,
+        'target': target,
+    }
+
+
+def _trade_problems(trade, gtt):
+    problems = []
+    gtt = _gtt_entry(gtt)
+    if gtt['quantity'] != int(trade.sb):
+        problems.append(f"GTT quantity {gtt['quantity']} != {int(trade.sb)} shares bought")
+    if trade.slp is not None and abs(gtt['stop_loss'] - trade.slp) > TRIGGER_TOLERANCE:
+        problems.append(f"GTT stop loss {gtt['stop_loss']} != slp {trade.slp}")
+    if trade.tgtp is not None and abs(gtt['target'] - trade.tgtp) > TRIGGER_TOLERANCE:
+        problems.append(f"GTT target {gtt['target']} != tgtp {trade.tgtp}")
+    return problems
+
+
+def reconcile_user(user_id, fix=False, delete_stale=False, max_workers=None, save_links=True):
+    """
+    Diff one user's active protective GTTs against their open trades. With
+    save_links=False nothing is written: "linked" counts the links that would be saved.
+
+    Returns:
+        dict: {"user_id", "ok", "unprotected", "mismatched", "stale", "linked"}; with fix or
+        delete_stale each affected entry also gets "fix" ("placed", "modified", "deleted")
+        or "fix_error"
+    """
+    kite = get_kite_client(user_id)
+    gtts = {gtt['id']: gtt for gtt in fetch_active_oco_gtts(kite)}
+    trades = list(open_trades(user_id))
+    linked_ids = {trade.gtt_id for trade in trades if trade.gtt_id in gtts}
+    unlinked = index_by_symbol(gtts.values(), exclude_ids=linked_ids)
+
+    report = {'user_id': user_id, 'ok': [], 'unprotected': [], 'mismatched': [], 'stale': [], 'linked': 0}
+    relinked = []
+    mismatched_trades = {}
+    unprotected_trades = []
+    for trade in trades:
+        symbol = trade.stock.strip().upper()
+        gtt = gtts[trade.gtt_id] if trade.gtt_id in linked_ids else None
+        if gtt is None:
+            candidates = unlinked.get(symbol, [])
+            match = next((c for c in candidates if c[1] == int(trade.sb)), candidates[0] if candidates else None)
+            if match:
+                candidates.remove(match)
+                gtt = gtts[match[0]]
+            new_id = gtt['id'] if gtt else None
+            if trade.gtt_id != new_id:
+                trade.gtt_id = new_id
+                relinked.append(trade)
+
+        entry = {
+            'trade_id': trade.id,
+            'stock': symbol,
+            'quantity': int(trade.sb),
+            'stop_loss': trade.slp,
+            'target': trade.tgtp,
+        }
+        if gtt is None:
+            report['unprotected'].append(entry)
+            unprotected_trades.append(trade)
+            continue
+        entry['gtt_id'] = gtt['id']
+        problems = _trade_problems(trade, gtt)
+        if problems:
+            entry['problems'] = problems
+            report['mismatched'].append(entry)
+            mismatched_trades[trade.id] = trade
+        else:
+            report['ok'].append(entry)
+
+    # GTTs the fill watcher placed for buys that have no trade row yet are not stale
+    watched_ids = set(
+        BuyOrderWatch.objects.filter(user_id=user_id, gtt_id__isnull=False)
+        .exclude(status=BuyOrderWatch.STATUS_CLOSED).values_list('gtt_id', flat=True)
+    )
+    stale_ids = [gtt_id for entries in unlinked.values() for gtt_id, _ in entries if gtt_id not in watched_ids]
+    closed_trade_of = dict(Trade.objects.filter(gtt_id__in=stale_ids).values_list('gtt_id', 'id'))
+    for gtt_id in stale_ids:
+        report['stale'].append({**_gtt_entry(gtts[gtt_id]), 'trade_id': closed_trade_of.get(gtt_id)})
+
+    if relinked and save_links:
+        Trade.objects.bulk_update(relinked, ['gtt_id'])
+    report['linked'] = len(relinked)
+
+    if fix:
+        _fix_trades(kite, report, unprotected_trades, mismatched_trades, max_workers)
+    if delete_stale and report['stale']:
+        errors = cancel_gtts(kite, [entry['gtt_id'] for entry in report['stale']])
+        for entry in report['stale']:
+            if errors.get(entry['gtt_id']):
+                entry['fix_error'] = errors[entry['gtt_id']]
+            else:
+                entry['fix'] = 'deleted'
+    return report
+
+
+def _fix_trades(kite, report, unprotected_trades, mismatched_trades, max_workers):
+    trades = unprotected_trades + list(mismatched_trades.values())
+    if not trades:
+        return
+    quotes = quote_cache.get_many(kite, [trade.stock for trade in trades])
+    plans = {}
+    for trade in trades:
+        plan, error = plan_trade(trade, quotes.get(trade.stock.strip().upper()))
+        plans[trade.id] = (plan, error)
+
+    to_place = []
+    for entry in report['unprotected']:
+        plan, error = plans[entry['trade_id']]
+        if error:
+            entry['fix_error'] = error
+        else:
+            to_place.append({**plan, 'status': 'planned'})
+    place_planned_gtts(kite, to_place, max_workers)
+    link_trade_gtts(to_place)
+    placed = {result['trade_id']: result for result in to_place}
+    for entry in report['unprotected']:
+        result = placed.get(entry['trade_id'])
+        if result is None:
+            continue
+        if result['status'] == 'placed':
+            entry['fix'] = 'placed'
+            entry['gtt_id'] = result['gtt_id']
+        else:
+            entry['fix_error'] = result.get('error')
+
+    def _modify(entry):
+        plan, error = plans[entry['trade_id']]
+        if error:
+            entry['fix_error'] = error
+            return
+        try:
+            modify_oco_gtt(kite, entry['gtt_id'], plan['stock'], plan['quantity'], plan['stop_loss'],
+                           plan['target'], plan['last_price'] or (plan['stop_loss'] + plan['target']) / 2,
+                           plan['exchange'])
+            entry['fix'] = 'modified'
+        except Exception as e:
+            logger.error(f"Failed to modify GTT {entry['gtt_id']} for trade {entry['trade_id']}: {e}")
+            entry['fix_error'] = str(e)
+
+    if report['mismatched']:
+        workers = min(max_workers or settings.BULK_GTT_MAX_WORKERS, len(report['mismatched']))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gtt-reconcile') as executor:
+            list(executor.map(_modify, report['mismatched']))
+
+
+def reconcile_all(fix=False, delete_stale=False, max_workers=None):
+    """
+    Reconcile every user that has open trades and a Kite session, a few users at a time.
+    Returns one report per user ({"user_id", "error"} if that user failed).
+    """
+    with_open_trades = set(
+        Trade.objects.filter(sb__gt=0).filter(Q(pl__isnull=True) | Q(pl=''))
+        .values_list('user__user_id', flat=True).distinct()
+    )
+    user_ids = sorted(
+        Authenticator.objects.filter(user_id__in=with_open_trades, access_token__isnull=False)
+        .values_list('user_id', flat=True)
+    )
+    if not user_ids:
+        return []
+
+    def _run(user_id):
+        try:
+            return reconcile_user(user_id, fix=fix, delete_stale=delete_stale)
+        except Exception as e:
+            logger.error(f"GTT reconciliation failed for user {user_id}: {e}")
+            return {'user_id': user_id, 'error': str(e)}
+        finally:
+            connections.close_all()
+
+    workers = min(max_workers or settings.GTT_RECONCILE_MAX_WORKERS, len(user_ids))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gtt-reconcile-user') as executor:
+        return list(executor.map(_run, user_ids))
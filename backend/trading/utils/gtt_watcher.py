@@ -0,0 +1,218 @@
+"""
+Fill-aware GTT placement for limit buy orders.
+
+Limit buys are registered as BuyOrderWatch rows instead of getting a GTT straight away.
+Each tick the watcher makes one kite.orders() call per user with pending watches and,
+from that snapshot:
+    - places (or resizes) the OCO GTT for whatever quantity has filled so far,
+    - closes watches whose buy was cancelled/rejected without a fill, and
+    - cancels GTTs left behind by such buys, concurrently under the GTT rate limit.
+Kite order postbacks feed the same per-order handler, so a fill is usually protected
+before the next poll.
+"""
+import hashlib
+import hmac
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from ..models.authenticator import Authenticator
+from ..models.buy_order_watch import BuyOrderWatch
+from ..models.order_job import OrderJob
+from .kite_transaction_manager import get_kite_client, modify_oco_gtt, place_oco_gtt
+
+logger = logging.getLogger('trading')
+
+CLOSED_ORDER_STATUSES = ('CANCELLED', 'REJECTED')
+
+
+def register_buy_order(user_id, order_id, tradingsymbol, quantity, buy_price, stop_loss, target, gtt_id=None, job=None):
+    """
+    Start watching a placed buy order. Pass gtt_id to adopt a GTT that was already placed
+    for it, so the watcher resizes it on fill or cancels it if the buy never fills.
+    """
+    watch, _ = BuyOrderWatch.objects.update_or_create(
+        order_id=str(order_id),
+        defaults={
+            'user_id': str(user_id),
+            'tradingsymbol': tradingsymbol.strip().upper(),
+            'quantity': int(quantity),
+            'buy_price': float(buy_price),
+            'stop_loss': float(stop_loss),
+            'target': float(target),
+            'gtt_id': gtt_id,
+            'gtt_quantity': int(quantity) if gtt_id else 0,
+            'job': job,
+        }
+    )
+    return watch
+
+
+def _finish_job(watch, failed=False):
+    job = watch.job
+    if job is None or job.status != OrderJob.STATUS_WAITING:
+        return
+    job.result = {
+        **job.result,
+        'order_status': watch.order_status,
+        'filled_quantity': watch.filled_quantity,
+        'combined_gtt_id': watch.gtt_id,
+    }
+    job.status = OrderJob.STATUS_FAILED if failed else OrderJob.STATUS_SUCCEEDED
+    job.step = 'done'
+    if failed:
+        job.error = f"Buy order {watch.order_id} ended as {watch.order_status} without any fill; no GTT placed"
+    job.finished_at = timezone.now()
+    job.save()
+
+
+def _protect_filled(kite, watch, last_price):
+    """
+    Make sure a GTT covers exactly the filled quantity.
+    """
+    if watch.filled_quantity <= 0 or watch.gtt_quantity == watch.filled_quantity:
+        return
+    if watch.gtt_id:
+        modify_oco_gtt(kite, watch.gtt_id, watch.tradingsymbol, watch.filled_quantity,
+                       watch.stop_loss, watch.target, last_price)
+        logger.info(f"Resized GTT {watch.gtt_id} for order {watch.order_id} to {watch.filled_quantity}")
+    else:
+        watch.gtt_id = place_oco_gtt(kite, watch.tradingsymbol, watch.filled_quantity,
+                                     watch.stop_loss, watch.target, last_price)
+        logger.info(f"Placed GTT {watch.gtt_id} for order {watch.order_id} ({watch.filled_quantity} filled)")
+    watch.gtt_quantity = watch.filled_quantity
+
+
+def handle_order_update(kite, watch, order):
+    """
+    Apply one order snapshot (from kite.orders() or a postback) to a watch.
+
+    The postback view and the watcher run in different processes with their own copies
+    of the watch, so the row is re-read under a lock first: whoever gets it second sees
+    the GTT the first one placed. A snapshot older than the stored state is skipped.
+
+    Returns:
+        GTT id to cancel if the buy closed without filling and left an orphaned GTT, else None
+    """
+    status = order.get('status', '')
+    filled_quantity = int(order.get('filled_quantity') or 0)
+    with transaction.atomic():
+        watch = BuyOrderWatch.objects.select_for_update().filter(
+            pk=watch.pk, status=BuyOrderWatch.STATUS_PENDING
+        ).first()
+        if watch is None or filled_quantity < watch.filled_quantity:
+            return None
+        watch.order_status = status
+        watch.filled_quantity = filled_quantity
+        last_price = order.get('average_price') or watch.buy_price
+        orphan_gtt_id = None
+        try:
+            _protect_filled(kite, watch, last_price)
+            if status == 'COMPLETE' or (status in CLOSED_ORDER_STATUSES and watch.filled_quantity > 0):
+                watch.status = BuyOrderWatch.STATUS_PROTECTED
+            elif status in CLOSED_ORDER_STATUSES:
+                watch.status = BuyOrderWatch.STATUS_CLOSED
+                orphan_gtt_id, watch.gtt_id, watch.gtt_quantity = watch.gtt_id, None, 0
+            watch.error = None
+        except Exception as e:
+            logger.error(f"Failed to protect order {watch.order_id}: {e}")
+            watch.error = str(e)
+        watch.save()
+        if watch.status != BuyOrderWatch.STATUS_PENDING:
+            _finish_job(watch, failed=watch.status == BuyOrderWatch.STATUS_CLOSED)
+    return orphan_gtt_id
+
+
+def cancel_gtts(kite, gtt_ids):
+    """
+    Delete several GTTs concurrently; the client's GTT rate limiter paces the calls.
+    Returns {gtt_id: None on success or the error message}.
+    """
+    def _delete(gtt_id):
+        try:
+            kite.delete_gtt(gtt_id)
+            return gtt_id, None
+        except Exception as e:
+            return gtt_id, str(e)
+
+    if not gtt_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(gtt_ids), settings.GTT_WATCHER_MAX_WORKERS)) as executor:
+        results = dict(executor.map(_delete, gtt_ids))
+    for gtt_id, error in results.items():
+        if error:
+            logger.error(f"Failed to cancel orphaned GTT {gtt_id}: {error}")
+        else:
+            logger.info(f"Cancelled orphaned GTT {gtt_id}")
+    return results
+
+
+def _watch_user(user_id, watches):
+    kite = get_kite_client(user_id)
+    orders = {str(order['order_id']): order for order in kite.orders()}
+    orphans = []
+    for watch in watches:
+        order = orders.get(watch.order_id)
+        if order is None:
+            # The order book only holds today's orders; anything older can no longer fill
+            if watch.created_at.date() < timezone.now().date():
+                orphans.append(handle_order_update(kite, watch, {'status': 'CANCELLED', 'filled_quantity': watch.filled_quantity}))
+            continue
+        orphans.append(handle_order_update(kite, watch, order))
+    cancel_gtts(kite, [gtt_id for gtt_id in orphans if gtt_id])
+
+
+def watch_pending_orders():
+    """
+    Run one watcher tick over every pending watch. Returns the number of users polled.
+    """
+    by_user = defaultdict(list)
+    for watch in BuyOrderWatch.objects.filter(status=BuyOrderWatch.STATUS_PENDING):
+        by_user[watch.user_id].append(watch)
+    if not by_user:
+        return 0
+
+    def _run(item):
+        user_id, watches = item
+        try:
+            _watch_user(user_id, watches)
+        except Exception as e:
+            logger.error(f"GTT watcher failed for user {user_id}: {e}")
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=min(len(by_user), settings.GTT_WATCHER_MAX_WORKERS)) as executor:
+        list(executor.map(_run, by_user.items()))
+    return len(by_user)
+
+
+def verify_postback_checksum(order, api_secret):
+    """
+    Kite signs postbacks with sha256(order_id + order_timestamp + api_secret).
+    """
+    expected = hashlib.sha256(
+        f"{order.get('order_id', '')}{order.get('order_timestamp', '')}{api_secret}".encode('utf-8')
+    ).hexdigest()
+    return hmac.compare_digest(expected, str(order.get('checksum', '')))
+
+
+def handle_postback(order):
+    """
+    Process a Kite order postback. Returns False if the checksum does not verify.
+    """
+    api_secret = Authenticator.objects.filter(user_id=order.get('user_id')).values_list('api_secret', flat=True).first()
+    if not api_secret or not verify_postback_checksum(order, api_secret):
+        return False
+    watch = BuyOrderWatch.objects.filter(
+        order_id=str(order.get('order_id')), status=BuyOrderWatch.STATUS_PENDING
+    ).first()
+    if watch is not None:
+        kite = get_kite_client(watch.user_id)
+        orphan_gtt_id = handle_order_update(kite, watch, order)
+        if orphan_gtt_id:
+            cancel_gtts(kite, [orphan_gtt_id])
+    return True
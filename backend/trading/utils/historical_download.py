@@ -0,0 +1,244 @@
+"""
+Resumable backfill of Kite historical candles into the OHLCV store.
+
+Kite returns at most MAX_DAYS[interval] calendar days per historical_data call (60 for
+minute candles, 2000 for daily ones), so years of candles for ~2000 symbols is thousands
+of calls under the historical rate limit. Every ThrottledKiteConnect call already waits
+on the shared limiter, so downloads run concurrently and stay under the cap.
+
+plan_downloads() splits each (symbol, interval) range into request-sized chunks that
+start after what is already done: the last stored candle, or the journal's checkpoint
+when the last chunks returned nothing (holidays, dates before the listing). The store
+only appends, so one symbol's chunks are downloaded in order and different symbols run
+in parallel. After a chunk is stored a line is appended to the journal
+(<OHLCV_STORE_DIR>/download.journal), and an interrupted backfill resumes at the next
+chunk. History older than a symbol's first stored candle is not fetched; those ranges
+are listed in the plan's `skipped`.
+"""
+import json
+import logging
+import os
+import threading
+import time as time_module
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+
+from .instrument_master import get_instrument_master
+from .market_calendar import IST
+from .ohlcv_store import get_ohlcv_store
+
+logger = logging.getLogger('trading')
+
+# Most calendar days Kite returns per historical_data call, per interval
+MAX_DAYS = {
+    'minute': 60,
+    '3minute': 100,
+    '5minute': 100,
+    '10minute': 100,
+    '15minute': 200,
+    '30minute': 200,
+    '60minute': 400,
+    'day': 2000,
+}
+JOURNAL_FILE = 'download.journal'
+
+Chunk = namedtuple('Chunk', 'symbol token interval start end')
+
+
+def nse_equity_tokens(kite=None):
+    """
+    {tradingsymbol: instrument_token} of NSE equities, from kite.instruments('NSE') if a
+    client is given, else from the local instrument master (empty if none is built).
+    """
+    if kite is not None:
+        return {
+            row['tradingsymbol']: int(row['instrument_token'])
+            for row in kite.instruments('NSE')
+            if row.get('instrument_type') == 'EQ' and row.get('segment') == 'NSE'
+        }
+    master = get_instrument_master()
+    if master is None:
+        return {}
+    columns = master.columns
+    rows = (columns['exchange'] == b'NSE') & (columns['instrument_type'] == b'EQ') & (columns['segment'] == b'NSE')
+    return {
+        symbol.decode('utf-8'): int(token)
+        for symbol, token in zip(columns['tradingsymbol'][rows], columns['instrument_token'][rows])
+    }
+
+
+class DownloadJournal:
+    """
+    Append-only JSON lines {"symbol", "interval", "through", "candles"}, one per stored
+    chunk. checkpoint() is the last date known to be fully downloaded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._through = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path) as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line may be cut short by a crash
+                        continue
+                    key = (entry['symbol'], entry['interval'])
+                    through = date.fromisoformat(entry['through'])
+                    self._through[key] = max(through, self._through.get(key, through))
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, 'a')
+
+    def checkpoint(self, symbol, interval):
+        return self._through.get((symbol, interval))
+
+    def record(self, chunk, candles):
+        # Today is still trading, so a chunk ending today only completes yesterday
+        through = min(chunk.end, datetime.now(IST).date() - timedelta(days=1))
+        line = json.dumps({
+            'symbol': chunk.symbol, 'interval': chunk.interval, 'through': through.isoformat(), 'candles': candles,
+        })
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._through[(chunk.symbol, chunk.interval)] = through
+
+    def close(self):
+        self._file.close()
+
+
+def open_journal(store=None):
+    return DownloadJournal(os.path.join((store or get_ohlcv_store()).directory, JOURNAL_FILE))
+
+
+class DownloadPlan(dict):
+    """
+    {(symbol, interval): [Chunk, ...]} still to download. `skipped` lists the Chunk-shaped
+    ranges before a series' first stored candle: the store only appends, so they cannot
+    be filled in (remove the series' file to download it again from the start).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.skipped = []
+
+
+def plan_downloads(tokens, intervals, start, end, store=None, journal=None):
+    """
+    Chunks still needed to cover start..end (dates) for {symbol: instrument_token} at
+    each interval, as a DownloadPlan of {(symbol, interval): [Chunk, ...]} in date order.
+    """
+    store = store or get_ohlcv_store()
+    plan = DownloadPlan()
+    for symbol, token in tokens.items():
+        for interval in intervals:
+            try:
+                last = store.last_time(symbol, interval)
+            except ValueError as e:
+                logger.warning(f"Skipping {symbol}: {e}")
+                break
+            begin = start
+            if last is not None:
+                first = store.records(symbol, interval)['time'][0].astype('M8[D]').item()
+                if start < first:
+                    plan.skipped.append(Chunk(symbol, token, interval, start, min(end, first - timedelta(days=1))))
+                # Fetch the last stored day again: its candles may have been partial
+                begin = max(begin, last.astype('M8[D]').item())
+            checkpoint = journal.checkpoint(symbol, interval) if journal else None
+            if checkpoint is not None:
+                begin = max(begin, checkpoint + timedelta(days=1))
+            chunks = []
+            span = timedelta(days=MAX_DAYS[interval] - 1)
+            while begin <= end:
+                chunk_end = min(begin + span, end)
+                chunks.append(Chunk(symbol, token, interval, begin, chunk_end))
+                begin = chunk_end + timedelta(days=1)
+            if chunks:
+                plan[(symbol, interval)] = chunks
+    return plan
+
+
+class DownloadStats:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.done = 0
+        self.candles = 0
+        self.stored = 0
+        self.failed = []
+        self.started = time_module.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, candles, stored):
+        with self._lock:
+            self.done += 1
+            self.candles += candles
+            self.stored += stored
+
+    def fail(self, chunk, error):
+        with self._lock:
+            self.failed.append((chunk, error))
+
+    @property
+    def elapsed(self):
+        return time_module.monotonic() - self.started
+
+    @property
+    def candles_per_second(self):
+        return self.candles / self.elapsed if self.elapsed else 0.0
+
+
+def _download_series(kite, chunks, store, journal, stats, stop_event, progress):
+    for chunk in chunks:
+        if stop_event is not None and stop_event.is_set():
+            return
+        try:
+            candles = kite.historical_data(
+                chunk.token, datetime.combine(chunk.start, time.min), datetime.combine(chunk.end, time(23, 59, 59)),
+                chunk.interval,
+            )
+            stored = store.append(chunk.symbol, candles, chunk.interval) if candles else 0
+        except Exception as e:
+            # Later chunks of this series would leave a gap the append-only store cannot fill
+            logger.error(f"Historical download failed for {chunk.symbol} {chunk.interval} {chunk.start}: {e}")
+            stats.fail(chunk, str(e))
+            return
+        journal.record(chunk, len(candles))
+        stats.add(len(candles), stored)
+        if progress:
+            progress(stats)
+
+
+def download_history(kite, plan, store=None, journal=None, max_workers=None, stop_event=None, progress=None):
+    """
+    Download a plan from plan_downloads() into the store, one series per worker thread,
+    recording every stored chunk in the journal. Setting stop_event stops after the
+    chunks in flight. progress(stats) is called after each chunk. Returns DownloadStats.
+    """
+    store = store or get_ohlcv_store()
+    stats = DownloadStats(sum(len(chunks) for chunks in plan.values()))
+    if not plan:
+        return stats
+    own_journal = journal is None
+    if own_journal:
+        journal = open_journal(store)
+    workers = min(max_workers or settings.HISTORICAL_DOWNLOAD_WORKERS, len(plan))
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='history') as executor:
+            futures = [
+                executor.submit(_download_series, kite, chunks, store, journal, stats, stop_event, progress)
+                for chunks in plan.values()
+            ]
+            for future in futures:
+                future.result()
+    finally:
+        if own_journal:
+            journal.close()
+    return stats
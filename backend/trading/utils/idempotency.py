@@ -0,0 +1,157 @@
+"""
+Idempotency keys for order endpoints.
+
+A client sends an `Idempotency-Key` header (or an "idempotency_key" field in the JSON
+body) with an order request and reuses it when it retries, e.g. after a timeout. The
+first request with a key claims it by inserting an IdempotencyKey row, unique on
+(path, key), before the view calls Kite; the row is shared by every worker process, so
+a retry that lands on another gunicorn worker sees the claim. The response is stored
+on the row and replayed for every duplicate without calling Kite again. A duplicate
+that arrives while the first request is still running polls the row until its
+response is stored instead of placing a second order. Reusing a key with a different
+body is rejected (422).
+
+Every response is kept, errors included: a 500 after a timeout may have placed the
+order, so it is replayed rather than run again. Only a response the view marked with
+mark_not_placed() (no Kite session, breaker open, limiter wait ran out, or Kite
+rejected the order) releases the key, so a retry with the same key, e.g. after logging
+in again, gets a fresh attempt.
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from ..models.idempotency_key import IdempotencyKey
+
+logger = logging.getLogger('trading')
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# How often a duplicate re-reads the row while the first request runs
+POLL_INTERVAL = 0.2
+
+
+def mark_not_placed(response):
+    """
+    Mark the response of an order request that certainly placed nothing, so its key is
+    released instead of stored.
+    """
+    response.order_not_placed = True
+    return response
+
+
+def claim_key(path, key, fingerprint):
+    """
+    Claim a key. Returns (row, True) if the caller must run the request and then call
+    store_response() or release_key(), or (row, False) for a duplicate of a known request.
+    """
+    now = timezone.now()
+    # An unfinished claim only lasts IDEMPOTENCY_CLAIM_TTL, so a killed worker cannot hold a key
+    expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_CLAIM_TTL)
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                row = IdempotencyKey.objects.create(path=path, key=key, fingerprint=fingerprint, expires_at=expires_at)
+            IdempotencyKey.objects.filter(expires_at__lte=now).delete()
+            return row, True
+        except IntegrityError:
+            row = IdempotencyKey.objects.filter(path=path, key=key).first()
+            if row is not None and row.expires_at > now:
+                return row, False
+            # Expired or just released: drop it and claim again
+            IdempotencyKey.objects.filter(path=path, key=key, expires_at__lte=now).delete()
+    raise IntegrityError(f"Could not claim idempotency key {key} on {path}")
+
+
+def store_response(row, response):
+    if getattr(response, 'order_not_placed', False):
+        release_key(row)
+        return
+    IdempotencyKey.objects.filter(pk=row.pk).update(
+        status_code=response.status_code,
+        content=response.content,
+        content_type=response.get('Content-Type', ''),
+        expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_TTL),
+    )
+
+
+def release_key(row):
+    IdempotencyKey.objects.filter(pk=row.pk).delete()
+
+
+def wait_for_response(row, timeout):
+    """
+    The stored row once its response is saved, or None if it was released or the wait
+    timed out.
+    """
+    deadline = time.monotonic() + timeout
+    while row is not None and row.status_code is None:
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(POLL_INTERVAL)
+        row = IdempotencyKey.objects.filter(pk=row.pk).first()
+    return row
+
+
+def _request_key(request):
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key:
+        return key.strip()
+    try:
+        body = json.loads(request.body.decode() or '{}')
+    except ValueError:
+        return None
+    key = body.get('idempotency_key') if isinstance(body, dict) else None
+    return str(key).strip() if key else None
+
+
+def idempotent(view):
+    """
+    Replay the stored response for requests that repeat an idempotency key.
+    Requests without a key are passed through unchanged.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = _request_key(request)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({"error": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"}, status=400)
+
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        row, owner = claim_key(request.path, key, fingerprint)
+        if not owner:
+            if row.fingerprint != fingerprint:
+                return JsonResponse(
+                    {"error": f"{IDEMPOTENCY_HEADER} was already used for a different request"}, status=422
+                )
+            row = wait_for_response(row, settings.IDEMPOTENCY_WAIT_TIMEOUT)
+            if row is None:
+                return JsonResponse(
+                    {"error": f"The original request with this {IDEMPOTENCY_HEADER} has not completed; retry"}, status=409
+                )
+            logger.info(f"Replaying response for idempotency key {key} on {request.path}")
+            response = HttpResponse(bytes(row.content), status=row.status_code, content_type=row.content_type or None)
+            response[REPLAYED_HEADER] = 'true'
+            return response
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            # The request may have reached Kite before failing, so it is not run again
+            store_response(row, JsonResponse(
+                {"error": "The original request failed and may have been placed; check your orders"}, status=500
+            ))
+            raise
+        store_response(row, response)
+        return response
+    return wrapper
@@ -0,0 +1,294 @@
+"""
+Local instrument master built from kite.instruments() (or the public CSV dump).
+
+The master is stored as one .npy file per column plus two open-addressing hash
+tables (exchange:symbol -> row, instrument_token -> row) and a sorted symbol index
+for prefix search. Every file is opened with mmap_mode='r', so all gunicorn workers
+share the same page-cache copy instead of holding ~100k rows each in their heap.
+
+Layout under INSTRUMENT_MASTER_DIR:
+    current                  name of the active version directory
+    <YYYYMMDD-HHMMSS>/*.npy  one immutable version per refresh
+"""
+import csv
+import logging
+import os
+import shutil
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger('trading')
+
+# Column name -> numpy dtype. Strings are fixed-width bytes so they can be memory-mapped.
+COLUMNS = {
+    'instrument_token': '<i8',
+    'exchange_token': '<i8',
+    'exchange': 'S8',
+    'tradingsymbol': 'S40',
+    'name': 'S48',
+    'instrument_type': 'S8',
+    'segment': 'S16',
+    'expiry': 'S10',
+    'strike': '<f8',
+    'tick_size': '<f8',
+    'lot_size': '<i4',
+}
+
+EMPTY_SLOT = -1
+CURRENT_POINTER = 'current'
+# How often (seconds) a worker checks whether a newer master has been published
+RELOAD_CHECK_INTERVAL = 30
+
+
+def _key_hash(exchange, tradingsymbol):
+    return zlib.crc32(exchange + b':' + tradingsymbol)
+
+
+def _token_hash(token):
+    # Knuth multiplicative hash, kept within 32 bits so it is identical on every platform
+    return (int(token) * 2654435761) & 0xFFFFFFFF
+
+
+def _table_size(row_count):
+    size = 1
+    while size < row_count * 2:
+        size <<= 1
+    return max(size, 8)
+
+
+def _encode(value, width):
+    if value is None:
+        return b''
+    return str(value).strip().upper().encode('utf-8')[:width]
+
+
+def _build_hash_table(hashes):
+    table = np.full(_table_size(len(hashes)), EMPTY_SLOT, dtype='<i4')
+    mask = len(table) - 1
+    for row, value in enumerate(hashes):
+        slot = value & mask
+        while table[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & mask
+        table[slot] = row
+    return table
+
+
+def build_instrument_master(rows, directory=None, keep_versions=2):
+    """
+    Write a new master version from instrument rows and make it the current one.
+
+    Args:
+        rows: Iterable of dicts as returned by kite.instruments() or csv.DictReader
+              over the instruments dump
+        directory: Base directory (defaults to settings.INSTRUMENT_MASTER_DIR)
+        keep_versions: Number of versions to keep on disk (older ones are removed)
+
+    Returns:
+        str: Path of the published version directory
+    """
+    directory = str(directory or settings.INSTRUMENT_MASTER_DIR)
+    os.makedirs(directory, exist_ok=True)
+
+    records = []
+    seen = set()
+    for row in rows:
+        exchange = _encode(row.get('exchange'), 8)
+        tradingsymbol = _encode(row.get('tradingsymbol'), 40)
+        if not exchange or not tradingsymbol or (exchange, tradingsymbol) in seen:
+            continue
+        seen.add((exchange, tradingsymbol))
+        expiry = row.get('expiry') or ''
+        records.append((
+            int(row.get('instrument_token') or 0),
+            int(row.get('exchange_token') or 0),
+            exchange,
+            tradingsymbol,
+            str(row.get('name') or '').strip().encode('utf-8')[:48],
+            _encode(row.get('instrument_type'), 8),
+            _encode(row.get('segment'), 16),
+            str(expiry).encode('utf-8')[:10],
+            float(row.get('strike') or 0),
+            float(row.get('tick_size') or 0),
+            int(float(row.get('lot_size') or 0)),
+        ))
+
+    table = np.array(records, dtype=list(COLUMNS.items()))
+    version = datetime.now().strftime('%Y%m%d-%H%M%S')
+    staging = os.path.join(directory, f'.{version}.tmp')
+    target = os.path.join(directory, version)
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    for column in COLUMNS:
+        np.save(os.path.join(staging, f'{column}.npy'), np.ascontiguousarray(table[column]))
+
+    key_hashes = [_key_hash(e, s) for e, s in zip(table['exchange'], table['tradingsymbol'])]
+    token_hashes = [_token_hash(t) for t in table['instrument_token']]
+    np.save(os.path.join(staging, 'key_index.npy'), _build_hash_table(key_hashes))
+    np.save(os.path.join(staging, 'token_index.npy'), _build_hash_table(token_hashes))
+
+    prefix_order = np.argsort(table['tradingsymbol'], kind='stable').astype('<i4')
+    np.save(os.path.join(staging, 'prefix_order.npy'), prefix_order)
+    np.save(os.path.join(staging, 'prefix_keys.npy'), table['tradingsymbol'][prefix_order])
+
+    os.replace(staging, target)
+    pointer_tmp = os.path.join(directory, f'.{CURRENT_POINTER}.tmp')
+    with open(pointer_tmp, 'w') as fh:
+        fh.write(version)
+    os.replace(pointer_tmp, os.path.join(directory, CURRENT_POINTER))
+    logger.info(f"Published instrument master {version} with {len(table)} instruments")
+
+    versions = sorted(
+        name for name in os.listdir(directory)
+        if not name.startswith('.') and os.path.isdir(os.path.join(directory, name))
+    )
+    for stale in versions[:-keep_versions]:
+        # Workers still mapping an old version keep their pages until they reload
+        shutil.rmtree(os.path.join(directory, stale), ignore_errors=True)
+    return target
+
+
+def build_instrument_master_from_csv(path, directory=None, keep_versions=2):
+    with open(path, newline='', encoding='utf-8') as fh:
+        return build_instrument_master(csv.DictReader(fh), directory, keep_versions)
+
+
+class InstrumentMaster:
+    """
+    Read-only, memory-mapped view over one published master version.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.version = os.path.basename(path)
+        self.columns = {
+            column: np.load(os.path.join(path, f'{column}.npy'), mmap_mode='r')
+            for column in COLUMNS
+        }
+        self.key_index = np.load(os.path.join(path, 'key_index.npy'), mmap_mode='r')
+        self.token_index = np.load(os.path.join(path, 'token_index.npy'), mmap_mode='r')
+        self.prefix_order = np.load(os.path.join(path, 'prefix_order.npy'), mmap_mode='r')
+        self.prefix_keys = np.load(os.path.join(path, 'prefix_keys.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.columns['instrument_token'])
+
+    def _row(self, index):
+        row = {}
+        for column, values in self.columns.items():
+            value = values[index]
+            row[column] = value.decode('utf-8') if isinstance(value, bytes) else value.item()
+        return row
+
+    def _find_key(self, exchange, tradingsymbol):
+        mask = len(self.key_index) - 1
+        slot = _key_hash(exchange, tradingsymbol) & mask
+        exchanges = self.columns['exchange']
+        symbols = self.columns['tradingsymbol']
+        while True:
+            row = int(self.key_index[slot])
+            if row == EMPTY_SLOT:
+                return None
+            if symbols[row] == tradingsymbol and exchanges[row] == exchange:
+                return row
+            slot = (slot + 1) & mask
+
+    def lookup(self, exchange, tradingsymbol):
+        """
+        Return the instrument row for EXCHANGE:SYMBOL, or None if it is not listed.
+        """
+        row = self._find_key(_encode(exchange, 8), _encode(tradingsymbol, 40))
+        return self._row(row) if row is not None else None
+
+    def instrument_token(self, exchange, tradingsymbol):
+        """
+        Return just the instrument_token for EXCHANGE:SYMBOL (None if not listed).
+        """
+        row = self._find_key(_encode(exchange, 8), _encode(tradingsymbol, 40))
+        return int(self.columns['instrument_token'][row]) if row is not None else None
+
+    def exists(self, exchange, tradingsymbol):
+        return self._find_key(_encode(exchange, 8), _encode(tradingsymbol, 40)) is not None
+
+    def resolve_exchange(self, tradingsymbol, exchanges=('NSE', 'BSE')):
+        """
+        Return the first exchange (in order) that lists the symbol, or None.
+        """
+        for exchange in exchanges:
+            if self.exists(exchange, tradingsymbol):
+                return exchange
+        return None
+
+    def by_token(self, instrument_token):
+        mask = len(self.token_index) - 1
+        slot = _token_hash(instrument_token) & mask
+        tokens = self.columns['instrument_token']
+        while True:
+            row = int(self.token_index[slot])
+            if row == EMPTY_SLOT:
+                return None
+            if tokens[row] == instrument_token:
+                return self._row(row)
+            slot = (slot + 1) & mask
+
+    def search_prefix(self, prefix, exchange=None, limit=20):
+        """
+        Autocomplete: instruments whose tradingsymbol starts with prefix, in symbol order.
+        """
+        prefix = _encode(prefix, 40)
+        if not prefix:
+            return []
+        lo = int(np.searchsorted(self.prefix_keys, prefix, side='left'))
+        hi = int(np.searchsorted(self.prefix_keys, prefix + b'\xff', side='left'))
+        wanted = _encode(exchange, 8) if exchange else None
+        results = []
+        for index in self.prefix_order[lo:hi]:
+            if wanted and self.columns['exchange'][index] != wanted:
+                continue
+            results.append(self._row(int(index)))
+            if len(results) >= limit:
+                break
+        return results
+
+
+_master = None
+_master_checked_at = None
+_master_lock = threading.Lock()
+
+
+def _checked_recently(now):
+    return _master_checked_at is not None and now - _master_checked_at < RELOAD_CHECK_INTERVAL
+
+
+def get_instrument_master():
+    """
+    Return the current memory-mapped master for this process, or None if none has
+    been built yet. A newer published version is picked up within RELOAD_CHECK_INTERVAL,
+    and while there is none the pointer file is checked at most that often too.
+    """
+    global _master, _master_checked_at
+    now = time.monotonic()
+    if _checked_recently(now):
+        return _master
+    with _master_lock:
+        if _checked_recently(now):
+            return _master
+        _master_checked_at = now
+        directory = str(settings.INSTRUMENT_MASTER_DIR)
+        try:
+            with open(os.path.join(directory, CURRENT_POINTER)) as fh:
+                version = fh.read().strip()
+        except OSError:
+            return _master
+        if _master is None or _master.version != version:
+            try:
+                _master = InstrumentMaster(os.path.join(directory, version))
+                logger.info(f"Loaded instrument master {version} ({len(_master)} instruments)")
+            except Exception as e:
+                logger.error(f"Failed to load instrument master {version}: {e}")
+        return _master
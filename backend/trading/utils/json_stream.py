@@ -0,0 +1,112 @@
+"""
+Incremental JSON parsing and NDJSON output for streamed responses.
+
+iter_json_array() yields the items of one array inside a JSON object (e.g. the "data"
+rows of a Chartink response) while the body is still arriving, holding only the
+unparsed tail of the text in memory instead of the whole document.
+"""
+import codecs
+import json
+import re
+
+_NON_WS = re.compile(r'\S')
+
+
+class _JsonReader:
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _more(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """
+        The next non-whitespace character, without consuming it.
+        """
+        while True:
+            match = _NON_WS.search(self._buffer, self._pos)
+            if match:
+                self._pos = match.start()
+                return self._buffer[self._pos]
+            self._pos = len(self._buffer)
+            if not self._more():
+                raise ValueError("Unexpected end of JSON")
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} in JSON, got {char!r}")
+        self._pos += 1
+        return char
+
+    def value(self):
+        """
+        Decode the next complete JSON value, reading more chunks as needed.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._more()
+
+
+def iter_json_array(chunks, key):
+    """
+    Yield the items of the array under `key` in a JSON object that arrives as text
+    chunks. Yields nothing if the object has no such key.
+    """
+    reader = _JsonReader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        name = reader.value()
+        reader.expect(':')
+        if name == key and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.expect(']')
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(',]') == ']':
+                        break
+        else:
+            reader.value()
+        if reader.expect(',}') == '}':
+            return
+
+
+def decode_chunks(chunks, encoding='utf-8'):
+    """
+    Decode byte chunks to text, keeping multi-byte characters split across chunks intact.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def ndjson_line(obj):
+    return json.dumps(obj, separators=(',', ':')) + '\n'
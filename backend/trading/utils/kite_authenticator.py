@@ -3,6 +3,7 @@ from django.http import JsonResponse
 import json
 from ..models.authenticator import Authenticator
 from ..models import GlobalParameters
+from .kite_client_pool import kite_client_pool
 @csrf_exempt
 def get_all_users(request):
     if request.method == 'GET':
@@ -35,6 +36,7 @@ def register_user(request):
                     'api_secret': api_secret
                 }
             )
+            kite_client_pool.invalidate(user_id)
             return JsonResponse({'message': 'User registered successfully', 'created': created}, status=201)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
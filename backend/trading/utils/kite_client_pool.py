@@ -0,0 +1,147 @@
+"""
+Process-wide pool of KiteConnect clients, one per user.
+
+Building a KiteConnect per call opens a fresh HTTP session (and TLS handshake) and
+costs two Authenticator queries. The pool keeps one client per user_id with a
+keep-alive connection pool and re-reads credentials at most once every
+KITE_CLIENT_TTL seconds, so a token rotated by another worker is picked up quickly
+while the warm session is kept.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from kiteconnect import KiteConnect
+
+from ..models.authenticator import Authenticator
+from .circuit_breaker import backoff_delay, get_breaker, is_rate_limited, is_retryable, is_transient
+from .rate_limiter import RateLimitTimeout, endpoint_class, throttle
+
+logger = logging.getLogger('trading')
+
+
+class KiteSessionMissing(Exception):
+    """
+    The user has no stored API key or access token; raised before any Kite call.
+    """
+
+
+class ThrottledKiteConnect(KiteConnect):
+    """
+    KiteConnect that waits on the shared per-API-key rate limiter before every request,
+    retries transient failures with jittered backoff and fails fast while the user's
+    circuit breaker for the endpoint is open (see circuit_breaker).
+    """
+
+    def __init__(self, *args, user_id=None, **kwargs):
+        kwargs.setdefault('timeout', settings.KITE_HTTP_TIMEOUT)
+        super().__init__(*args, **kwargs)
+        self.user_id = user_id
+
+    def _request(self, route, method, *args, **kwargs):
+        endpoint = endpoint_class(route)
+        breaker = get_breaker(self.user_id or self.api_key, endpoint)
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                throttle(self.api_key, endpoint)
+            except RateLimitTimeout:
+                breaker.release()
+                raise
+            try:
+                result = super()._request(route, method, *args, **kwargs)
+            except Exception as e:
+                if is_transient(e):
+                    breaker.record_failure(e)
+                elif is_rate_limited(e):
+                    breaker.release()
+                else:
+                    breaker.record_success()
+                attempt += 1
+                if attempt >= settings.KITE_RETRY_MAX_ATTEMPTS or not is_retryable(e, method):
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"Kite {method} {route} failed ({e}), retry {attempt} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+
+class KiteClientPool:
+    """
+    Registry of KiteConnect clients keyed by user_id.
+
+    Call invalidate(user_id) whenever the stored credentials change (token generation,
+    re-registration) so the next get() reloads them immediately.
+    """
+
+    def __init__(self, ttl=None, pool_size=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'KITE_CLIENT_TTL', 60)
+        self.pool_size = pool_size if pool_size is not None else getattr(settings, 'KITE_HTTP_POOL_SIZE', 10)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        key = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry and now - entry['checked_at'] < self.ttl:
+                return entry['kite']
+
+        api_key, access_token = self._load_credentials(key)
+        if not api_key or not access_token:
+            self.invalidate(key)
+            raise KiteSessionMissing("Missing API key or access token")
+
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry and entry['kite'].api_key == api_key:
+                # Same app, possibly a rotated token: keep the warm session
+                if entry['kite'].access_token != access_token:
+                    entry['kite'].set_access_token(access_token)
+                entry['checked_at'] = now
+                return entry['kite']
+            kite = self._build_client(key, api_key, access_token)
+            self._clients[key] = {'kite': kite, 'checked_at': now}
+            logger.debug(f"Created pooled Kite client for user {key}")
+            return kite
+
+    def invalidate(self, user_id):
+        with self._lock:
+            entry = self._clients.pop(str(user_id), None)
+        if entry:
+            entry['kite'].reqsession.close()
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._clients.values())
+            self._clients.clear()
+        for entry in entries:
+            entry['kite'].reqsession.close()
+
+    def _load_credentials(self, user_id):
+        row = Authenticator.objects.filter(user_id=user_id).values_list('api_key', 'access_token').first()
+        return row if row else (None, None)
+
+    def _build_client(self, user_id, api_key, access_token):
+        kite = ThrottledKiteConnect(
+            api_key=api_key,
+            access_token=access_token,
+            user_id=user_id,
+            root=settings.KITE_API_ROOT,
+            pool={
+                'pool_connections': self.pool_size,
+                'pool_maxsize': self.pool_size,
+            },
+        )
+        if kite.root.startswith('http://'):
+            # KiteConnect only mounts the pooled adapter for https (local simulator runs on http)
+            kite.reqsession.mount('http://', kite.reqsession.get_adapter('https://'))
+        return kite
+
+
+kite_client_pool = KiteClientPool()
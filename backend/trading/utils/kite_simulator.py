@@ -0,0 +1,847 @@
+"""
+Local stand-in for the Kite Connect REST API.
+
+Implements the endpoints this project calls (session/token, user/profile, quote,
+orders, GTT, instruments, historical, portfolio, trades) with Kite's response
+envelope, so the order, GTT and token flows can be exercised and benchmarked
+without a Zerodha account. Start it with `python manage.py run_kite_simulator` and
+point KITE_API_ROOT at it.
+
+Latency, random server errors and Kite's per-second rate limits (HTTP 429) are
+injectable. Market data is synthetic: prices random-walk on every quote, limit
+orders fill (in parts) once the walk crosses their price, and historical candles
+are a deterministic function of (instrument, timestamp) so repeated downloads agree.
+"""
+import csv
+import hashlib
+import io
+import itertools
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .rate_limiter import TokenBucket
+
+logger = logging.getLogger('trading')
+
+DEFAULT_SYMBOLS = (
+    'RELIANCE', 'TCS', 'HDFCBANK', 'INFY', 'ICICIBANK', 'HINDUNILVR', 'ITC', 'SBIN',
+    'BHARTIARTL', 'KOTAKBANK', 'LT', 'AXISBANK', 'ASIANPAINT', 'MARUTI', 'SUNPHARMA',
+    'TITAN', 'BAJFINANCE', 'WIPRO', 'ULTRACEMCO', 'NESTLEIND', 'TATAMOTORS', 'TATASTEEL',
+    'POWERGRID', 'NTPC', 'ONGC', 'COALINDIA', 'ADANIENT', 'HCLTECH', 'TECHM', 'JSWSTEEL',
+)
+
+# Kite's published per-second limits per API key
+DEFAULT_RATE_LIMITS = {'quote': 1, 'historical': 3, 'order': 10, 'gtt': 10, 'default': 10}
+
+# interval -> (candle minutes, max days per request)
+HISTORICAL_INTERVALS = {
+    'minute': (1, 60),
+    '3minute': (3, 100),
+    '5minute': (5, 100),
+    '10minute': (10, 100),
+    '15minute': (15, 200),
+    '30minute': (30, 200),
+    '60minute': (60, 400),
+    'day': (None, 2000),
+}
+
+SESSION_OPEN = (9, 15)
+SESSION_MINUTES = 375  # 09:15 - 15:30
+TICK_SIZE = 0.05
+KITE_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class SimulatorError(Exception):
+    def __init__(self, message, status=400, error_type='InputException'):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+
+
+def _round_tick(price):
+    return round(round(price / TICK_SIZE) * TICK_SIZE, 2)
+
+
+def _now():
+    return datetime.now().strftime(KITE_DATE_FORMAT)
+
+
+def _unit(*parts):
+    """
+    Deterministic pseudo-random number in [0, 1) for the given key parts.
+    """
+    digest = hashlib.blake2b(':'.join(map(str, parts)).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') / 2 ** 64
+
+
+def endpoint_for(method, path):
+    """
+    Rate-limit class of a request, mirroring how Kite buckets its limits.
+    """
+    if path.startswith('/quote'):
+        return 'quote'
+    if path.startswith('/instruments/historical'):
+        return 'historical'
+    if path.startswith('/orders') and method != 'GET':
+        return 'order'
+    if path.startswith('/gtt'):
+        return 'gtt'
+    return 'default'
+
+
+class SimulatedMarket:
+    """
+    In-memory broker state: instruments and prices, order book, trades, holdings and GTTs.
+    """
+
+    def __init__(self, symbols=DEFAULT_SYMBOLS, seed=None, partial_fill_ratio=0.5):
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.partial_fill_ratio = partial_fill_ratio
+        self.instruments = {}  # (exchange, symbol) -> instrument dict
+        self.by_token = {}
+        self.prices = {}  # symbol -> quote state shared by NSE and BSE
+        for index, symbol in enumerate(symbols):
+            symbol = symbol.strip().upper()
+            price = _round_tick(100 + _unit('price', symbol) * 2900)
+            self.prices[symbol] = {
+                'last_price': price, 'open': price, 'high': price, 'low': price,
+                'close': price, 'volume': 0,
+            }
+            for offset, exchange in enumerate(('NSE', 'BSE')):
+                token = (index + 1) * 256 + offset
+                instrument = {
+                    'instrument_token': token,
+                    'exchange_token': token // 256,
+                    'tradingsymbol': symbol,
+                    'name': symbol,
+                    'exchange': exchange,
+                    'segment': exchange,
+                    'instrument_type': 'EQ',
+                }
+                self.instruments[(exchange, symbol)] = instrument
+                self.by_token[token] = instrument
+        self.orders = {}  # order_id -> order dict (latest state)
+        self.order_history = {}  # order_id -> list of states
+        self.trades = []
+        self.holdings = {}  # symbol -> {'quantity', 'average_price'}
+        self.gtts = {}
+
+    def _next_id(self):
+        return next(self._ids)
+
+    def _instrument(self, exchange, symbol):
+        instrument = self.instruments.get((exchange, symbol))
+        if instrument is None:
+            raise SimulatorError(f"Invalid instrument {exchange}:{symbol}")
+        return instrument
+
+    def _tick(self, symbol):
+        state = self.prices[symbol]
+        price = _round_tick(max(TICK_SIZE, state['last_price'] * (1 + self._rng.gauss(0, 0.002))))
+        state['last_price'] = price
+        state['high'] = max(state['high'], price)
+        state['low'] = min(state['low'], price)
+        state['volume'] += self._rng.randint(1, 500)
+        return price
+
+    # Market data
+
+    def quote(self, keys, mode='full'):
+        data = {}
+        with self._lock:
+            for key in keys:
+                exchange, _, symbol = key.partition(':')
+                instrument = self.instruments.get((exchange, symbol))
+                if instrument is None:
+                    continue  # Kite silently omits unknown instruments
+                self._tick(symbol)
+                state = self.prices[symbol]
+                ohlc = {name: state[name] for name in ('open', 'high', 'low', 'close')}
+                if mode == 'ltp':
+                    data[key] = {'instrument_token': instrument['instrument_token'], 'last_price': state['last_price']}
+                    continue
+                entry = {
+                    'instrument_token': instrument['instrument_token'],
+                    'last_price': state['last_price'],
+                    'ohlc': ohlc,
+                }
+                if mode == 'full':
+                    entry.update({
+                        'timestamp': _now(),
+                        'last_trade_time': _now(),
+                        'volume': state['volume'],
+                        'net_change': round(state['last_price'] - state['close'], 2),
+                    })
+                data[key] = entry
+        return data
+
+    def instruments_csv(self, exchange=None):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(['instrument_token', 'exchange_token', 'tradingsymbol', 'name', 'last_price', 'expiry',
+                         'strike', 'tick_size', 'lot_size', 'instrument_type', 'segment', 'exchange'])
+        for (inst_exchange, symbol), instrument in self.instruments.items():
+            if exchange and inst_exchange != exchange:
+                continue
+            writer.writerow([instrument['instrument_token'], instrument['exchange_token'], symbol, instrument['name'],
+                             0, '', 0, TICK_SIZE, 1, 'EQ', instrument['segment'], inst_exchange])
+        return out.getvalue()
+
+    def historical(self, token, interval, from_date, to_date):
+        instrument = self.by_token.get(token)
+        if instrument is None:
+            raise SimulatorError('Invalid instrument token')
+        if interval not in HISTORICAL_INTERVALS:
+            raise SimulatorError('Invalid interval')
+        minutes, max_days = HISTORICAL_INTERVALS[interval]
+        try:
+            start = datetime.strptime(from_date, KITE_DATE_FORMAT)
+            end = datetime.strptime(to_date, KITE_DATE_FORMAT)
+        except (TypeError, ValueError):
+            raise SimulatorError('Invalid from/to date')
+        if end < start:
+            raise SimulatorError('Invalid from/to date')
+        if (end - start).days > max_days:
+            raise SimulatorError(f'interval exceeds max limit: {max_days} days')
+
+        base = self.prices[instrument['tradingsymbol']]['close']
+        candles = []
+        day = start.replace(hour=0, minute=0, second=0)
+        while day <= end:
+            if day.weekday() < 5:
+                session_start = day.replace(hour=SESSION_OPEN[0], minute=SESSION_OPEN[1])
+                if minutes is None:
+                    stamps = [(day, SESSION_MINUTES)]
+                else:
+                    stamps = [(session_start + timedelta(minutes=m), minutes)
+                              for m in range(0, SESSION_MINUTES, minutes)]
+                for stamp, span in stamps:
+                    if start <= stamp <= end:
+                        candles.append(self._candle(token, base, stamp, span))
+            day += timedelta(days=1)
+        return {'candles': candles}
+
+    def _candle(self, token, base, stamp, span):
+        # Price is a smooth function of time plus per-candle noise, so any window of the
+        # series comes out identical no matter how the requests are chunked.
+        t = stamp.timestamp() / 86400
+        drift = 1 + 0.15 * math.sin(t / 40 + token) + 0.05 * math.sin(t / 7 + token / 3)
+        open_ = base * drift * (1 + (_unit(token, stamp, 'o') - 0.5) * 0.01)
+        close = base * drift * (1 + (_unit(token, stamp, 'c') - 0.5) * 0.01)
+        high = max(open_, close) * (1 + _unit(token, stamp, 'h') * 0.005)
+        low = min(open_, close) * (1 - _unit(token, stamp, 'l') * 0.005)
+        volume = int(1000 * span * (0.5 + _unit(token, stamp, 'v')))
+        return [stamp.strftime('%Y-%m-%dT%H:%M:%S+0530'), _round_tick(open_), _round_tick(high),
+                _round_tick(low), _round_tick(close), volume]
+
+    # Orders
+
+    def _snapshot(self, order):
+        order['pending_quantity'] = order['quantity'] - order['filled_quantity'] - order['cancelled_quantity']
+        self.order_history[order['order_id']].append(dict(order))
+
+    def _fill(self, order, quantity, price):
+        previous = order['filled_quantity']
+        order['average_price'] = round(
+            (order['average_price'] * previous + price * quantity) / (previous + quantity), 2
+        )
+        order['filled_quantity'] = previous + quantity
+        order['status'] = 'COMPLETE' if order['filled_quantity'] == order['quantity'] else 'OPEN'
+        order['exchange_timestamp'] = _now()
+        self.trades.append({
+            'trade_id': str(self._next_id()),
+            'order_id': order['order_id'],
+            'exchange_order_id': order['exchange_order_id'],
+            'tradingsymbol': order['tradingsymbol'],
+            'exchange': order['exchange'],
+            'instrument_token': order['instrument_token'],
+            'transaction_type': order['transaction_type'],
+            'product': order['product'],
+            'quantity': quantity,
+            'average_price': price,
+            'fill_timestamp': _now(),
+            'order_timestamp': order['order_timestamp'],
+            'exchange_timestamp': _now(),
+        })
+        self._snapshot(order)
+
+    def _try_fill(self, order):
+        if order['status'] != 'OPEN':
+            return
+        price = self._tick(order['tradingsymbol'])
+        marketable = price <= order['price'] if order['transaction_type'] == 'BUY' else price >= order['price']
+        if not marketable:
+            return
+        pending = order['quantity'] - order['filled_quantity']
+        quantity = min(pending, max(1, math.ceil(order['quantity'] * self.partial_fill_ratio)))
+        self._fill(order, quantity, min(price, order['price']) if order['transaction_type'] == 'BUY' else max(price, order['price']))
+
+    def place_order(self, variety, params):
+        symbol = params.get('tradingsymbol', '').upper()
+        exchange = params.get('exchange', 'NSE')
+        transaction_type = params.get('transaction_type')
+        order_type = params.get('order_type')
+        if transaction_type not in ('BUY', 'SELL'):
+            raise SimulatorError('Invalid transaction_type')
+        if order_type not in ('MARKET', 'LIMIT', 'SL', 'SL-M'):
+            raise SimulatorError('Invalid order_type')
+        try:
+            quantity = int(params.get('quantity', 0))
+            price = float(params.get('price') or 0)
+            trigger_price = float(params.get('trigger_price') or 0)
+        except ValueError:
+            raise SimulatorError('Invalid quantity or price')
+        if quantity <= 0:
+            raise SimulatorError('Quantity should be greater than 0')
+        if order_type == 'LIMIT' and price <= 0:
+            raise SimulatorError('Price should be greater than 0 for LIMIT orders')
+        with self._lock:
+            instrument = self._instrument(exchange, symbol)
+            order_id = str(250000000000000 + self._next_id())
+            order = {
+                'order_id': order_id,
+                'exchange_order_id': str(1100000000000000 + self._next_id()),
+                'parent_order_id': None,
+                'status': 'OPEN',
+                'status_message': None,
+                'tradingsymbol': symbol,
+                'exchange': exchange,
+                'instrument_token': instrument['instrument_token'],
+                'transaction_type': transaction_type,
+                'order_type': order_type,
+                'product': params.get('product', 'CNC'),
+                'variety': variety,
+                'validity': params.get('validity', 'DAY'),
+                'quantity': quantity,
+                'filled_quantity': 0,
+                'pending_quantity': quantity,
+                'cancelled_quantity': 0,
+                'disclosed_quantity': 0,
+                'price': price,
+                'trigger_price': trigger_price,
+                'average_price': 0.0,
+                'order_timestamp': _now(),
+                'exchange_timestamp': None,
+                'tag': params.get('tag'),
+            }
+            self.orders[order_id] = order
+            self.order_history[order_id] = []
+            self._snapshot(order)
+            if order_type == 'MARKET':
+                self._fill(order, quantity, self._tick(symbol))
+            elif order_type == 'LIMIT':
+                self._try_fill(order)
+            else:
+                order['status'] = 'TRIGGER PENDING'
+                self._snapshot(order)
+        return {'order_id': order_id}
+
+    def modify_order(self, order_id, params):
+        with self._lock:
+            order = self._open_order(order_id)
+            if params.get('quantity'):
+                order['quantity'] = max(int(params['quantity']), order['filled_quantity'])
+            if params.get('price'):
+                order['price'] = float(params['price'])
+            self._snapshot(order)
+            self._try_fill(order)
+        return {'order_id': order_id}
+
+    def cancel_order(self, order_id):
+        with self._lock:
+            order = self._open_order(order_id)
+            order['cancelled_quantity'] = order['quantity'] - order['filled_quantity']
+            order['status'] = 'CANCELLED'
+            self._snapshot(order)
+        return {'order_id': order_id}
+
+    def _open_order(self, order_id):
+        order = self.orders.get(order_id)
+        if order is None:
+            raise SimulatorError("Couldn't find that order", status=404)
+        if order['status'] not in ('OPEN', 'TRIGGER PENDING'):
+            raise SimulatorError(f"Order cannot be modified or cancelled as it is {order['status']}")
+        return order
+
+    def list_orders(self):
+        with self._lock:
+            for order in self.orders.values():
+                self._try_fill(order)
+            return [dict(order) for order in self.orders.values()]
+
+    def get_order_history(self, order_id):
+        with self._lock:
+            if order_id not in self.order_history:
+                raise SimulatorError("Couldn't find that order", status=404)
+            self._try_fill(self.orders[order_id])
+            return list(self.order_history[order_id])
+
+    def list_trades(self, order_id=None):
+        with self._lock:
+            return [dict(t) for t in self.trades if order_id is None or t['order_id'] == order_id]
+
+    # Portfolio
+
+    def list_holdings(self):
+        with self._lock:
+            holdings = []
+            for symbol, holding in self.holdings.items():
+                if holding['quantity'] <= 0:
+                    continue
+                instrument = self.instruments[('NSE', symbol)]
+                last_price = self.prices[symbol]['last_price']
+                holdings.append({
+                    'tradingsymbol': symbol,
+                    'exchange': 'NSE',
+                    'instrument_token': instrument['instrument_token'],
+                    'isin': f'INE{instrument["exchange_token"]:06d}01',
+                    'product': 'CNC',
+                    'quantity': holding['quantity'],
+                    't1_quantity': 0,
+                    'average_price': holding['average_price'],
+                    'last_price': last_price,
+                    'close_price': self.prices[symbol]['close'],
+                    'pnl': round((last_price - holding['average_price']) * holding['quantity'], 2),
+                    'day_change': round(last_price - self.prices[symbol]['close'], 2),
+                    'day_change_percentage': round((last_price / self.prices[symbol]['close'] - 1) * 100, 2),
+                })
+            return holdings
+
+    def list_positions(self):
+        with self._lock:
+            net = {}
+            for trade in self.trades:
+                position = net.setdefault((trade['tradingsymbol'], trade['product']), {
+                    'tradingsymbol': trade['tradingsymbol'],
+                    'exchange': trade['exchange'],
+                    'instrument_token': trade['instrument_token'],
+                    'product': trade['product'],
+                    'quantity': 0,
+                    'buy_quantity': 0, 'buy_value': 0.0,
+                    'sell_quantity': 0, 'sell_value': 0.0,
+                })
+                value = trade['quantity'] * trade['average_price']
+                if trade['transaction_type'] == 'BUY':
+                    position['buy_quantity'] += trade['quantity']
+                    position['buy_value'] += value
+                else:
+                    position['sell_quantity'] += trade['quantity']
+                    position['sell_value'] += value
+            positions = []
+            for position in net.values():
+                position['quantity'] = position['buy_quantity'] - position['sell_quantity']
+                position['average_price'] = round(position['buy_value'] / position['buy_quantity'], 2) if position['buy_quantity'] else 0
+                position['last_price'] = self.prices[position['tradingsymbol']]['last_price']
+                position['pnl'] = round(
+                    position['sell_value'] - position['buy_value'] + position['quantity'] * position['last_price'], 2
+                )
+                positions.append(position)
+            return {'net': positions, 'day': [dict(p) for p in positions]}
+
+    def settle(self):
+        """
+        End the trading day: today's CNC positions move into holdings (as on Kite, where
+        delivery buys only show up in holdings from the next day) and the day's trades
+        and positions are cleared.
+        """
+        with self._lock:
+            for trade in self.trades:
+                if trade['product'] != 'CNC':
+                    continue
+                holding = self.holdings.setdefault(trade['tradingsymbol'], {'quantity': 0, 'average_price': 0.0})
+                if trade['transaction_type'] == 'BUY':
+                    total = holding['quantity'] + trade['quantity']
+                    holding['average_price'] = round(
+                        (holding['average_price'] * holding['quantity'] + trade['average_price'] * trade['quantity'])
+                        / total, 2
+                    )
+                    holding['quantity'] = total
+                else:
+                    holding['quantity'] = max(0, holding['quantity'] - trade['quantity'])
+            self.trades = []
+            return {'holdings': sum(1 for holding in self.holdings.values() if holding['quantity'] > 0)}
+
+    # GTT
+
+    def _gtt_from_params(self, params):
+        if params.get('type') not in ('single', 'two-leg'):
+            raise SimulatorError('Invalid trigger type')
+        try:
+            condition = json.loads(params.get('condition', ''))
+            orders = json.loads(params.get('orders', ''))
+        except ValueError:
+            raise SimulatorError('Invalid condition or orders')
+        expected_legs = 2 if params['type'] == 'two-leg' else 1
+        if len(condition.get('trigger_values', [])) != expected_legs or len(orders) != expected_legs:
+            raise SimulatorError(f"{params['type']} trigger needs {expected_legs} trigger value(s) and order(s)")
+        self._instrument(condition.get('exchange'), condition.get('tradingsymbol'))
+        return params['type'], condition, orders
+
+    def place_gtt(self, user_id, params):
+        with self._lock:
+            trigger_type, condition, orders = self._gtt_from_params(params)
+            trigger_id = self._next_id()
+            self.gtts[trigger_id] = {
+                'id': trigger_id,
+                'user_id': user_id,
+                'parent_trigger': None,
+                'type': trigger_type,
+                'status': 'active',
+                'condition': condition,
+                'orders': orders,
+                'created_at': _now(),
+                'updated_at': _now(),
+                'expires_at': (datetime.now() + timedelta(days=365)).strftime(KITE_DATE_FORMAT),
+                'meta': None,
+            }
+        return {'trigger_id': trigger_id}
+
+    def get_gtt(self, trigger_id):
+        gtt = self.gtts.get(trigger_id)
+        if gtt is None:
+            raise SimulatorError('Invalid trigger ID', status=404)
+        return gtt
+
+    def modify_gtt(self, trigger_id, params):
+        with self._lock:
+            gtt = self.get_gtt(trigger_id)
+            gtt['type'], gtt['condition'], gtt['orders'] = self._gtt_from_params(params)
+            gtt['updated_at'] = _now()
+        return {'trigger_id': trigger_id}
+
+    def delete_gtt(self, trigger_id):
+        with self._lock:
+            self.get_gtt(trigger_id)
+            del self.gtts[trigger_id]
+        return {'trigger_id': trigger_id}
+
+    def list_gtts(self):
+        with self._lock:
+            return [dict(gtt) for gtt in self.gtts.values()]
+
+
+class _KiteRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so pooled clients reuse connections as they would against Kite
+    protocol_version = 'HTTP/1.1'
+    simulator = None
+
+    ROUTES = (
+        ('POST', r'/session/token', 'session_token'),
+        ('DELETE', r'/session/token', 'session_delete'),
+        ('GET', r'/user/profile', 'profile'),
+        ('GET', r'/quote', 'quote_full'),
+        ('GET', r'/quote/ohlc', 'quote_ohlc'),
+        ('GET', r'/quote/ltp', 'quote_ltp'),
+        ('GET', r'/instruments', 'instruments'),
+        ('GET', r'/instruments/(?P<exchange>[A-Z]+)', 'instruments'),
+        ('GET', r'/instruments/historical/(?P<token>\d+)/(?P<interval>\w+)', 'historical'),
+        ('GET', r'/orders', 'orders'),
+        ('GET', r'/orders/(?P<order_id>\d+)', 'order_info'),
+        ('GET', r'/orders/(?P<order_id>\d+)/trades', 'order_trades'),
+        ('POST', r'/orders/(?P<variety>[a-z]+)', 'order_place'),
+        ('PUT', r'/orders/(?P<variety>[a-z]+)/(?P<order_id>\d+)', 'order_modify'),
+        ('DELETE', r'/orders/(?P<variety>[a-z]+)/(?P<order_id>\d+)', 'order_cancel'),
+        ('GET', r'/trades', 'trades'),
+        ('GET', r'/portfolio/holdings', 'holdings'),
+        ('GET', r'/portfolio/positions', 'positions'),
+        ('GET', r'/gtt/triggers', 'gtt_list'),
+        ('POST', r'/gtt/triggers', 'gtt_place'),
+        ('GET', r'/gtt/triggers/(?P<trigger_id>\d+)', 'gtt_info'),
+        ('PUT', r'/gtt/triggers/(?P<trigger_id>\d+)', 'gtt_modify'),
+        ('DELETE', r'/gtt/triggers/(?P<trigger_id>\d+)', 'gtt_delete'),
+        ('GET', r'/__simulator/stats', 'stats'),
+        ('POST', r'/__simulator/settle', 'settle'),
+    )
+    _COMPILED = [(method, re.compile(pattern + '$'), name) for method, pattern, name in ROUTES]
+
+    def log_message(self, format, *args):
+        logger.debug(f"kite-simulator: {format % args}")
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _params(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length).decode('utf-8')
+            if 'json' in (self.headers.get('Content-Type') or ''):
+                params.update({key: [value] for key, value in json.loads(body).items()})
+            else:
+                params.update(parse_qs(body))
+        return url.path.rstrip('/') or '/', params
+
+    def _send(self, status, body, content_type='application/json'):
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status, error_type, message):
+        self._send(status, json.dumps({'status': 'error', 'message': message, 'error_type': error_type, 'data': None}))
+
+    def _dispatch(self, method):
+        sim = self.simulator
+        path, params = self._params()
+        endpoint = endpoint_for(method, path)
+        sim.record(endpoint, 'requests')
+        sim.delay(endpoint)
+
+        for route_method, pattern, name in self._COMPILED:
+            match = pattern.match(path)
+            if match and route_method == method:
+                break
+        else:
+            return self._error(404, 'GeneralException', 'Route not found')
+
+        api_key = None
+        if name not in ('session_token', 'stats'):
+            auth = self.headers.get('Authorization', '')
+            api_key, _, access_token = auth.partition(' ')[2].partition(':')
+            if not auth.startswith('token ') or not sim.token_valid(api_key, access_token):
+                sim.record(endpoint, 'auth_errors')
+                return self._error(403, 'TokenException', 'Incorrect `api_key` or `access_token`.')
+        elif name == 'session_token':
+            api_key = (params.get('api_key') or [''])[0]
+
+        if name != 'stats':
+            if not sim.allow(api_key, endpoint):
+                sim.record(endpoint, 'rate_limited')
+                return self._error(429, 'NetworkException', 'Too many requests')
+            if sim.error_rate and sim.rng.random() < sim.error_rate:
+                sim.record(endpoint, 'injected_errors')
+                return self._error(503, 'NetworkException', 'Simulated upstream failure')
+
+        flat = {key: values[-1] for key, values in params.items()}
+        try:
+            result = getattr(self, f'_handle_{name}')(sim, params, flat, api_key, **match.groupdict())
+        except SimulatorError as e:
+            return self._error(e.status, e.error_type, str(e))
+        except Exception as e:
+            logger.exception(f"kite-simulator: {method} {path} failed")
+            return self._error(500, 'GeneralException', str(e))
+        if isinstance(result, str):
+            return self._send(200, result, content_type='text/csv')
+        self._send(200, json.dumps({'status': 'success', 'data': result}))
+
+    # Handlers
+
+    def _handle_session_token(self, sim, params, flat, api_key):
+        request_token = flat.get('request_token', '')
+        if not api_key or not request_token or not flat.get('checksum'):
+            raise SimulatorError('Missing api_key, request_token or checksum')
+        access_token = hashlib.sha256(f'{api_key}:{request_token}'.encode('utf-8')).hexdigest()[:32]
+        sim.issue_token(api_key, access_token)
+        return {
+            **sim.profile(),
+            'api_key': api_key,
+            'access_token': access_token,
+            'public_token': access_token[:16],
+            'refresh_token': '',
+            'login_time': _now(),
+        }
+
+    def _handle_session_delete(self, sim, params, flat, api_key):
+        return True
+
+    def _handle_profile(self, sim, params, flat, api_key):
+        return sim.profile()
+
+    def _handle_quote_full(self, sim, params, flat, api_key):
+        return sim.market.quote(params.get('i', []), 'full')
+
+    def _handle_quote_ohlc(self, sim, params, flat, api_key):
+        return sim.market.quote(params.get('i', []), 'ohlc')
+
+    def _handle_quote_ltp(self, sim, params, flat, api_key):
+        return sim.market.quote(params.get('i', []), 'ltp')
+
+    def _handle_instruments(self, sim, params, flat, api_key, exchange=None):
+        return sim.market.instruments_csv(exchange)
+
+    def _handle_historical(self, sim, params, flat, api_key, token, interval):
+        return sim.market.historical(int(token), interval, flat.get('from'), flat.get('to'))
+
+    def _handle_orders(self, sim, params, flat, api_key):
+        return sim.market.list_orders()
+
+    def _handle_order_info(self, sim, params, flat, api_key, order_id):
+        return sim.market.get_order_history(order_id)
+
+    def _handle_order_trades(self, sim, params, flat, api_key, order_id):
+        return sim.market.list_trades(order_id)
+
+    def _handle_order_place(self, sim, params, flat, api_key, variety):
+        return sim.market.place_order(variety, flat)
+
+    def _handle_order_modify(self, sim, params, flat, api_key, variety, order_id):
+        return sim.market.modify_order(order_id, flat)
+
+    def _handle_order_cancel(self, sim, params, flat, api_key, variety, order_id):
+        return sim.market.cancel_order(order_id)
+
+    def _handle_trades(self, sim, params, flat, api_key):
+        return sim.market.list_trades()
+
+    def _handle_holdings(self, sim, params, flat, api_key):
+        return sim.market.list_holdings()
+
+    def _handle_positions(self, sim, params, flat, api_key):
+        return sim.market.list_positions()
+
+    def _handle_gtt_list(self, sim, params, flat, api_key):
+        return sim.market.list_gtts()
+
+    def _handle_gtt_place(self, sim, params, flat, api_key):
+        return sim.market.place_gtt(sim.user_id, flat)
+
+    def _handle_gtt_info(self, sim, params, flat, api_key, trigger_id):
+        return sim.market.get_gtt(int(trigger_id))
+
+    def _handle_gtt_modify(self, sim, params, flat, api_key, trigger_id):
+        return sim.market.modify_gtt(int(trigger_id), flat)
+
+    def _handle_gtt_delete(self, sim, params, flat, api_key, trigger_id):
+        return sim.market.delete_gtt(int(trigger_id))
+
+    def _handle_stats(self, sim, params, flat, api_key):
+        return sim.stats()
+
+    def _handle_settle(self, sim, params, flat, api_key):
+        return sim.market.settle()
+
+
+class KiteSimulator:
+    """
+    Threaded HTTP server speaking the Kite Connect v3 REST protocol.
+
+    Args:
+        host, port: Bind address (port 0 picks a free port; see .url)
+        latency_ms: Fixed delay added to every response
+        jitter_ms: Mean of an exponentially distributed extra delay, which gives a
+            realistic long tail rather than uniform noise
+        error_rate: Probability (0-1) of answering any request with a 503
+        rate_limits: {endpoint class: requests/second per API key}; defaults to Kite's
+            limits, 0 disables a class's limit
+        symbols: Tradable NSE/BSE equity symbols
+        strict_auth: Only accept access tokens issued by this simulator's session/token
+        seed: Seed for prices and error injection
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, jitter_ms=0, error_rate=0.0,
+                 rate_limits=None, symbols=None, strict_auth=False, seed=None, user_id='SIM001'):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limits = {**DEFAULT_RATE_LIMITS, **(rate_limits or {})}
+        self.strict_auth = strict_auth
+        self.user_id = user_id
+        self.rng = random.Random(seed)
+        self.market = SimulatedMarket(symbols or DEFAULT_SYMBOLS, seed=seed)
+        self._tokens = set()
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        handler = type('KiteRequestHandler', (_KiteRequestHandler,), {'simulator': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def profile(self):
+        return {
+            'user_id': self.user_id,
+            'user_name': 'Simulated User',
+            'user_shortname': 'Simulated',
+            'email': f'{self.user_id.lower()}@example.com',
+            'user_type': 'individual',
+            'broker': 'ZERODHA',
+            'exchanges': ['NSE', 'BSE'],
+            'products': ['CNC', 'MIS', 'NRML'],
+            'order_types': ['MARKET', 'LIMIT', 'SL', 'SL-M'],
+        }
+
+    def issue_token(self, api_key, access_token):
+        with self._lock:
+            self._tokens.add((api_key, access_token))
+
+    def token_valid(self, api_key, access_token):
+        if not api_key or not access_token:
+            return False
+        return not self.strict_auth or (api_key, access_token) in self._tokens
+
+    def allow(self, api_key, endpoint):
+        rate = self.rate_limits.get(endpoint, self.rate_limits['default'])
+        if not rate:
+            return True
+        with self._lock:
+            bucket = self._buckets.get((api_key, endpoint))
+            if bucket is None:
+                bucket = self._buckets[(api_key, endpoint)] = TokenBucket(rate)
+        return bucket.acquire(timeout=0)
+
+    def delay(self, endpoint):
+        seconds = self.latency_ms / 1000
+        if self.jitter_ms:
+            seconds += self.rng.expovariate(1000 / self.jitter_ms)
+        if seconds:
+            time.sleep(seconds)
+
+    def record(self, endpoint, counter):
+        with self._lock:
+            counters = self._stats.setdefault(endpoint, {})
+            counters[counter] = counters.get(counter, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {endpoint: dict(counters) for endpoint, counters in self._stats.items()}
+
+    def serve_forever(self):
+        logger.info(f"Kite simulator listening on {self.url}")
+        self.server.serve_forever()
+
+    def start(self):
+        """
+        Serve from a background thread (for benchmarks running in the same process).
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name='kite-simulator', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
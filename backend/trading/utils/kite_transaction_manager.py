@@ -1,8 +1,13 @@
-from kiteconnect import KiteConnect
 # Import Django models
 from ..models.global_parameters import GlobalParameters
 from ..models.user import User
 from ..models.authenticator import Authenticator
+from .kite_client_pool import kite_client_pool
+from .quote_cache import quote_cache
+from .instrument_master import get_instrument_master
+from .ltp_cache import get_symbol_ltp
+from .circuit_breaker import BrokerUnavailable
+from .rate_limiter import RateLimitTimeout
 
 def get_api_key(user_id):
     authenticator = Authenticator.objects.filter(user_id=user_id).first()
@@ -13,13 +18,10 @@ def get_access_token(user_id):
     return authenticator.access_token if authenticator else None
 
 def get_kite_client(user_id):
-    api_key = get_api_key(user_id)
-    access_token = get_access_token(user_id)
-    if not api_key or not access_token:
-        raise Exception("Missing API key or access token")
-    kite = KiteConnect(api_key=api_key)
-    kite.set_access_token(access_token)
-    return kite
+    """
+    Return the pooled KiteConnect client for the user (see kite_client_pool).
+    """
+    return kite_client_pool.get(user_id)
 
 def validate_instrument(kite, stock_name):
     """
@@ -29,28 +31,22 @@ def validate_instrument(kite, stock_name):
     # Clean and format the stock name
     stock_name = stock_name.strip().upper()
     
+    # Unknown symbols are rejected from the local instrument master without any HTTP call
+    master = get_instrument_master()
+    if master is not None and master.resolve_exchange(stock_name) is None:
+        raise ValueError(f"Instrument {stock_name} not found on NSE or BSE")
+    
+    # Streamed price from the shared LTP table when the ticker process covers this symbol
+    last_price = get_symbol_ltp(stock_name)
+    if last_price is not None:
+        return stock_name, last_price
+    
     try:
-        # Try NSE first
-        quote_key = f"NSE:{stock_name}"
-        quote = kite.quote(quote_key)
-        
-        if quote_key in quote:
-            current_price = quote[quote_key]["last_price"]
-            return stock_name, current_price
-        else:
-            # If instrument not found on NSE, try BSE
-            try:
-                quote_key = f"BSE:{stock_name}"
-                quote = kite.quote(quote_key)
-                if quote_key in quote:
-                    current_price = quote[quote_key]["last_price"]
-                    return stock_name, current_price
-            except:
-                pass
-            
-            # If not found on either exchange, raise error
-            raise ValueError(f"Instrument {stock_name} not found on NSE or BSE")
-            
+        # NSE and BSE are resolved together in a single quote call, NSE preferred; repeat
+        # lookups within QUOTE_CACHE_TTL are served from the cache
+        quote = quote_cache.get(kite, stock_name)
+    except (BrokerUnavailable, RateLimitTimeout):
+        raise
     except Exception as e:
         error_msg = str(e)
         
@@ -60,18 +56,13 @@ def validate_instrument(kite, stock_name):
             # Return the stock name with a fallback price (we'll calculate it later)
             return stock_name, None
         
-        # For other errors, try BSE as fallback
-        try:
-            quote_key = f"BSE:{stock_name}"
-            quote = kite.quote(quote_key)
-            if quote_key in quote:
-                current_price = quote[quote_key]["last_price"]
-                return stock_name, current_price
-        except:
-            pass
-        
-        # If all fails and it's not a permission issue, raise the original error
         raise ValueError(f"Invalid instrument: {stock_name} not found on any exchange. Error: {error_msg}")
+    
+    if quote is None:
+        # If not found on either exchange, raise error
+        raise ValueError(f"Instrument {stock_name} not found on NSE or BSE")
+    
+    return stock_name, quote["last_price"]
 
 # Define order parameters
 def place_market_order(user_id, tradingsymbol, quantity, transaction_type):
@@ -90,9 +81,76 @@ def place_market_order(user_id, tradingsymbol, quantity, transaction_type):
     print(f"Order placed successfully. Order ID: {order_id}")
     return order_id
 
+def place_limit_buy_order(kite, tradingsymbol, quantity, buy_price):
+    """
+    Place a regular CNC limit buy order valid for the day and return its order_id
+    """
+    return kite.place_order(
+        variety=kite.VARIETY_REGULAR,
+        exchange=kite.EXCHANGE_NSE,
+        tradingsymbol=tradingsymbol,
+        transaction_type=kite.TRANSACTION_TYPE_BUY,
+        quantity=quantity,
+        order_type=kite.ORDER_TYPE_LIMIT,
+        price=buy_price,
+        product=kite.PRODUCT_CNC,
+        validity=kite.VALIDITY_DAY
+    )
+
+def _oco_gtt_legs(kite, quantity, stop_loss, target):
+    return [
+        {
+            # Stop Loss Order - triggered when price goes down to stop_loss
+            "transaction_type": kite.TRANSACTION_TYPE_SELL,
+            "quantity": quantity,
+            "order_type": kite.ORDER_TYPE_SLM,  # Stop Loss Market order
+            "product": kite.PRODUCT_CNC,
+            "price": 0,  # Market order, no price needed
+            "trigger_price": stop_loss
+        },
+        {
+            # Target Order - triggered when price goes up to target
+            "transaction_type": kite.TRANSACTION_TYPE_SELL,
+            "quantity": quantity,
+            "order_type": kite.ORDER_TYPE_LIMIT,
+            "product": kite.PRODUCT_CNC,
+            "price": target
+        }
+    ]
+
+def place_oco_gtt(kite, tradingsymbol, quantity, stop_loss, target, last_price, exchange=None):
+    """
+    Place a combined Stop Loss & Target GTT (OCO - One Cancels Other) sell for a CNC position
+    (NSE unless exchange is given) and return its trigger id
+    """
+    response = kite.place_gtt(
+        trigger_type=kite.GTT_TYPE_OCO,
+        tradingsymbol=tradingsymbol,
+        exchange=exchange or kite.EXCHANGE_NSE,
+        trigger_values=[stop_loss, target],
+        last_price=last_price,
+        orders=_oco_gtt_legs(kite, quantity, stop_loss, target)
+    )
+    return response["trigger_id"]
+
+def modify_oco_gtt(kite, gtt_id, tradingsymbol, quantity, stop_loss, target, last_price, exchange=None):
+    """
+    Resize/re-price an existing OCO GTT in place
+    """
+    return kite.modify_gtt(
+        trigger_id=gtt_id,
+        trigger_type=kite.GTT_TYPE_OCO,
+        tradingsymbol=tradingsymbol,
+        exchange=exchange or kite.EXCHANGE_NSE,
+        trigger_values=[stop_loss, target],
+        last_price=last_price,
+        orders=_oco_gtt_legs(kite, quantity, stop_loss, target)
+    )
+
 def place_limit_order_with_gtt(user_id, tradingsymbol, quantity, buy_price, stop_loss, target):
     """
-    Place a limit buy order at specified price and create GTT orders for stop loss and target
+    Place a limit buy order at specified price and register it with the fill watcher, which
+    creates the OCO GTT for stop loss and target once (and only for what) the buy fills
     
     Args:
         user_id: User ID for authentication
@@ -103,8 +161,10 @@ def place_limit_order_with_gtt(user_id, tradingsymbol, quantity, buy_price, stop
         target: Target price (should be > buy_price)
     
     Returns:
-        dict: Contains order_id, stop_loss_gtt_id, target_gtt_id
+        dict: Contains buy_order_id and status "pending_fill"; the GTT id appears on the
+        BuyOrderWatch row once the order fills
     """
+    from .gtt_watcher import register_buy_order
     kite = get_kite_client(user_id)
     
     # Validate price levels
@@ -115,52 +175,16 @@ def place_limit_order_with_gtt(user_id, tradingsymbol, quantity, buy_price, stop
     
     try:
         # Step 1: Place limit buy order
-        buy_order_id = kite.place_order(
-            variety=kite.VARIETY_REGULAR,
-            exchange=kite.EXCHANGE_NSE,
-            tradingsymbol=tradingsymbol,
-            transaction_type=kite.TRANSACTION_TYPE_BUY,
-            quantity=quantity,
-            order_type=kite.ORDER_TYPE_LIMIT,
-            price=buy_price,
-            product=kite.PRODUCT_CNC,
-            validity=kite.VALIDITY_DAY
-        )
+        buy_order_id = place_limit_buy_order(kite, tradingsymbol, quantity, buy_price)
         print(f"Buy order placed successfully. Order ID: {buy_order_id}")
         
-        # Step 2: Create combined GTT for both Stop Loss and Target (OCO - One Cancels Other)
-        combined_gtt_id = kite.place_gtt(
-            trigger_type=kite.GTT_TYPE_OCO,
-            tradingsymbol=tradingsymbol,
-            exchange=kite.EXCHANGE_NSE,
-            trigger_values=[stop_loss, target],
-            last_price=buy_price,
-            orders=[
-                {
-                    # Stop Loss Order - triggered when price goes down to stop_loss
-                    "transaction_type": kite.TRANSACTION_TYPE_SELL,
-                    "quantity": quantity,
-                    "order_type": kite.ORDER_TYPE_SLM,  # Stop Loss Market order
-                    "product": kite.PRODUCT_CNC,
-                    "price": 0,  # Market order, no price needed
-                    "trigger_price": stop_loss
-                },
-                {
-                    # Target Order - triggered when price goes up to target
-                    "transaction_type": kite.TRANSACTION_TYPE_SELL,
-                    "quantity": quantity,
-                    "order_type": kite.ORDER_TYPE_LIMIT,
-                    "product": kite.PRODUCT_CNC,
-                    "price": target
-                }
-            ]
-        )
-        print(f"Combined Stop Loss & Target GTT created successfully. GTT ID: {combined_gtt_id}")
+        # Step 2: Let the watcher create the combined GTT (OCO - One Cancels Other) on fill
+        register_buy_order(user_id, buy_order_id, tradingsymbol, quantity, buy_price, stop_loss, target)
         
         return {
             "buy_order_id": buy_order_id,
-            "combined_gtt_id": combined_gtt_id,
-            "status": "success"
+            "combined_gtt_id": None,
+            "status": "pending_fill"
         }
         
     except Exception as e:
@@ -205,6 +229,8 @@ def set_gtt_oco(user_id, stock_name, quantity, stop_loss, target):
             
             print(f"Validated instrument {stock_name} with current price: {current_price}")
         
+    except (BrokerUnavailable, RateLimitTimeout):
+        raise
     except Exception as e:
         error_msg = str(e)
         print(f"Error validating instrument {stock_name}: {error_msg}")
@@ -219,32 +245,7 @@ def set_gtt_oco(user_id, stock_name, quantity, stop_loss, target):
     
     try:
         # Create OCO GTT order with both Stop Loss and Target
-        gtt_id = kite.place_gtt(
-            trigger_type=kite.GTT_TYPE_OCO,
-            tradingsymbol=stock_name,
-            exchange=kite.EXCHANGE_NSE,
-            trigger_values=[stop_loss, target],
-            last_price=current_price,
-            orders=[
-                {
-                    # Stop Loss Order
-                    "transaction_type": kite.TRANSACTION_TYPE_SELL,
-                    "quantity": quantity,
-                    "order_type": kite.ORDER_TYPE_SLM,  # Stop Loss Market order
-                    "product": kite.PRODUCT_CNC,
-                    "price": 0,  # Market order, no price needed
-                    "trigger_price": stop_loss
-                },
-                {
-                    # Target Order
-                    "transaction_type": kite.TRANSACTION_TYPE_SELL,
-                    "quantity": quantity,
-                    "order_type": kite.ORDER_TYPE_LIMIT,
-                    "product": kite.PRODUCT_CNC,
-                    "price": target
-                }
-            ]
-        )
+        gtt_id = place_oco_gtt(kite, stock_name, quantity, stop_loss, target, current_price)
         print(f"GTT OCO order set successfully for {stock_name}. GTT ID: {gtt_id}")
         
         return {
@@ -257,6 +258,8 @@ def set_gtt_oco(user_id, stock_name, quantity, stop_loss, target):
             "status": "success"
         }
         
+    except (BrokerUnavailable, RateLimitTimeout):
+        raise
     except Exception as e:
         error_msg = str(e)
         print(f"Error in setting GTT OCO for {stock_name}: {error_msg}")
@@ -0,0 +1,253 @@
+"""
+Shared-memory last-traded-price table fed by the KiteTicker stream.
+
+`python manage.py stream_ltp` is the single writer; every web worker maps the same
+file (under /dev/shm by default) read-only, so a price lookup is an in-process hash
+probe with no network or database round trip.
+
+Layout of LTP_CACHE_PATH:
+    header  magic, capacity, heartbeat (unix time), writer pid
+    slots   open-addressing table keyed by instrument_token:
+            token, seq, last_price, updated_at
+
+Slots are never freed (tokens stay put for the probe sequence); a slot whose instrument
+is unsubscribed is cleared instead, and readers ignore prices older than
+LTP_CACHE_MAX_AGE, so a table reused across restarts does not serve stale prices.
+
+Each slot is guarded by a seqlock: the writer makes `seq` odd while it updates the
+slot and even again afterwards, and readers retry if `seq` was odd or changed under
+them, so they never see a torn price without taking any lock.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .instrument_master import get_instrument_master
+
+logger = logging.getLogger('trading')
+
+MAGIC = 0x4C545031  # "LTP1"
+HEADER_DTYPE = np.dtype([('magic', '<u4'), ('capacity', '<u4'), ('heartbeat', '<f8'), ('writer_pid', '<i8')])
+HEADER_SIZE = 64
+SLOT_DTYPE = np.dtype([('token', '<i8'), ('seq', '<u8'), ('last_price', '<f8'), ('updated_at', '<f8')])
+SEQLOCK_RETRIES = 100
+# How often (seconds) a reader re-checks whether the table file was replaced
+REOPEN_CHECK_INTERVAL = 5
+
+
+def _slot_hash(token):
+    return (int(token) * 2654435761) & 0xFFFFFFFF
+
+
+def _map(path, mode):
+    header = np.memmap(path, dtype=HEADER_DTYPE, mode=mode, offset=0, shape=(1,))
+    slots = np.memmap(path, dtype=SLOT_DTYPE, mode=mode, offset=HEADER_SIZE, shape=(int(header['capacity'][0]),))
+    return header, slots
+
+
+class LtpTable:
+    """
+    Read-only view of the LTP table.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.inode = os.stat(path).st_ino
+        self.header, self.slots = _map(path, 'r')
+        if int(self.header['magic'][0]) != MAGIC:
+            raise ValueError(f"{path} is not an LTP table")
+        self._mask = len(self.slots) - 1
+        self._tokens = self.slots['token']
+        self._seq = self.slots['seq']
+        self._price = self.slots['last_price']
+        self._updated = self.slots['updated_at']
+
+    def heartbeat(self):
+        return float(self.header['heartbeat'][0])
+
+    def is_live(self):
+        """
+        True while the ingestion process is connected and refreshing its heartbeat.
+        """
+        return time.time() - self.heartbeat() < settings.LTP_CACHE_HEARTBEAT_TIMEOUT
+
+    def _find(self, token):
+        slot = _slot_hash(token) & self._mask
+        for _ in range(len(self._tokens)):
+            current = int(self._tokens[slot])
+            if current == token:
+                return slot
+            if current == 0:
+                return None
+            slot = (slot + 1) & self._mask
+        return None
+
+    def get(self, token):
+        """
+        Return (last_price, updated_at) for an instrument_token, or None if it is not streamed.
+        """
+        slot = self._find(int(token))
+        if slot is None:
+            return None
+        for _ in range(SEQLOCK_RETRIES):
+            before = int(self._seq[slot])
+            if before & 1:
+                continue
+            price = float(self._price[slot])
+            updated_at = float(self._updated[slot])
+            if int(self._seq[slot]) == before:
+                return (price, updated_at) if before else None
+        return None
+
+
+class LtpTableWriter:
+    """
+    The single writer (stream_ltp). Reuses an existing table with the same capacity so
+    prices survive a restart; otherwise publishes a fresh file atomically.
+    """
+
+    def __init__(self, path, capacity):
+        if capacity & (capacity - 1):
+            raise ValueError("LTP table capacity must be a power of two")
+        self.path = path
+        self.capacity = capacity
+        if not self._reusable():
+            self._create()
+        self.header, self.slots = _map(path, 'r+')
+        self.header['writer_pid'][0] = os.getpid()
+        self._mask = capacity - 1
+        self._tokens = self.slots['token']
+        self._seq = self.slots['seq']
+        self._price = self.slots['last_price']
+        self._updated = self.slots['updated_at']
+        self._slot_of = {int(token): slot for slot, token in enumerate(self._tokens) if token}
+
+    def _reusable(self):
+        try:
+            header = np.memmap(self.path, dtype=HEADER_DTYPE, mode='r', offset=0, shape=(1,))
+            return (
+                int(header['magic'][0]) == MAGIC
+                and int(header['capacity'][0]) == self.capacity
+                and os.path.getsize(self.path) == HEADER_SIZE + self.capacity * SLOT_DTYPE.itemsize
+            )
+        except (OSError, ValueError):
+            return False
+
+    def _create(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as fh:
+            fh.truncate(HEADER_SIZE + self.capacity * SLOT_DTYPE.itemsize)
+        header = np.memmap(tmp_path, dtype=HEADER_DTYPE, mode='r+', offset=0, shape=(1,))
+        header['magic'][0] = MAGIC
+        header['capacity'][0] = self.capacity
+        header.flush()
+        del header
+        # Readers holding the old file keep their mapping and notice the new inode on reopen
+        os.replace(tmp_path, self.path)
+        logger.info(f"Created LTP table {self.path} ({self.capacity} slots)")
+
+    def _claim(self, token):
+        slot = self._slot_of.get(token)
+        if slot is not None:
+            return slot
+        if len(self._slot_of) >= self.capacity * 0.7:
+            return None
+        slot = _slot_hash(token) & self._mask
+        while self._tokens[slot]:
+            slot = (slot + 1) & self._mask
+        self._tokens[slot] = token
+        self._slot_of[token] = slot
+        return slot
+
+    def update(self, token, last_price, updated_at=None):
+        slot = self._claim(int(token))
+        if slot is None:
+            logger.warning(f"LTP table full, dropping instrument {token}")
+            return
+        self._seq[slot] += 1
+        self._price[slot] = last_price
+        self._updated[slot] = updated_at or time.time()
+        self._seq[slot] += 1
+
+    def clear(self, tokens):
+        """
+        Forget the prices of instruments that are no longer streamed.
+        """
+        for token in tokens:
+            slot = self._slot_of.get(int(token))
+            if slot is None:
+                continue
+            self._seq[slot] += 1
+            self._price[slot] = np.nan
+            self._updated[slot] = 0
+            self._seq[slot] += 1
+
+    def beat(self):
+        self.header['heartbeat'][0] = time.time()
+
+
+_table = None
+_table_checked_at = float('-inf')
+_table_lock = threading.Lock()
+
+
+def get_ltp_table():
+    """
+    Return this process's view of the shared table, or None if the streamer has never run.
+    """
+    global _table, _table_checked_at
+    now = time.monotonic()
+    if now - _table_checked_at < REOPEN_CHECK_INTERVAL:
+        return _table
+    with _table_lock:
+        if now - _table_checked_at < REOPEN_CHECK_INTERVAL:
+            return _table
+        _table_checked_at = now
+        path = settings.LTP_CACHE_PATH
+        try:
+            inode = os.stat(path).st_ino
+        except OSError:
+            _table = None
+            return None
+        if _table is None or _table.inode != inode:
+            try:
+                _table = LtpTable(path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to open LTP table {path}: {e}")
+                _table = None
+        return _table
+
+
+def get_ltp(instrument_token):
+    """
+    Streamed last price for an instrument token, or None if the streamer is down, not
+    subscribed to it or has not had a tick for it in LTP_CACHE_MAX_AGE seconds (callers
+    fall back to a REST quote).
+    """
+    table = get_ltp_table()
+    if table is None or not table.is_live():
+        return None
+    entry = table.get(instrument_token)
+    if entry is None or time.time() - entry[1] > settings.LTP_CACHE_MAX_AGE:
+        return None
+    return entry[0]
+
+
+def get_symbol_ltp(tradingsymbol, exchange=None):
+    """
+    Streamed last price for a symbol (NSE preferred unless exchange is given), or None.
+    """
+    master = get_instrument_master()
+    if master is None:
+        return None
+    tradingsymbol = tradingsymbol.strip().upper()
+    exchange = exchange or master.resolve_exchange(tradingsymbol)
+    if exchange is None:
+        return None
+    token = master.instrument_token(exchange, tradingsymbol)
+    return get_ltp(token) if token is not None else None
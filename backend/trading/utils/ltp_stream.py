@@ -0,0 +1,158 @@
+"""
+KiteTicker ingestion: streams last traded prices into the shared LTP table.
+
+The subscription covers every instrument the backend cares about: the streaming
+user's holdings and positions, all open trades (pl not set, shares bought) and all
+pending limit buys. It is recomputed every LTP_STREAM_REFRESH_INTERVAL seconds and
+only the difference is (un)subscribed.
+"""
+import logging
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from kiteconnect import KiteTicker
+
+from ..models.buy_order_watch import BuyOrderWatch
+from ..models.trade import Trade
+from .instrument_master import get_instrument_master
+from .kite_transaction_manager import get_kite_client
+from .ltp_cache import LtpTableWriter
+
+logger = logging.getLogger('trading')
+
+# Kite allows 3000 instruments per websocket connection
+MAX_TOKENS_PER_CONNECTION = 3000
+
+
+def watched_symbols():
+    """
+    Symbols of open trades and pending limit buys, across all users.
+    """
+    open_trades = Trade.objects.filter(sb__gt=0).filter(Q(pl__isnull=True) | Q(pl='')).exclude(stock__isnull=True)
+    symbols = {stock.strip().upper() for stock in open_trades.values_list('stock', flat=True) if stock.strip()}
+    symbols.update(
+        BuyOrderWatch.objects.filter(status=BuyOrderWatch.STATUS_PENDING).values_list('tradingsymbol', flat=True)
+    )
+    return symbols
+
+
+def resolve_tokens(kite, symbols):
+    """
+    Map symbols to instrument tokens (NSE preferred) from the local instrument master;
+    symbols it cannot resolve go to a single kite.ltp() call.
+    """
+    tokens = {}
+    unresolved = []
+    master = get_instrument_master()
+    for symbol in symbols:
+        exchange = master.resolve_exchange(symbol) if master is not None else None
+        token = master.instrument_token(exchange, symbol) if exchange else None
+        if token:
+            tokens[symbol] = token
+        else:
+            unresolved.append(symbol)
+    if unresolved:
+        keys = [f'{exchange}:{symbol}' for symbol in unresolved for exchange in ('NSE', 'BSE')]
+        for key, data in sorted(kite.ltp(keys).items(), key=lambda item: not item[0].startswith('NSE:')):
+            tokens.setdefault(key.partition(':')[2], data['instrument_token'])
+    return tokens
+
+
+def subscription_tokens(kite, extra_symbols=()):
+    """
+    Instrument tokens to stream: holdings, positions, open trades, pending buys and extras.
+    """
+    tokens = {holding['instrument_token'] for holding in kite.holdings()}
+    tokens.update(position['instrument_token'] for position in kite.positions().get('net', []))
+    symbols = watched_symbols() | {symbol.strip().upper() for symbol in extra_symbols}
+    tokens.update(resolve_tokens(kite, symbols).values())
+    if len(tokens) > MAX_TOKENS_PER_CONNECTION:
+        logger.warning(f"{len(tokens)} instruments to stream, keeping the first {MAX_TOKENS_PER_CONNECTION}")
+        tokens = set(sorted(tokens)[:MAX_TOKENS_PER_CONNECTION])
+    return tokens
+
+
+class LtpStreamer:
+    """
+    Owns the KiteTicker connection and the LTP table writer.
+    """
+
+    def __init__(self, user_id, extra_symbols=(), writer=None):
+        self.user_id = user_id
+        self.extra_symbols = tuple(extra_symbols)
+        self.writer = writer or LtpTableWriter(settings.LTP_CACHE_PATH, settings.LTP_CACHE_CAPACITY)
+        self.subscribed = set()
+        self.closed_reason = None
+        self.kite = get_kite_client(user_id)
+        self.ticker = KiteTicker(self.kite.api_key, self.kite.access_token)
+        self.ticker.on_ticks = self._on_ticks
+        self.ticker.on_connect = self._on_connect
+        self.ticker.on_close = self._on_close
+        self.ticker.on_error = self._on_error
+        self.ticker.on_noreconnect = self._on_noreconnect
+
+    def _on_ticks(self, ws, ticks):
+        for tick in ticks:
+            if 'last_price' in tick:
+                self.writer.update(tick['instrument_token'], tick['last_price'])
+        self.writer.beat()
+
+    def _on_connect(self, ws, response):
+        logger.info(f"KiteTicker connected, subscribing to {len(self.subscribed)} instruments")
+        if self.subscribed:
+            ws.subscribe(list(self.subscribed))
+            ws.set_mode(ws.MODE_LTP, list(self.subscribed))
+
+    def _on_close(self, ws, code, reason):
+        logger.warning(f"KiteTicker closed ({code}): {reason}")
+
+    def _on_error(self, ws, code, reason):
+        logger.error(f"KiteTicker error ({code}): {reason}")
+
+    def _on_noreconnect(self, ws):
+        self.closed_reason = 'KiteTicker gave up reconnecting'
+
+    def refresh_subscriptions(self):
+        close_old_connections()
+        wanted = subscription_tokens(self.kite, self.extra_symbols)
+        added = wanted - self.subscribed
+        removed = self.subscribed - wanted
+        self.subscribed = wanted
+        self.writer.clear(removed)
+        if not self.ticker.is_connected():
+            return  # on_connect subscribes the full set
+        if added:
+            self.ticker.subscribe(list(added))
+            self.ticker.set_mode(self.ticker.MODE_LTP, list(added))
+        if removed:
+            self.ticker.unsubscribe(list(removed))
+        if added or removed:
+            logger.info(f"LTP stream: +{len(added)} -{len(removed)} instruments ({len(wanted)} total)")
+
+    def run(self, stop_event, refresh_interval=None):
+        """
+        Stream until stop_event is set. Returns a reason string if the stream died and
+        should be restarted by the process manager (e.g. after a token rotation), else None.
+        """
+        refresh_interval = refresh_interval or settings.LTP_STREAM_REFRESH_INTERVAL
+        self.refresh_subscriptions()
+        self.ticker.connect(threaded=True)
+        since_refresh = 0.0
+        try:
+            while not stop_event.wait(1):
+                if self.closed_reason:
+                    return self.closed_reason
+                # Quiet markets send no ticks; the heartbeat tells readers the stream is still up
+                if self.ticker.is_connected():
+                    self.writer.beat()
+                since_refresh += 1
+                if since_refresh >= refresh_interval:
+                    since_refresh = 0.0
+                    try:
+                        self.refresh_subscriptions()
+                    except Exception as e:
+                        logger.error(f"Failed to refresh LTP subscriptions: {e}")
+        finally:
+            self.ticker.close()
+        return None
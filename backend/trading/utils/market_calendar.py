@@ -0,0 +1,146 @@
+"""
+NSE trading calendar in IST: sessions, holidays and candle close times.
+
+The cash market trades 09:15-15:30 IST on weekdays that are not exchange holidays
+(NSE_HOLIDAYS setting, ISO dates). Intraday candles are aligned to the 09:15 open and
+the last one of the day is cut short at 15:30, as on Chartink and Kite.
+"""
+import re
+from datetime import datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+
+IST = ZoneInfo('Asia/Kolkata')
+MARKET_OPEN = dtime(9, 15)
+MARKET_CLOSE = dtime(15, 30)
+
+TIMEFRAME_DAILY = 'daily'
+TIMEFRAME_WEEKLY = 'weekly'
+TIMEFRAME_MONTHLY = 'monthly'
+
+_INTRADAY = re.compile(r'\b(\d+)\s*(minute|hour)s?\b', re.IGNORECASE)
+
+
+def now_ist():
+    return datetime.now(IST)
+
+
+def _holidays():
+    return set(settings.NSE_HOLIDAYS)
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day.isoformat() not in _holidays()
+
+
+def next_trading_day(day):
+    """
+    First trading day strictly after `day`.
+    """
+    day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return day
+
+
+def previous_trading_day(day):
+    """
+    Last trading day strictly before `day`.
+    """
+    day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def latest_session(moment=None):
+    """
+    Date of the session whose daily candle is the "latest" one at `moment`: today once
+    the market has opened on a trading day, otherwise the previous trading day.
+    """
+    moment = (moment or now_ist()).astimezone(IST)
+    day = moment.date()
+    if is_trading_day(day) and moment.time() >= MARKET_OPEN:
+        return day
+    return previous_trading_day(day)
+
+
+def is_market_open(moment=None):
+    moment = (moment or now_ist()).astimezone(IST)
+    return is_trading_day(moment.date()) and MARKET_OPEN <= moment.time() < MARKET_CLOSE
+
+
+def _at(day, at):
+    return datetime.combine(day, at, tzinfo=IST)
+
+
+def next_market_open(moment=None):
+    """
+    The first 09:15 IST session open strictly after `moment`.
+    """
+    moment = (moment or now_ist()).astimezone(IST)
+    day = moment.date()
+    if is_trading_day(day) and moment < _at(day, MARKET_OPEN):
+        return _at(day, MARKET_OPEN)
+    return _at(next_trading_day(day), MARKET_OPEN)
+
+
+def scan_timeframe(scan_clause):
+    """
+    Shortest candle a Chartink scan clause looks at: minutes as an int for intraday
+    clauses ("15 minute", "1 hour"), otherwise "daily", "weekly" or "monthly".
+    """
+    minutes = [
+        int(count) * (60 if unit.lower() == 'hour' else 1)
+        for count, unit in _INTRADAY.findall(scan_clause or '')
+    ]
+    if minutes:
+        return min(minutes)
+    clause = (scan_clause or '').lower()
+    if 'daily' in clause or 'latest' in clause or 'days ago' in clause:
+        return TIMEFRAME_DAILY
+    if 'weekly' in clause:
+        return TIMEFRAME_WEEKLY
+    if 'monthly' in clause:
+        return TIMEFRAME_MONTHLY
+    return TIMEFRAME_DAILY
+
+
+def _last_trading_day_until(day, last):
+    """
+    Last trading day in [day, last], or None.
+    """
+    while last >= day:
+        if is_trading_day(last):
+            return last
+        last -= timedelta(days=1)
+    return None
+
+
+def next_candle_close(timeframe, moment=None):
+    """
+    When the candle forming at `moment` (or, outside market hours, the next one) closes.
+    """
+    moment = (moment or now_ist()).astimezone(IST)
+    day = moment.date()
+
+    if isinstance(timeframe, int):
+        if is_trading_day(day) and moment < _at(day, MARKET_CLOSE):
+            opened = _at(day, MARKET_OPEN)
+            if moment < opened:
+                return min(opened + timedelta(minutes=timeframe), _at(day, MARKET_CLOSE))
+            elapsed = (moment - opened) // timedelta(minutes=timeframe) + 1
+            return min(opened + elapsed * timedelta(minutes=timeframe), _at(day, MARKET_CLOSE))
+        day = next_trading_day(day)
+        return min(_at(day, MARKET_OPEN) + timedelta(minutes=timeframe), _at(day, MARKET_CLOSE))
+
+    if not (is_trading_day(day) and moment < _at(day, MARKET_CLOSE)):
+        day = next_trading_day(day)
+    if timeframe == TIMEFRAME_WEEKLY:
+        week_end = day + timedelta(days=6 - day.weekday())
+        return _at(_last_trading_day_until(day, week_end), MARKET_CLOSE)
+    if timeframe == TIMEFRAME_MONTHLY:
+        month_end = (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        return _at(_last_trading_day_until(day, month_end), MARKET_CLOSE)
+    return _at(day, MARKET_CLOSE)
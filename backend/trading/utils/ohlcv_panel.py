@@ -0,0 +1,57 @@
+"""
+Daily OHLCV candles for many symbols on one shared date axis.
+
+An OhlcvPanel holds one (symbols x dates) float64 array per field, with NaN where a
+symbol has no candle (not listed yet, suspended, delisted). The local scan engine
+evaluates Chartink scan clauses over it with whole-array NumPy operations, so every
+symbol is screened in the same pass.
+
+Panels are built from the OHLCV store (see ohlcv_store.get_panel).
+"""
+import numpy as np
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class PanelUnavailable(Exception):
+    pass
+
+
+class OhlcvPanel:
+    def __init__(self, symbols, dates, **fields):
+        self.symbols = list(symbols)
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        shape = (len(self.symbols), len(self.dates))
+        self.fields = {}
+        for name in FIELDS:
+            values = np.asarray(fields[name], dtype=np.float64)
+            if values.shape != shape:
+                raise ValueError(f"{name} has shape {values.shape}, expected {shape}")
+            self.fields[name] = values
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @property
+    def latest_date(self):
+        return self.dates[-1].item() if len(self.dates) else None
+
+    @classmethod
+    def from_candles(cls, candles):
+        """
+        Build a panel from {symbol: [(date, open, high, low, close, volume), ...]}.
+        """
+        symbols = sorted(candles)
+        dates = np.unique(np.array(
+            [row[0] for rows in candles.values() for row in rows], dtype='datetime64[D]'
+        ))
+        fields = {name: np.full((len(symbols), len(dates)), np.nan) for name in FIELDS}
+        for row_index, symbol in enumerate(symbols):
+            rows = candles[symbol]
+            if not rows:
+                continue
+            columns = np.searchsorted(dates, np.array([row[0] for row in rows], dtype='datetime64[D]'))
+            values = np.array([row[1:6] for row in rows], dtype=np.float64)
+            for field_index, name in enumerate(FIELDS):
+                fields[name][row_index, columns] = values[:, field_index]
+        return cls(symbols, dates, **fields)
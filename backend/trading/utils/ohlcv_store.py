@@ -0,0 +1,243 @@
+"""
+On-disk OHLCV candles, one append-only file per (interval, symbol).
+
+Layout under OHLCV_STORE_DIR:
+    <interval>/<SYMBOL>.ohlcv   packed CANDLE records in time order
+    <interval>/.version         rewritten after every append, so readers know to reload
+
+A file is just an array of fixed-size records, so reading it is an np.memmap: slicing
+a date range is a binary search on the time column and a view of the mapped pages,
+with nothing parsed or copied, and every worker shares the same page cache. Updates
+only append candles newer than the last stored one; the last candle is rewritten in
+place when it arrives again (today's candle before the close). A record cut short by
+a crash is ignored by readers and dropped by the next append.
+
+Times are IST wall-clock (daily candles at 00:00), as Kite's historical data returns them.
+get_panel() builds the OhlcvPanel of daily candles the local scan engine runs on.
+"""
+import logging
+import os
+import re
+import threading
+from datetime import date, datetime
+
+import numpy as np
+from django.conf import settings
+
+from .market_calendar import IST
+from .ohlcv_panel import FIELDS, OhlcvPanel, PanelUnavailable
+
+logger = logging.getLogger('trading')
+
+CANDLE = np.dtype([('time', '<M8[s]')] + [(name, '<f8') for name in FIELDS])
+# Kite historical data intervals
+INTERVALS = ('minute', '3minute', '5minute', '10minute', '15minute', '30minute', '60minute', 'day')
+SUFFIX = '.ohlcv'
+VERSION_FILE = '.version'
+_SYMBOL = re.compile(r'^[A-Z0-9&_.\-]{1,40}$')
+
+
+def candle_time(value):
+    """
+    np.datetime64 (seconds, IST wall-clock) for a date, datetime (aware ones are
+    converted to IST) or ISO string.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(IST).replace(tzinfo=None)
+        return np.datetime64(value, 's')
+    if isinstance(value, date):
+        return np.datetime64(value, 'D').astype('M8[s]')
+    if isinstance(value, np.datetime64):
+        return value.astype('M8[s]')
+    return candle_time(datetime.fromisoformat(str(value)))
+
+
+def _records(rows):
+    """
+    CANDLE records, sorted by time with the last duplicate winning, from (time, open,
+    high, low, close, volume) tuples or Kite historical_data dicts.
+    """
+    records = np.array([
+        (candle_time(row['date']), *(row[name] for name in FIELDS)) if isinstance(row, dict)
+        else (candle_time(row[0]), *row[1:6])
+        for row in rows
+    ], dtype=CANDLE)
+    if len(records) < 2:
+        return records
+    records = records[np.argsort(records['time'], kind='stable')]
+    last = np.append(records['time'][1:] != records['time'][:-1], True)
+    return records[last]
+
+
+class OhlcvStore:
+    def __init__(self, directory=None):
+        self.directory = str(directory or settings.OHLCV_STORE_DIR)
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def path(self, symbol, interval='day'):
+        if interval not in INTERVALS:
+            raise ValueError(f"Unknown interval {interval!r}")
+        symbol = str(symbol).strip().upper()
+        if not _SYMBOL.match(symbol):
+            raise ValueError(f"Invalid symbol {symbol!r}")
+        return os.path.join(self.directory, interval, symbol + SUFFIX)
+
+    def symbols(self, interval='day'):
+        try:
+            names = os.listdir(os.path.join(self.directory, interval))
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len(SUFFIX)] for name in names if name.endswith(SUFFIX))
+
+    def version(self, interval='day'):
+        """
+        Changes whenever candles of this interval are appended (None before the first append).
+        """
+        try:
+            return os.stat(os.path.join(self.directory, interval, VERSION_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def records(self, symbol, interval='day'):
+        """
+        All stored candles of a symbol as a read-only memory-mapped CANDLE array.
+        """
+        path = self.path(symbol, interval)
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            return np.empty(0, dtype=CANDLE)
+        count = size // CANDLE.itemsize
+        if not count:
+            return np.empty(0, dtype=CANDLE)
+        with self._lock:
+            mapped = self._maps.get(path)
+            # The file only grows (or has its last record rewritten in place), so an
+            # existing map stays valid until more records are appended
+            if mapped is None or len(mapped) != count:
+                mapped = self._maps[path] = np.memmap(path, dtype=CANDLE, mode='r', shape=(count,))
+            return mapped
+
+    def candles(self, symbol, interval='day', start=None, end=None):
+        """
+        Candles of a symbol from start to end (inclusive; dates, datetimes or ISO strings),
+        as a view of the mapped file.
+        """
+        records = self.records(symbol, interval)
+        times = records['time']
+        lo = int(np.searchsorted(times, candle_time(start), side='left')) if start is not None else 0
+        if end is None:
+            hi = len(records)
+        else:
+            limit = candle_time(end)
+            if interval != 'day' and isinstance(end, date) and not isinstance(end, datetime):
+                # An end date includes that day's intraday candles
+                limit = limit + np.timedelta64(1, 'D') - np.timedelta64(1, 's')
+            hi = int(np.searchsorted(times, limit, side='right'))
+        return records[lo:hi]
+
+    def last_time(self, symbol, interval='day'):
+        records = self.records(symbol, interval)
+        return records['time'][-1] if len(records) else None
+
+    def append(self, symbol, rows, interval='day'):
+        """
+        Append candles newer than the last stored one, rewriting the last one if it is
+        included again. Older candles are ignored. Returns the number of candles added.
+        """
+        records = _records(rows)
+        if not len(records):
+            return 0
+        path = self.path(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab'):
+            pass
+        with open(path, 'r+b') as fh:
+            size = fh.seek(0, os.SEEK_END)
+            offset = size - size % CANDLE.itemsize
+            if offset != size:
+                logger.warning(f"Dropping a partial candle record at the end of {path}")
+                fh.truncate(offset)
+            added = len(records)
+            if offset:
+                fh.seek(offset - CANDLE.itemsize)
+                last = np.frombuffer(fh.read(CANDLE.itemsize), dtype=CANDLE)['time'][0]
+                records = records[records['time'] >= last]
+                added = len(records)
+                if added and records['time'][0] == last:
+                    offset -= CANDLE.itemsize
+                    added -= 1
+            fh.seek(offset)
+            fh.write(records.tobytes())
+        self._touch(interval)
+        return added
+
+    def _touch(self, interval):
+        path = os.path.join(self.directory, interval, VERSION_FILE)
+        with open(path, 'w') as fh:
+            fh.write(datetime.now(IST).isoformat())
+
+    def panel(self, symbols=None, start=None, end=None, days=None):
+        """
+        OhlcvPanel of the daily dates from `start` (default: the last `days`, which defaults
+        to OHLCV_PANEL_DAYS) up to `end`, for the given symbols (default: every stored
+        symbol). Symbols with no candles in that window are left out.
+        """
+        if start is None:
+            days = days or settings.OHLCV_PANEL_DAYS
+        symbols = sorted(set(symbols)) if symbols is not None else self.symbols('day')
+        series = {}
+        for symbol in symbols:
+            records = self.candles(symbol, 'day', start=start, end=end)
+            if days:
+                records = records[-days:]
+            if len(records):
+                series[symbol] = records
+        if not series:
+            return OhlcvPanel([], [], **{name: np.empty((0, 0)) for name in FIELDS})
+
+        dates = np.unique(np.concatenate([records['time'] for records in series.values()]))
+        if days:
+            dates = dates[-days:]
+        fields = {name: np.full((len(series), len(dates)), np.nan) for name in FIELDS}
+        for row, records in enumerate(series.values()):
+            records = records[records['time'] >= dates[0]]
+            columns = np.searchsorted(dates, records['time'])
+            for name in FIELDS:
+                fields[name][row, columns] = records[name]
+        return OhlcvPanel(list(series), dates.astype('M8[D]'), **fields)
+
+
+_store = None
+_panel = None
+_panel_version = None
+_store_lock = threading.Lock()
+
+
+def get_ohlcv_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = OhlcvStore()
+    return _store
+
+
+def get_panel():
+    """
+    The daily panel of every stored symbol, built once per process and again after
+    candles are appended. Raises PanelUnavailable if the store has no daily candles.
+    """
+    global _panel, _panel_version
+    store = get_ohlcv_store()
+    version = store.version('day')
+    if version is None:
+        raise PanelUnavailable(f"No daily candles in the OHLCV store at {store.directory}")
+    with _store_lock:
+        if _panel is None or version != _panel_version:
+            _panel = store.panel()
+            _panel_version = version
+            logger.info(f"Built OHLCV panel: {len(_panel)} symbols up to {_panel.latest_date}")
+        return _panel
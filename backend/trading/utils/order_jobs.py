@@ -0,0 +1,198 @@
+"""
+Persistent order job queue.
+
+Web requests only insert an OrderJob row and return 202; a separate worker process
+(`python manage.py run_order_worker`) claims queued jobs and runs their broker steps
+on a pool of threads, so slow Kite responses never hold a gunicorn worker. Limit buys
+are handed to the GTT watcher after the order is placed (job status "waiting"); the
+watcher places the GTT on fill and completes the job.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+
+from ..models.order_job import OrderJob
+from .gtt_watcher import register_buy_order
+from .kite_transaction_manager import (
+    get_kite_client,
+    place_limit_buy_order,
+    place_market_order,
+    set_gtt_oco,
+)
+
+logger = logging.getLogger('trading')
+
+# kind -> required payload fields
+REQUIRED_FIELDS = {
+    OrderJob.KIND_MARKET_BUY: ('stock_name', 'quantity'),
+    OrderJob.KIND_LIMIT_WITH_GTT: ('stock_name', 'quantity', 'buy_price', 'stop_loss', 'target'),
+    OrderJob.KIND_GTT_OCO: ('stock_name', 'quantity', 'stop_loss', 'target'),
+}
+
+
+def clean_payload(kind, data):
+    """
+    Validate and coerce the payload for a job kind.
+
+    Raises:
+        ValueError: Unknown kind, missing fields or non-numeric values
+    """
+    if kind not in REQUIRED_FIELDS:
+        raise ValueError(f"Unknown job kind '{kind}'. Expected one of: {', '.join(REQUIRED_FIELDS)}")
+    missing = [field for field in REQUIRED_FIELDS[kind] if data.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"Missing required parameters: {', '.join(missing)}")
+    payload = {'stock_name': str(data['stock_name']).strip().upper()}
+    try:
+        payload['quantity'] = int(data['quantity'])
+        for field in ('buy_price', 'stop_loss', 'target'):
+            if field in REQUIRED_FIELDS[kind]:
+                payload[field] = float(data[field])
+    except (ValueError, TypeError):
+        raise ValueError("quantity must be an integer and prices must be numbers")
+    if payload['quantity'] <= 0:
+        raise ValueError("quantity must be positive")
+    return payload
+
+
+def submit_order_job(user_id, kind, data):
+    """
+    Validate and enqueue an order job. Returns the saved OrderJob.
+    """
+    payload = clean_payload(kind, data)
+    job = OrderJob.objects.create(user_id=str(user_id), kind=kind, payload=payload)
+    logger.info(f"Queued {kind} job {job.id} for user {user_id}")
+    return job
+
+
+def _set_step(job, step, **fields):
+    job.step = step
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=['step', 'updated_at', *fields])
+
+
+def _run_market_buy(job):
+    payload = job.payload
+    _set_step(job, 'placing_order')
+    order_id = place_market_order(job.user_id, payload['stock_name'], payload['quantity'], 'BUY')
+    return {'order_id': order_id}
+
+
+def _run_gtt_oco(job):
+    payload = job.payload
+    _set_step(job, 'placing_gtt')
+    return set_gtt_oco(job.user_id, payload['stock_name'], payload['quantity'], payload['stop_loss'], payload['target'])
+
+
+def _run_limit_with_gtt(job):
+    payload = job.payload
+    if payload['stop_loss'] >= payload['buy_price']:
+        raise ValueError("Stop loss price must be less than buy price")
+    if payload['target'] <= payload['buy_price']:
+        raise ValueError("Target price must be greater than buy price")
+
+    kite = get_kite_client(job.user_id)
+    _set_step(job, 'placing_order')
+    order_id = place_limit_buy_order(kite, payload['stock_name'], payload['quantity'], payload['buy_price'])
+    # Saved before the watch exists, so the watcher can never complete the job first
+    _set_step(job, 'awaiting_fill', status=OrderJob.STATUS_WAITING, result={'buy_order_id': order_id})
+    register_buy_order(
+        job.user_id, order_id, payload['stock_name'], payload['quantity'],
+        payload['buy_price'], payload['stop_loss'], payload['target'], job=job
+    )
+    return None
+
+
+RUNNERS = {
+    OrderJob.KIND_MARKET_BUY: _run_market_buy,
+    OrderJob.KIND_LIMIT_WITH_GTT: _run_limit_with_gtt,
+    OrderJob.KIND_GTT_OCO: _run_gtt_oco,
+}
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest queued job to running and return it (None if the queue is empty).
+    SKIP LOCKED lets several worker processes poll the same table safely.
+    """
+    with transaction.atomic():
+        job = (
+            OrderJob.objects.select_for_update(skip_locked=True)
+            .filter(status=OrderJob.STATUS_QUEUED)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = OrderJob.STATUS_RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at', 'updated_at'])
+        return job
+
+
+def run_job(job):
+    try:
+        result = RUNNERS[job.kind](job)
+        if job.status == OrderJob.STATUS_WAITING:
+            # Handed over to the GTT watcher, which owns the job from here
+            return job
+        job.status = OrderJob.STATUS_SUCCEEDED
+        job.result = {**job.result, **(result or {})}
+        job.step = 'done'
+    except Exception as e:
+        logger.error(f"Order job {job.id} failed at step '{job.step}': {e}")
+        job.status = OrderJob.STATUS_FAILED
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def fail_interrupted_jobs():
+    """
+    Jobs left 'running' by a crashed worker are marked failed rather than re-run: the
+    order may already have reached Kite, and replaying it could double-buy. Only jobs
+    idle for longer than ORDER_JOB_STALE_AFTER are touched, so other live workers are unaffected.
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.ORDER_JOB_STALE_AFTER)
+    return OrderJob.objects.filter(status=OrderJob.STATUS_RUNNING, updated_at__lt=stale_before).update(
+        status=OrderJob.STATUS_FAILED,
+        error='Worker stopped while the job was running; check the Kite order book before retrying',
+        finished_at=timezone.now(),
+    )
+
+
+def _worker_loop(stop_event, poll_interval):
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            job = claim_next_job()
+        except Exception as e:
+            logger.error(f"Failed to claim order job: {e}")
+            job = None
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        run_job(job)
+    connections.close_all()
+
+
+def run_order_workers(threads=None, poll_interval=None, stop_event=None):
+    """
+    Run `threads` worker loops until stop_event is set (blocks the caller).
+    """
+    threads = threads or settings.ORDER_WORKER_THREADS
+    poll_interval = poll_interval if poll_interval is not None else settings.ORDER_WORKER_POLL_INTERVAL
+    stop_event = stop_event or threading.Event()
+    interrupted = fail_interrupted_jobs()
+    if interrupted:
+        logger.warning(f"Marked {interrupted} interrupted order job(s) as failed")
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='order-worker') as executor:
+        for _ in range(threads):
+            executor.submit(_worker_loop, stop_event, poll_interval)
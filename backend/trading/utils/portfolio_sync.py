@@ -0,0 +1,297 @@
+"""
+Sync Kite holdings and positions into Trade rows.
+
+Per user, holdings, positions and the day's trades are fetched once each and folded
+into one row per (exchange, symbol, product). Delivery (CNC) quantity is the holding
+plus today's net CNC position, because Kite only moves a delivery buy into holdings
+on the next day. Synced rows carry Trade.kite_key ("<user_id>:<exchange>:<symbol>:<product>")
+and are written with one bulk_create(update_conflicts=True) upsert. Only the fields
+the broker owns (stock, cmp, sb, invested and the sizing derived from them) are
+overwritten, so slp, tgtp, rsi, candle and remarks stay as typed in the UI. The first
+sync adopts a matching hand-entered open trade instead of adding a duplicate.
+
+The sync is incremental. A cursor per user in GlobalParameters ("portfolio-sync:<user_id>")
+stores a digest of the last snapshot and the latest fill (timestamp and trade ids)
+seen. If neither has moved, the user is skipped without a write. Otherwise only rows
+whose values changed are upserted. Synced rows that are no longer held are closed at the average
+price of the sell fills since the cursor (pl, booked, exit_date). If no such fills
+exist they are reported as "gone" and left for the user to close.
+"""
+import hashlib
+import json
+import logging
+import math
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from ..models.authenticator import Authenticator
+from ..models.global_parameters import GlobalParameters
+from ..models.trade import Trade
+from ..models.user import User
+from ..models.user_roi import UserRoi
+from .bulk_gtt import open_trades
+from .kite_transaction_manager import get_kite_client
+
+logger = logging.getLogger('trading')
+
+# Fields a sync overwrites on existing rows; sizing fields only when the user has a UserRoi
+SYNCED_FIELDS = ('stock', 'cmp', 'sb', 'invested', 'sl', 'tgt')
+SIZING_FIELDS = ('stb_sl', 'stb_ipt', 'stb')
+CLOSE_FIELDS = ('pl', 'booked', 'percent_pl', 'rr', 'exit_date', 'tenure', 'kite_key', 'synced_at')
+
+
+def cursor_key(user_id):
+    return f'portfolio-sync:{user_id}'
+
+
+def kite_key(user_id, exchange, symbol, product):
+    return f'{user_id}:{exchange}:{symbol}:{product}'
+
+
+def _fill_time(fill):
+    # kiteconnect parses timestamps to datetimes; the simulator and raw JSON give strings
+    return str(fill.get('fill_timestamp') or fill.get('exchange_timestamp') or '')
+
+
+def broker_positions(holdings, positions):
+    """
+    Fold holdings and net positions into {(exchange, symbol, product): (quantity, average_price)}.
+    Short and flat positions are left out; Trade rows are long only.
+    """
+    rows = {}
+    for holding in holdings:
+        quantity = int(holding.get('quantity') or 0) + int(holding.get('t1_quantity') or 0)
+        if quantity > 0:
+            rows[(holding['exchange'], holding['tradingsymbol'], 'CNC')] = (quantity, float(holding['average_price']))
+    for position in positions.get('net', []):
+        quantity = int(position.get('quantity') or 0)
+        if not quantity:
+            continue
+        key = (position['exchange'], position['tradingsymbol'], position['product'])
+        held, average = rows.get(key, (0, 0.0))
+        total = held + quantity
+        if quantity > 0:
+            average = (held * average + quantity * float(position['average_price'])) / total
+        rows[key] = (total, average)
+    return {key: (quantity, round(average, 2)) for key, (quantity, average) in rows.items() if quantity > 0}
+
+
+def _digest(held):
+    snapshot = sorted([*key, quantity, average] for key, (quantity, average) in held.items())
+    return hashlib.sha1(json.dumps(snapshot).encode()).hexdigest()
+
+
+def _sizing(cmp, slp, tgtp, roi):
+    """
+    sl/tgt and the share-sizing columns, computed the way the trade form does.
+    """
+    sl = round(cmp - slp, 2) if slp is not None else None
+    fields = {'sl': sl, 'tgt': round(tgtp - cmp, 2) if tgtp is not None else None}
+    if roi is not None:
+        stb_sl = math.floor(float(roi.rpt or 0) / sl) if sl else 0
+        stb_ipt = math.floor(float(roi.ipt or 0) / cmp) if cmp else 0
+        positive = [stb for stb in (stb_sl, stb_ipt) if stb > 0]
+        fields.update(stb_sl=stb_sl, stb_ipt=stb_ipt, stb=min(positive) if positive else None)
+    return fields
+
+
+def load_cursor(user_id):
+    param = GlobalParameters.objects.filter(key=cursor_key(user_id)).first()
+    try:
+        return json.loads(param.value) if param and param.value else {}
+    except ValueError:
+        return {}
+
+
+def _save_cursor(user_id, cursor):
+    GlobalParameters.objects.update_or_create(key=cursor_key(user_id), defaults={'value': json.dumps(cursor)})
+
+
+def _adopt_manual_trades(user_id, held, existing):
+    """
+    Give unsynced open trades of a held symbol the kite_key of that holding/position,
+    so the upsert updates them instead of inserting a duplicate. Returns the adopted rows.
+    """
+    wanted = defaultdict(list)
+    for (exchange, symbol, product), (quantity, _) in held.items():
+        key = kite_key(user_id, exchange, symbol, product)
+        if key not in existing:
+            wanted[symbol].append((key, quantity))
+    if not wanted:
+        return []
+    candidates = defaultdict(list)
+    for trade in open_trades(user_id).filter(kite_key__isnull=True):
+        candidates[trade.stock.strip().upper()].append(trade)
+
+    adopted = []
+    for symbol, keys in wanted.items():
+        for key, quantity in keys:
+            trades = candidates.get(symbol)
+            if not trades:
+                break
+            trade = next((t for t in trades if int(t.sb) == quantity), trades[0])
+            trades.remove(trade)
+            trade.kite_key = key
+            existing[key] = trade
+            adopted.append(trade)
+    if adopted:
+        Trade.objects.bulk_update(adopted, ['kite_key'])
+    return adopted
+
+
+def _close_trade(trade, quantity, value, exit_date, now):
+    exit_price = value / quantity
+    trade.booked = round((exit_price - trade.cmp) * trade.sb, 2)
+    trade.pl = 'Profit' if trade.booked >= 0 else 'Loss'
+    trade.percent_pl = round(trade.booked / trade.invested * 100, 2) if trade.invested else None
+    trade.rr = round(trade.booked / trade.sb / trade.sl, 2) if trade.pl == 'Profit' and trade.sl else None
+    trade.exit_date = exit_date
+    trade.tenure = (exit_date - trade.entry_date).days if trade.entry_date else None
+    # Frees the key so a later buy of the same symbol starts a new trade
+    trade.kite_key = None
+    trade.synced_at = now
+
+
+def sync_user(user_id, full=False):
+    """
+    Upsert one user's Kite holdings and positions into Trade rows.
+
+    Args:
+        user_id: User ID for authentication (User.user_id)
+        full: Ignore the cursor and diff every row even if nothing moved
+
+    Returns:
+        dict: {"user_id", "unchanged", "positions", "created", "updated", "adopted",
+        "closed": [...], "gone": [...]}
+    """
+    user = User.objects.filter(user_id=user_id).first()
+    if user is None:
+        raise ValueError(f"User {user_id} not found")
+    kite = get_kite_client(user_id)
+    held = broker_positions(kite.holdings(), kite.positions())
+    fills = kite.trades()
+
+    cursor = {} if full else load_cursor(user_id)
+    digest = _digest(held)
+    since = cursor.get('last_fill', '')
+    # Timestamps have one-second resolution, so fills at the cursor itself are told apart by id
+    seen_ids = set(cursor.get('last_fill_ids', []))
+    new_fills = [
+        fill for fill in fills
+        if _fill_time(fill) > since or (_fill_time(fill) == since and str(fill['trade_id']) not in seen_ids)
+    ]
+    report = {
+        'user_id': user_id, 'unchanged': False, 'positions': len(held),
+        'created': 0, 'updated': 0, 'adopted': 0, 'closed': [], 'gone': [],
+    }
+    if digest == cursor.get('snapshot') and not new_fills:
+        report['unchanged'] = True
+        return report
+
+    first_buy = {}
+    sells = defaultdict(lambda: [0, 0.0, None])  # key -> [quantity, value, last fill date]
+    for fill in sorted(new_fills, key=_fill_time):
+        key = (fill['exchange'], fill['tradingsymbol'], fill['product'])
+        filled_on = date.fromisoformat(_fill_time(fill)[:10])
+        if fill['transaction_type'] == 'BUY':
+            first_buy.setdefault(key, filled_on)
+        else:
+            sold = sells[key]
+            sold[0] += int(fill['quantity'])
+            sold[1] += int(fill['quantity']) * float(fill['average_price'])
+            sold[2] = filled_on
+
+    roi = UserRoi.objects.filter(user=user).first()
+    now = timezone.now()
+    with transaction.atomic():
+        existing = {trade.kite_key: trade for trade in Trade.objects.filter(user=user, kite_key__isnull=False)}
+        report['adopted'] = len(_adopt_manual_trades(user_id, held, existing))
+
+        to_close = []
+        for key, trade in existing.items():
+            exchange, symbol, product = key.split(':')[-3:]
+            if (exchange, symbol, product) in held:
+                continue
+            quantity, value, exit_date = sells.get((exchange, symbol, product), (0, 0.0, None))
+            if not quantity or trade.cmp is None or not trade.sb:
+                report['gone'].append({'trade_id': trade.id, 'stock': symbol})
+                continue
+            _close_trade(trade, quantity, value, exit_date, now)
+            to_close.append(trade)
+            report['closed'].append({'trade_id': trade.id, 'stock': symbol, 'pl': trade.pl, 'booked': trade.booked})
+        if to_close:
+            Trade.objects.bulk_update(to_close, CLOSE_FIELDS)
+
+        rows = []
+        for (exchange, symbol, product), (quantity, average) in held.items():
+            key = kite_key(user_id, exchange, symbol, product)
+            trade = existing.get(key)
+            slp = trade.slp if trade else math.floor(average * 0.97)
+            tgtp = trade.tgtp if trade else math.floor(average * 1.09)
+            values = {
+                'stock': symbol, 'cmp': average, 'sb': quantity, 'invested': round(average * quantity, 2),
+                **_sizing(average, slp, tgtp, roi),
+            }
+            if trade is None:
+                report['created'] += 1
+            elif any(getattr(trade, field) != value for field, value in values.items()):
+                report['updated'] += 1
+            else:
+                continue
+            rows.append(Trade(
+                user=user, kite_key=key, slp=slp, tgtp=tgtp, synced_at=now,
+                entry_date=first_buy.get((exchange, symbol, product)), **values
+            ))
+        if rows:
+            update_fields = SYNCED_FIELDS + (SIZING_FIELDS if roi is not None else ()) + ('synced_at',)
+            Trade.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['kite_key'], update_fields=update_fields
+            )
+
+        last_fill = max([since] + [_fill_time(fill) for fill in fills])
+        if last_fill != since:
+            seen_ids = set()
+        seen_ids.update(str(fill['trade_id']) for fill in fills if _fill_time(fill) == last_fill)
+        _save_cursor(user_id, {
+            'snapshot': digest,
+            'last_fill': last_fill,
+            'last_fill_ids': sorted(seen_ids),
+            'synced_at': now.isoformat(),
+        })
+
+    logger.info(
+        f"Portfolio sync for user {user_id}: {report['created']} created, {report['updated']} updated, "
+        f"{report['adopted']} adopted, {len(report['closed'])} closed, {len(report['gone'])} gone"
+    )
+    return report
+
+
+def sync_all(full=False, max_workers=None):
+    """
+    Sync every user with a Kite session, a few users at a time.
+    Returns one report per user ({"user_id", "error"} if that user failed).
+    """
+    user_ids = sorted(
+        Authenticator.objects.filter(access_token__isnull=False).exclude(access_token='')
+        .values_list('user_id', flat=True)
+    )
+    if not user_ids:
+        return []
+
+    def _run(user_id):
+        try:
+            return sync_user(user_id, full=full)
+        except Exception as e:
+            logger.error(f"Portfolio sync failed for user {user_id}: {e}")
+            return {'user_id': user_id, 'error': str(e)}
+        finally:
+            connections.close_all()
+
+    workers = min(max_workers or settings.PORTFOLIO_SYNC_MAX_WORKERS, len(user_ids))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='portfolio-sync') as executor:
+        return list(executor.map(_run, user_ids))
@@ -0,0 +1,180 @@
+"""
+Per-process TTL + LRU cache in front of fetch_quotes.
+
+Quotes are market data, so entries are shared by every user of the process. Symbols
+Kite does not know on NSE/BSE are remembered (negative cache) for longer than real
+quotes. Concurrent misses for the same symbol are coalesced: the first caller fetches,
+the others wait for its result instead of sending their own request (and send their
+own only if that fetch fails).
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .quote_service import fetch_quotes, normalize_symbols
+
+logger = logging.getLogger('trading')
+
+# Cached value for symbols not listed on any exchange
+NOT_FOUND = object()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = NOT_FOUND
+        self.error = None
+
+
+class QuoteCache:
+    def __init__(self, ttl=None, negative_ttl=None, max_entries=None):
+        self.ttl = ttl if ttl is not None else settings.QUOTE_CACHE_TTL
+        self.negative_ttl = negative_ttl if negative_ttl is not None else settings.QUOTE_CACHE_NEGATIVE_TTL
+        self.max_entries = max_entries or settings.QUOTE_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()  # symbol -> (expires_at, quote or NOT_FOUND)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ('hits', 'negative_hits', 'misses', 'coalesced', 'fetches', 'errors', 'evictions'), 0
+        )
+
+    def _lookup(self, symbol, now):
+        entry = self._entries.get(symbol)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._entries[symbol]
+            return None
+        self._entries.move_to_end(symbol)
+        return entry
+
+    def _store(self, symbol, value, now):
+        ttl = self.negative_ttl if value is NOT_FOUND else self.ttl
+        self._entries[symbol] = (now + ttl, value)
+        self._entries.move_to_end(symbol)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def get_many(self, kite, symbols):
+        """
+        Quotes for many symbols (same shape as fetch_quotes); unknown symbols are left out.
+        Cached symbols cost nothing, the rest are fetched in one batched call.
+
+        Raises:
+            Whatever fetch_quotes raised with this call's kite. A waiter never gets another
+            caller's error: symbols whose shared fetch failed are fetched again with `kite`
+        """
+        symbols = normalize_symbols(symbols)
+        quotes = {}
+        waiting = {}
+        to_fetch = []
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                entry = self._lookup(symbol, now)
+                if entry is not None:
+                    if entry[1] is NOT_FOUND:
+                        self._stats['negative_hits'] += 1
+                    else:
+                        self._stats['hits'] += 1
+                        quotes[symbol] = entry[1]
+                elif symbol in self._flights:
+                    self._stats['coalesced'] += 1
+                    waiting[symbol] = self._flights[symbol]
+                else:
+                    self._stats['misses'] += 1
+                    self._flights[symbol] = _Flight()
+                    to_fetch.append(symbol)
+
+        if to_fetch:
+            self._fetch(kite, to_fetch, quotes)
+
+        failed = []
+        for symbol, flight in waiting.items():
+            flight.done.wait()
+            if flight.error is not None:
+                # The owner's error may be about its own session (expired token, rate
+                # limit), so only its results are shared: fetch these with our own kite
+                failed.append(symbol)
+            elif flight.value is not NOT_FOUND:
+                quotes[symbol] = flight.value
+        if failed:
+            self._refetch(kite, failed, quotes)
+        return {symbol: quotes[symbol] for symbol in symbols if symbol in quotes}
+
+    def _fetch(self, kite, symbols, quotes):
+        error = None
+        fetched = {}
+        try:
+            fetched = fetch_quotes(kite, symbols)
+        except Exception as e:
+            error = e
+        now = time.monotonic()
+        with self._lock:
+            self._stats['fetches'] += 1
+            if error is not None:
+                self._stats['errors'] += 1
+            for symbol in symbols:
+                flight = self._flights.pop(symbol)
+                if error is None:
+                    flight.value = fetched.get(symbol, NOT_FOUND)
+                    self._store(symbol, flight.value, now)
+                flight.error = error
+                flight.done.set()
+        if error is not None:
+            raise error
+        quotes.update(fetched)
+
+    def _refetch(self, kite, symbols, quotes):
+        """
+        Fetch symbols whose coalesced flight failed, without coalescing again.
+        """
+        try:
+            fetched = fetch_quotes(kite, symbols)
+        except Exception:
+            with self._lock:
+                self._stats['fetches'] += 1
+                self._stats['errors'] += 1
+            raise
+        now = time.monotonic()
+        with self._lock:
+            self._stats['fetches'] += 1
+            for symbol in symbols:
+                self._store(symbol, fetched.get(symbol, NOT_FOUND), now)
+        quotes.update(fetched)
+
+    def get(self, kite, symbol):
+        """
+        Quote for one symbol, or None if it is not listed on NSE/BSE.
+        """
+        symbol = symbol.strip().upper()
+        return self.get_many(kite, [symbol]).get(symbol)
+
+    def invalidate(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol.strip().upper(), None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            size = len(self._entries)
+        lookups = stats['hits'] + stats['negative_hits'] + stats['misses'] + stats['coalesced']
+        stats.update({
+            'size': size,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'negative_ttl': self.negative_ttl,
+            # Coalesced lookups did not cost a Kite call either
+            'hit_ratio': round((lookups - stats['misses']) / lookups, 4) if lookups else None,
+        })
+        return stats
+
+
+quote_cache = QuoteCache()
@@ -0,0 +1,90 @@
+"""
+Bulk quote lookups on top of Kite's multi-instrument quote API.
+
+Kite accepts up to KITE_QUOTE_BATCH_SIZE instruments per quote call, so a whole
+screener or trade table can be priced in one or two HTTP requests instead of one
+(or two, NSE then BSE) per symbol.
+"""
+import logging
+
+from .instrument_master import get_instrument_master
+
+logger = logging.getLogger('trading')
+
+# Maximum number of instruments Kite accepts in a single /quote call
+KITE_QUOTE_BATCH_SIZE = 500
+
+DEFAULT_EXCHANGES = ("NSE", "BSE")
+
+
+def normalize_symbols(symbols):
+    """
+    Upper-case, strip and de-duplicate symbols while keeping their order.
+    """
+    seen = set()
+    cleaned = []
+    for symbol in symbols:
+        if not symbol:
+            continue
+        symbol = str(symbol).strip().upper()
+        if symbol and symbol not in seen:
+            seen.add(symbol)
+            cleaned.append(symbol)
+    return cleaned
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def fetch_quotes(kite, symbols, exchanges=DEFAULT_EXCHANGES, batch_size=KITE_QUOTE_BATCH_SIZE):
+    """
+    Fetch quotes for many symbols, resolving each one on the first exchange (in order)
+    where Kite knows it. All exchanges are requested together in the same batch.
+
+    Args:
+        kite: KiteConnect client
+        symbols: Iterable of trading symbols (e.g. ["INFY", "TCS"])
+        exchanges: Exchanges to try, in order of preference
+        batch_size: Instruments per quote call
+
+    Returns:
+        dict: symbol -> {"exchange", "last_price", "ohlc", "volume", "net_change", "timestamp"}.
+        Symbols not found on any exchange are left out.
+    """
+    symbols = normalize_symbols(symbols)
+    if not symbols:
+        return {}
+
+    # With a local instrument master only the exchanges that actually list a symbol are asked for
+    master = get_instrument_master()
+    instrument_keys = [
+        f"{exchange}:{symbol}"
+        for symbol in symbols
+        for exchange in exchanges
+        if master is None or master.exists(exchange, symbol)
+    ]
+    if not instrument_keys:
+        return {}
+
+    raw_quotes = {}
+    for chunk in _chunks(instrument_keys, batch_size):
+        raw_quotes.update(kite.quote(chunk) or {})
+
+    quotes = {}
+    for symbol in symbols:
+        for exchange in exchanges:
+            quote = raw_quotes.get(f"{exchange}:{symbol}")
+            if quote:
+                quotes[symbol] = {
+                    "exchange": exchange,
+                    "last_price": quote.get("last_price"),
+                    "ohlc": quote.get("ohlc"),
+                    "volume": quote.get("volume"),
+                    "net_change": quote.get("net_change"),
+                    "timestamp": quote.get("timestamp"),
+                }
+                break
+    logger.debug(f"Fetched {len(quotes)}/{len(symbols)} quotes in {len(instrument_keys)} instrument lookups")
+    return quotes
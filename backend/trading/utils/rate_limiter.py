@@ -0,0 +1,175 @@
+"""
+Token-bucket rate limiting for outgoing Kite API calls.
+
+Kite enforces its per-second caps per API key across every process using that key,
+so the buckets live in small state files under KITE_RATE_LIMIT_DIR guarded by
+flock(): all gunicorn workers, management commands and worker threads on the host
+draw from the same bucket. Callers block until a token is free instead of getting
+a 429 back from Kite.
+"""
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: fall back to per-process buckets
+    fcntl = None
+
+logger = logging.getLogger('trading')
+
+# Kite route name prefix -> endpoint class with its own bucket
+ROUTE_CLASSES = (
+    ('market.quote', 'quote'),
+    ('market.historical', 'historical'),
+    ('order.place', 'order'),
+    ('order.modify', 'order'),
+    ('order.cancel', 'order'),
+    ('gtt', 'gtt'),
+)
+
+_STATE = struct.Struct('<dd')  # tokens, last refill (unix time)
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+def endpoint_class(route):
+    """
+    Map a KiteConnect route name (e.g. "order.place", "market.quote.ltp") to its bucket class.
+    """
+    for prefix, name in ROUTE_CLASSES:
+        if route == prefix or route.startswith(prefix + '.'):
+            return name
+    return 'default'
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens are added per second up to `capacity`.
+    acquire() blocks until a token is available (or `timeout` seconds have passed).
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _read_state(self):
+        return self._state
+
+    def _write_state(self, tokens, updated_at):
+        self._state = (tokens, updated_at)
+
+    def _locked(self):
+        return self._lock
+
+    def _take(self):
+        """
+        Try to take a token. Returns 0 on success, otherwise the seconds to wait.
+        """
+        with self._locked():
+            now = time.time()
+            state = self._read_state()
+            tokens, updated_at = state if state else (self.capacity, now)
+            tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+            if tokens >= 1:
+                self._write_state(tokens - 1, now)
+                return 0
+            self._write_state(tokens, now)
+            return (1 - tokens) / self.rate
+
+    def acquire(self, timeout=None):
+        """
+        Take one token, waiting if necessary.
+
+        Returns:
+            bool: True if a token was taken, False if `timeout` expired first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class _FileLock:
+    def __init__(self, thread_lock, fd):
+        self.thread_lock = thread_lock
+        self.fd = fd
+
+    def __enter__(self):
+        # flock() is per open file, so threads of this process serialise on the thread lock first
+        self.thread_lock.acquire()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.thread_lock.release()
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in a file shared by every process on the host.
+    """
+
+    def __init__(self, path, rate, capacity=None):
+        super().__init__(rate, capacity)
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def _locked(self):
+        return _FileLock(self._lock, self._fd)
+
+    def _read_state(self):
+        raw = os.pread(self._fd, _STATE.size, 0)
+        return _STATE.unpack(raw) if len(raw) == _STATE.size else None
+
+    def _write_state(self, tokens, updated_at):
+        os.pwrite(self._fd, _STATE.pack(tokens, updated_at), 0)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_kite_bucket(api_key, endpoint):
+    """
+    Return the bucket for an API key and endpoint class ("quote", "order", "gtt", "historical", "default").
+    """
+    key = (api_key, endpoint)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            limits = settings.KITE_RATE_LIMITS
+            rate = limits.get(endpoint, limits['default'])
+            if fcntl is not None:
+                digest = hashlib.sha1(str(api_key).encode('utf-8')).hexdigest()[:16]
+                path = os.path.join(str(settings.KITE_RATE_LIMIT_DIR), f'{digest}-{endpoint}.bucket')
+                bucket = SharedTokenBucket(path, rate)
+            else:
+                bucket = TokenBucket(rate)
+            _buckets[key] = bucket
+        return bucket
+
+
+def throttle(api_key, endpoint):
+    """
+    Block until a Kite request of this endpoint class may be sent for the API key.
+    Raises RateLimitTimeout if that would take longer than KITE_RATE_LIMIT_MAX_WAIT seconds.
+    """
+    bucket = get_kite_bucket(api_key, endpoint)
+    if not bucket.acquire(timeout=settings.KITE_RATE_LIMIT_MAX_WAIT):
+        logger.warning(f"Kite {endpoint} rate limit wait exceeded for api_key {str(api_key)[:6]}...")
+        raise RateLimitTimeout(f"Too many Kite {endpoint} requests in flight, please retry shortly")
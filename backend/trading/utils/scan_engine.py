@@ -0,0 +1,597 @@
+"""
+Local evaluation of Chartink scan clauses over an OhlcvPanel.
+
+compile_clause() parses the daily subset of Chartink's scan-clause language, e.g.
+
+    ( {cash} ( latest close > latest sma( close,20 ) and
+               latest volume > 1 day ago sma( volume,20 ) * 2 and
+               latest rsi( 14 ) crossed above 60 ) )
+
+into a tree of hashable tuples. Evaluating it turns every node into a (symbols x dates)
+NumPy array, so each operator and indicator runs once for the whole universe, and the
+clause's result is the root node's boolean array at the latest date. Each node only
+reads the dates it needs (a 20-day sma at the latest date reads 20), and nodes are
+memoised per evaluation, so sub-expressions shared between clauses (evaluate_many) are
+computed once.
+
+Supported:
+    segments        {cash}
+    offsets         latest, daily, N day(s)/candle(s) ago, [0] / [-N] (daily)
+    fields          open, high, low, close, volume
+    indicators      sma/avg/ema/wma( expr, n ), max/min( n, expr ), rsi( n ), atr( n ),
+                    abs( expr ), count( n, 1 where condition ),
+                    upper/lower bollinger band( n, k ), macd line/signal/histogram( slow, fast, signal )
+    operators       + - * /, > >= < <= = !=, crossed above/below, and, or, not, ( ), "quoted expr"
+Anything else (intraday, weekly or monthly candles, fundamentals, other indicators)
+raises ScanClauseError, and the caller can run the clause on Chartink instead.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from .ohlcv_panel import FIELDS
+
+# Dates of history, per unit of period, after which an exponential average no longer
+# depends on its seed (weight left on the seed is about e**-10 for both)
+EMA_WARMUP = 5
+WILDER_WARMUP = 10
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<number>\d+(?:\.\d+)?|\.\d+)
+      | (?P<segment>\{[^}]*\})
+      | (?P<string>"[^"]*")
+      | (?P<op>>=|<=|!=|=|>|<|\+|-|\*|/|\(|\)|,|\[|\])
+      | (?P<word>[A-Za-z_][A-Za-z_0-9]*)
+    )''', re.VERBOSE)
+
+COMPARISONS = {'>', '>=', '<', '<=', '=', '!='}
+SEGMENTS = {'cash'}
+OFFSET_UNITS = {'day', 'days', 'candle', 'candles'}
+TIMEFRAME_WORDS = {
+    'weekly', 'monthly', 'quarterly', 'yearly', 'week', 'weeks', 'month', 'months',
+    'minute', 'minutes', 'hour', 'hours',
+}
+# name -> (number of expression arguments, number of integer arguments, expression first)
+FUNCTIONS = {
+    'sma': (1, 1, True),
+    'avg': (1, 1, True),
+    'ema': (1, 1, True),
+    'wma': (1, 1, True),
+    'max': (1, 1, False),
+    'min': (1, 1, False),
+    'rsi': (0, 1, True),
+    'atr': (0, 1, True),
+    'abs': (1, 0, True),
+    'upper bollinger band': (0, 2, True),
+    'lower bollinger band': (0, 2, True),
+    'macd line': (0, 3, True),
+    'macd signal': (0, 3, True),
+    'macd histogram': (0, 3, True),
+}
+_LONGEST_NAME = max(len(name.split()) for name in FUNCTIONS)
+
+
+class ScanClauseError(ValueError):
+    """
+    The clause is malformed or uses something the local engine cannot evaluate.
+    """
+
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise ScanClauseError(f"Unexpected character {text[position]!r} at {position}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        tokens.append((kind, value.lower() if kind == 'word' else value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self, ahead=0):
+        index = self.position + ahead
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, kind, value=None):
+        token = self.next()
+        if token[0] != kind or (value is not None and token[1] != value):
+            raise ScanClauseError(f"Expected {value or kind}, got {token[1]!r}")
+        return token[1]
+
+    def parse(self):
+        if self.peek()[0] == 'segment':
+            node = self.segment()
+        else:
+            node = self.boolean()
+        if self.peek()[0] is not None:
+            raise ScanClauseError(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def segment(self):
+        name = self.expect('segment')[1:-1].strip().lower()
+        if name not in SEGMENTS:
+            raise ScanClauseError(f"Segment {{{name}}} is not supported locally")
+        return ('segment', name, self.boolean())
+
+    def boolean(self):
+        kind, node = self.disjunction()
+        if kind != 'bool':
+            raise ScanClauseError("Expected a condition")
+        return node
+
+    def disjunction(self):
+        kind, node = self.conjunction()
+        while self.accept('word', 'or'):
+            node = ('or', self._condition(kind, node), self._condition(*self.conjunction()))
+            kind = 'bool'
+        return kind, node
+
+    def conjunction(self):
+        kind, node = self.negation()
+        while self.accept('word', 'and'):
+            node = ('and', self._condition(kind, node), self._condition(*self.negation()))
+            kind = 'bool'
+        return kind, node
+
+    def negation(self):
+        if self.accept('word', 'not'):
+            return 'bool', ('not', self._condition(*self.negation()))
+        return self.comparison()
+
+    def comparison(self):
+        kind, left = self.additive()
+        token = self.peek()
+        if token[0] == 'op' and token[1] in COMPARISONS:
+            self.next()
+            return 'bool', ('cmp', token[1], self._number(kind, left), self._number(*self.additive()))
+        if self.accept('word', 'crossed'):
+            direction = self.expect('word')
+            if direction not in ('above', 'below'):
+                raise ScanClauseError(f"Expected crossed above/below, got {direction!r}")
+            return 'bool', ('cross', direction, self._number(kind, left), self._number(*self.additive()))
+        return kind, left
+
+    def additive(self):
+        kind, node = self.multiplicative()
+        while self.peek() in (('op', '+'), ('op', '-')):
+            op = self.next()[1]
+            node = ('arith', op, self._number(kind, node), self._number(*self.multiplicative()))
+            kind = 'num'
+        return kind, node
+
+    def multiplicative(self):
+        kind, node = self.unary()
+        while self.peek() in (('op', '*'), ('op', '/')):
+            op = self.next()[1]
+            node = ('arith', op, self._number(kind, node), self._number(*self.unary()))
+            kind = 'num'
+        return kind, node
+
+    def unary(self):
+        if self.accept('op', '-'):
+            kind, node = self.unary()
+            node = self._number(kind, node)
+            return 'num', (('const', -node[1]) if node[0] == 'const' else ('arith', '*', ('const', -1.0), node))
+        if self.accept('op', '+'):
+            return self.unary()
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.peek()
+        if kind == 'op' and value == '(':
+            self.next()
+            if self.peek()[0] == 'segment':
+                node = self.segment()
+                self.expect('op', ')')
+                return 'bool', node
+            result = self.disjunction()
+            self.expect('op', ')')
+            return result
+        if kind == 'number':
+            self.next()
+            unit = self.peek()[1] if self.peek()[0] == 'word' else None
+            if unit in OFFSET_UNITS and self.peek(1) == ('word', 'ago'):
+                self.position += 2
+                return 'num', self.series(self._integer(value))
+            if unit in TIMEFRAME_WORDS:
+                raise ScanClauseError(f"{value} {unit} candles are not supported locally")
+            return 'num', ('const', float(value))
+        if kind == 'op' and value == '[':
+            self.next()
+            negative = self.accept('op', '-')
+            offset = self._integer(self.expect('number'))
+            self.expect('op', ']')
+            if offset and not negative:
+                raise ScanClauseError("Future candle offsets are not supported")
+            if self.peek()[0] == 'number' or self.peek()[1] in TIMEFRAME_WORDS:
+                raise ScanClauseError("Only daily candles are supported locally")
+            self.accept('word', 'daily')
+            return 'num', self.series(offset)
+        if kind == 'word':
+            if value in ('latest', 'daily'):
+                self.next()
+                return 'num', self.series(0)
+            if value in TIMEFRAME_WORDS:
+                raise ScanClauseError(f"{value} candles are not supported locally")
+            return 'num', self.series(0)
+        if kind == 'string':
+            return 'num', self.series(0)
+        raise ScanClauseError(f"Unexpected {value!r}" if value else "Unexpected end of clause")
+
+    def series(self, offset):
+        """
+        A field, indicator or quoted expression, shifted back `offset` candles.
+        """
+        kind, value = self.peek()
+        if kind == 'string':
+            self.next()
+            inner = _Parser(tokenize(value[1:-1]))
+            node = inner._number(*inner.additive())
+            if inner.peek()[0] is not None:
+                raise ScanClauseError(f"Unexpected {inner.peek()[1]!r} in quoted expression")
+        elif kind == 'word':
+            node = self.named()
+        else:
+            raise ScanClauseError(f"Expected a field or indicator, got {value!r}")
+        return ('shift', offset, node) if offset else node
+
+    def named(self):
+        for length in range(_LONGEST_NAME, 0, -1):
+            words = [self.peek(index) for index in range(length)]
+            if all(token[0] == 'word' for token in words):
+                name = ' '.join(token[1] for token in words)
+                if name in FUNCTIONS or (length == 1 and name in ('count',) + FIELDS):
+                    self.position += length
+                    break
+        else:
+            raise ScanClauseError(f"{self.peek()[1]!r} is not supported locally")
+        if name in FIELDS:
+            return ('field', name)
+        if name == 'count':
+            return self.count()
+        expressions, integers, expression_first = FUNCTIONS[name]
+        self.expect('op', '(')
+        args = []
+        while True:
+            args.append(self.disjunction())
+            if not self.accept('op', ','):
+                break
+        self.expect('op', ')')
+        if len(args) != expressions + integers:
+            raise ScanClauseError(f"{name}() takes {expressions + integers} arguments, got {len(args)}")
+        if not expression_first:
+            args = args[integers:] + args[:integers]
+        numbers = tuple(self._number(*arg) for arg in args)
+        exprs, params = numbers[:expressions], numbers[expressions:]
+        for param in params:
+            if param[0] != 'const' or param[1] <= 0:
+                raise ScanClauseError(f"{name}() periods must be positive numbers")
+        return ('call', name, exprs, tuple(param[1] for param in params))
+
+    def count(self):
+        self.expect('op', '(')
+        period = self._integer(self.expect('number'))
+        self.expect('op', ',')
+        self.expect('number')
+        self.expect('word', 'where')
+        condition = self.boolean()
+        self.expect('op', ')')
+        return ('count', period, condition)
+
+    @staticmethod
+    def _integer(value):
+        number = float(value)
+        if number != int(number) or number < 0:
+            raise ScanClauseError(f"Expected a whole number, got {value}")
+        return int(number)
+
+    @staticmethod
+    def _number(kind, node):
+        if kind != 'num':
+            raise ScanClauseError("Expected a value, got a condition")
+        return node
+
+    @staticmethod
+    def _condition(kind, node):
+        if kind != 'bool':
+            raise ScanClauseError("Expected a condition, got a value")
+        return node
+
+
+@lru_cache(maxsize=1024)
+def compile_clause(scan_clause):
+    """
+    Parse a scan clause into its expression tree; raises ScanClauseError.
+    """
+    return _Parser(tokenize(scan_clause)).parse()
+
+
+# ---------------------------------------------------------------------------
+# Array kernels: (symbols x dates) float arrays, NaN where undefined
+# ---------------------------------------------------------------------------
+
+def _lag(values, periods):
+    if periods == 0 or np.ndim(values) == 0:
+        return values
+    shifted = np.full(values.shape, False if values.dtype == bool else np.nan, dtype=values.dtype)
+    if periods < values.shape[1]:
+        shifted[:, periods:] = values[:, :-periods]
+    return shifted
+
+
+def _rolling_sum(values, period):
+    result = np.full(values.shape, np.nan)
+    if period > values.shape[1]:
+        return result
+    valid = ~np.isnan(values)
+    zero = np.zeros((values.shape[0], 1))
+    sums = np.concatenate([zero, np.cumsum(np.where(valid, values, 0.0), axis=1)], axis=1)
+    counts = np.concatenate([zero, np.cumsum(valid, axis=1)], axis=1)
+    window_sums = sums[:, period:] - sums[:, :-period]
+    complete = (counts[:, period:] - counts[:, :-period]) == period
+    result[:, period - 1:] = np.where(complete, window_sums, np.nan)
+    return result
+
+
+def _rolling(values, period, combine):
+    """
+    Fold each `period`-date window with a binary ufunc (np.maximum, np.minimum), one
+    whole-array step per date in the window. NaN anywhere in a window gives NaN.
+    """
+    result = np.full(values.shape, np.nan)
+    length = values.shape[1] - period + 1
+    if length > 0:
+        window = values[:, :length].copy()
+        for offset in range(1, period):
+            combine(window, values[:, offset:offset + length], out=window)
+        result[:, period - 1:] = window
+    return result
+
+
+def _smooth(values, alpha):
+    """
+    Exponential smoothing along dates, seeded with each symbol's first value. Missing
+    candles are skipped (and stay NaN in the result).
+    """
+    # One contiguous row per date, so each step is a vector operation over all symbols
+    dates = np.ascontiguousarray(values.T)
+    result = np.empty_like(dates)
+    state = np.full(dates.shape[1], np.nan)
+    for index, current in enumerate(dates):
+        np.copyto(state, current, where=np.isnan(state))
+        np.add(state, alpha * (current - state), out=state, where=~np.isnan(current))
+        result[index] = state
+    result[np.isnan(dates)] = np.nan
+    return result.T
+
+
+def _sma(values, period):
+    return _rolling_sum(values, period) / period
+
+
+def _ema(values, period):
+    return _smooth(values, 2.0 / (period + 1))
+
+
+def _wma(values, period):
+    result = np.full(values.shape, np.nan)
+    length = values.shape[1] - period + 1
+    if length > 0:
+        window = np.zeros((values.shape[0], length))
+        for offset in range(period):
+            window += (offset + 1) * values[:, offset:offset + length]
+        result[:, period - 1:] = window / (period * (period + 1) / 2)
+    return result
+
+
+def _rsi(close, period):
+    change = close - _lag(close, 1)
+    gains = _smooth(np.where(np.isnan(change), np.nan, np.maximum(change, 0.0)), 1.0 / period)
+    losses = _smooth(np.where(np.isnan(change), np.nan, np.maximum(-change, 0.0)), 1.0 / period)
+    return np.where(losses == 0, np.where(np.isnan(gains), np.nan, 100.0), 100.0 - 100.0 / (1.0 + gains / losses))
+
+
+def _atr(high, low, close, period):
+    previous = _lag(close, 1)
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+    return _smooth(true_range, 1.0 / period)
+
+
+def _macd(close, slow, fast, signal):
+    line = _ema(close, int(fast)) - _ema(close, int(slow))
+    signal_line = _ema(line, int(signal))
+    return line, signal_line
+
+
+class _Evaluation:
+    """
+    Evaluates expression trees over a panel. value(node, width) is the node's series over
+    the last `width` dates; each node asks its children for just the extra history it
+    needs (a 20-day sma of a field reads 20 + width - 1 dates), so a clause only touches
+    the tail of the panel.
+    """
+
+    def __init__(self, panel):
+        self.panel = panel
+        self.memo = {}
+
+    def value(self, node, width):
+        key = (node, width)
+        result = self.memo.get(key)
+        if result is None:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result = self.memo[key] = getattr(self, f'_{node[0]}')(node, width)
+        return result
+
+    def series(self, node, width):
+        """
+        value() broadcast to a (symbols x width) array.
+        """
+        value = self.value(node, width)
+        if np.ndim(value):
+            return value
+        return np.full((len(self.panel.symbols), width), value, dtype=np.asarray(value).dtype)
+
+    def field(self, name, width):
+        values = self.panel.fields[name]
+        if width <= values.shape[1]:
+            return values[:, values.shape[1] - width:]
+        # Not enough history: pad the front so the latest date stays in the last column
+        return np.concatenate([np.full((values.shape[0], width - values.shape[1]), np.nan), values], axis=1)
+
+    def _const(self, node, width):
+        return node[1]
+
+    def _field(self, node, width):
+        return self.field(node[1], width)
+
+    def _shift(self, node, width):
+        value = self.value(node[2], width + node[1])
+        return value[:, :width] if np.ndim(value) else value
+
+    def _arith(self, node, width):
+        left, right = self.value(node[2], width), self.value(node[3], width)
+        if node[1] == '+':
+            return left + right
+        if node[1] == '-':
+            return left - right
+        if node[1] == '*':
+            return left * right
+        return left / right
+
+    def _cmp(self, node, width):
+        left, right = self.value(node[2], width), self.value(node[3], width)
+        return {
+            '>': np.greater, '>=': np.greater_equal, '<': np.less,
+            '<=': np.less_equal, '=': np.equal, '!=': np.not_equal,
+        }[node[1]](left, right)
+
+    def _cross(self, node, width):
+        left, right = self.series(node[2], width + 1), self.series(node[3], width + 1)
+        if node[1] == 'above':
+            return (left[:, 1:] > right[:, 1:]) & (left[:, :-1] <= right[:, :-1])
+        return (left[:, 1:] < right[:, 1:]) & (left[:, :-1] >= right[:, :-1])
+
+    def _and(self, node, width):
+        return np.logical_and(self.value(node[1], width), self.value(node[2], width))
+
+    def _or(self, node, width):
+        return np.logical_or(self.value(node[1], width), self.value(node[2], width))
+
+    def _not(self, node, width):
+        return np.logical_not(self.value(node[1], width))
+
+    def _segment(self, node, width):
+        return self.value(node[2], width)
+
+    def _count(self, node, width):
+        period = node[1]
+        condition = self.series(node[2], width + period - 1).astype(np.float64)
+        return _rolling_sum(condition, period)[:, -width:]
+
+    def _call(self, node, width):
+        name, exprs, params = node[1], node[2], node[3]
+        period = int(params[0]) if params else None
+
+        def arg(history):
+            return self.series(exprs[0], width + history)
+
+        if name == 'abs':
+            return np.abs(self.value(exprs[0], width))
+        if name in ('sma', 'avg'):
+            result = _sma(arg(period - 1), period)
+        elif name == 'ema':
+            result = _ema(arg(EMA_WARMUP * period), period)
+        elif name == 'wma':
+            result = _wma(arg(period - 1), period)
+        elif name == 'max':
+            result = _rolling(arg(period - 1), period, np.maximum)
+        elif name == 'min':
+            result = _rolling(arg(period - 1), period, np.minimum)
+        elif name == 'rsi':
+            result = _rsi(self.field('close', width + WILDER_WARMUP * period + 1), period)
+        elif name == 'atr':
+            history = width + WILDER_WARMUP * period + 1
+            result = _atr(
+                self.field('high', history), self.field('low', history), self.field('close', history), period
+            )
+        elif name.endswith('bollinger band'):
+            close = self.field('close', width + period - 1)
+            mean = _sma(close, period)
+            deviation = np.sqrt(np.maximum(_sma(close ** 2, period) - mean ** 2, 0.0))
+            result = mean + deviation * params[1] if name.startswith('upper') else mean - deviation * params[1]
+        else:
+            slow, fast, signal = (int(param) for param in params)
+            line, signal_line = _macd(self.field('close', width + EMA_WARMUP * (max(slow, fast) + signal)), slow, fast, signal)
+            result = line if name == 'macd line' else signal_line if name == 'macd signal' else line - signal_line
+        return result[:, -width:]
+
+    def matches(self, node):
+        """
+        Boolean mask over symbols: the node's value at the latest date.
+        """
+        result = self.value(node, 1)
+        if np.ndim(result) == 0:
+            return np.full(len(self.panel.symbols), bool(result))
+        return result[:, -1]
+
+
+def evaluate(scan_clause, panel):
+    """
+    Symbols of the panel that match a scan clause at its latest date, as
+    [{"symbol", "price"}, ...] with the latest close, like Chartink's results.
+    """
+    return evaluate_many([scan_clause], panel)[0]
+
+
+def evaluate_many(scan_clauses, panel):
+    """
+    Evaluate several clauses in one pass over the panel, computing shared
+    sub-expressions once. Returns one result list per clause, in order; raises
+    ScanClauseError if any clause cannot be compiled.
+    """
+    nodes = [compile_clause(scan_clause) for scan_clause in scan_clauses]
+    if not nodes or not len(panel.dates):
+        return [[] for _ in nodes]
+    evaluation = _Evaluation(panel)
+    close = panel.fields['close'][:, -1]
+    results = []
+    for node in nodes:
+        mask = evaluation.matches(node) & ~np.isnan(close)
+        results.append([
+            {"symbol": panel.symbols[index], "price": float(close[index])} for index in np.flatnonzero(mask)
+        ])
+    return results
+
+
+def evaluate_history(scan_clause, panel):
+    """
+    Whether the clause matched each symbol at the close of each date of the panel, as a
+    (symbols x dates) boolean array (False where there is no candle). Used by backtests.
+    """
+    node = compile_clause(scan_clause)
+    matched = _Evaluation(panel).series(node, len(panel.dates))
+    return np.asarray(matched, dtype=bool) & ~np.isnan(panel.fields['close'])
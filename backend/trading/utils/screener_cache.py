@@ -0,0 +1,225 @@
+"""
+Per-process cache of Chartink screener results.
+
+Results are keyed by a hash of the canonical scan clause (whitespace collapsed), so
+screeners that share a clause share an entry and editing a clause never serves the
+old results. An entry lives until the candle the clause looks at closes, e.g. the
+next 15:30 IST close for daily clauses or the next 15-minute boundary for
+"15 minute" ones, or until the next 09:15 open if that comes first. Then it waits
+SCREENER_CACHE_CLOSE_GRACE more seconds for Chartink to publish the closed candle.
+Concurrent misses for the same clause share one Chartink call, streamed ones included
+(see stream()). Expired entries are kept (LRU bounded) and served as stale results if
+Chartink fails.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+
+from .market_calendar import next_candle_close, next_market_open, now_ist, scan_timeframe
+
+logger = logging.getLogger('trading')
+
+ScreenerResult = namedtuple('ScreenerResult', 'stocks fetched_at expires_at cached stale')
+
+
+def canonical_clause(scan_clause):
+    clause = re.sub(r'\s+', ' ', scan_clause.strip())
+    return re.sub(r'\s*([(),\[\]])\s*', r'\1', clause)
+
+
+def clause_key(scan_clause):
+    return hashlib.sha256(canonical_clause(scan_clause).encode()).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # The owner stopped before the fetch finished (a streaming client went away)
+        self.abandoned = False
+
+
+class ScreenerCache:
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or settings.SCREENER_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()  # clause key -> (fetched_at, expires_at, stocks), unix times
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(('hits', 'misses', 'coalesced', 'refreshes', 'errors', 'stale_served'), 0)
+
+    @staticmethod
+    def expiry_for(scan_clause, moment=None):
+        """
+        Unix time at which results for the clause fetched at `moment` go stale: the next
+        candle close or session open, whichever is first, plus the close grace.
+        """
+        moment = moment or now_ist()
+        boundary = min(next_candle_close(scan_timeframe(scan_clause), moment), next_market_open(moment))
+        return (boundary + timedelta(seconds=settings.SCREENER_CACHE_CLOSE_GRACE)).timestamp()
+
+    def _store(self, key, stocks, fetched_at, expires_at):
+        self._entries[key] = (fetched_at, expires_at, stocks)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _claim(self, key, refresh):
+        """
+        (cached ScreenerResult, None, False) on a hit, else (None, flight, True if the
+        caller owns the flight and must fetch).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not refresh and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return ScreenerResult(entry[2], entry[0], entry[1], cached=True, stale=False), None, False
+            flight = self._flights.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._flights[key] = _Flight()
+                self._stats['refreshes' if refresh else 'misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+            return None, flight, owner
+
+    def _outcome(self, key, flight, owner):
+        """
+        The result of a finished flight, or the stale entry if it failed.
+        """
+        if flight.error is None:
+            return flight.result._replace(cached=not owner)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                raise flight.error
+            self._stats['stale_served'] += 1
+        logger.warning(f"Serving stale screener results after Chartink error: {flight.error}")
+        return ScreenerResult(entry[2], entry[0], entry[1], cached=True, stale=True)
+
+    def get(self, scan_clause, fetch, refresh=False):
+        """
+        Results for a scan clause. `fetch(scan_clause)` is called on a miss (or with
+        refresh=True) and must raise on failure. Returns a ScreenerResult.
+        """
+        key = clause_key(scan_clause)
+        while True:
+            cached, flight, owner = self._claim(key, refresh)
+            if cached is not None:
+                return cached
+            if owner:
+                self._run(key, scan_clause, fetch, flight)
+            else:
+                flight.done.wait()
+                if flight.abandoned:
+                    continue
+            return self._outcome(key, flight, owner)
+
+    def stream(self, scan_clause, iter_fetch, refresh=False, record=None):
+        """
+        Generator version of get() for streaming responses: yields record(stock) for every
+        stock and returns the ScreenerResult, so callers use `result = yield from ...`.
+
+        The caller that owns the flight yields stocks as `iter_fetch(scan_clause)` produces
+        them; concurrent callers (streaming or not) wait for its result. If the owner fails
+        after yielding stocks the error is raised, since stale results cannot follow a
+        partial list; if it is closed mid-stream, the waiters start a new flight.
+        """
+        record = record or (lambda stock: stock)
+        key = clause_key(scan_clause)
+        while True:
+            result, flight, owner = self._claim(key, refresh)
+            if result is not None:
+                break
+            if not owner:
+                flight.done.wait()
+                if flight.abandoned:
+                    continue
+                result = self._outcome(key, flight, owner)
+                break
+
+            stocks = []
+            try:
+                for stock in iter_fetch(scan_clause):
+                    stocks.append(stock)
+                    yield record(stock)
+                flight.result = ScreenerResult(stocks, time.time(), self.expiry_for(scan_clause), cached=False, stale=False)
+            except Exception as e:
+                flight.error = e
+            finally:
+                flight.abandoned = flight.result is None and flight.error is None
+                self._finish(key, flight)
+            if stocks and flight.error is not None:
+                raise flight.error
+            result = self._outcome(key, flight, owner)
+            if result.stale:
+                break
+            return result
+
+        for stock in result.stocks:
+            yield record(stock)
+        return result
+
+    def _run(self, key, scan_clause, fetch, flight):
+        try:
+            stocks = fetch(scan_clause)
+            fetched_at = time.time()
+            flight.result = ScreenerResult(stocks, fetched_at, self.expiry_for(scan_clause), cached=False, stale=False)
+        except Exception as e:
+            flight.error = e
+        self._finish(key, flight)
+
+    def _finish(self, key, flight):
+        with self._lock:
+            del self._flights[key]
+            if flight.result is not None:
+                self._store(key, flight.result.stocks, flight.result.fetched_at, flight.result.expires_at)
+            elif flight.error is not None:
+                self._stats['errors'] += 1
+        flight.done.set()
+
+    def peek(self, scan_clause):
+        """
+        The unexpired ScreenerResult for a clause, or None; never fetches.
+        """
+        with self._lock:
+            entry = self._entries.get(clause_key(scan_clause))
+        if entry is None or entry[1] <= time.time():
+            return None
+        return ScreenerResult(entry[2], entry[0], entry[1], cached=True, stale=False)
+
+    def put(self, scan_clause, stocks, fetched_at=None, expires_at=None):
+        """
+        Store results fetched elsewhere (the screener scheduler, another process's run),
+        unless the cache already holds newer ones.
+        """
+        key = clause_key(scan_clause)
+        fetched_at = fetched_at or time.time()
+        expires_at = expires_at or self.expiry_for(scan_clause)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < fetched_at:
+                self._store(key, stocks, fetched_at, expires_at)
+
+    def invalidate(self, scan_clause=None):
+        with self._lock:
+            if scan_clause is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(clause_key(scan_clause), None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({'size': len(self._entries), 'max_entries': self.max_entries})
+        return stats
+
+
+screener_cache = ScreenerCache()
@@ -0,0 +1,131 @@
+"""
+What changed between screener runs.
+
+Each successful ScreenerRun stores its delta from the screener's previous successful
+run: the symbols that entered (with the price they entered at) and the symbols that
+exited. Only the newest run keeps the full symbol list and prices, which /api/stocks
+serves. When a newer run is saved, the older one is compacted down to its delta, so
+history costs a few symbols per run instead of the whole result set.
+"""
+import logging
+
+from django.db.models import OuterRef, Subquery
+
+from ..models.screener import Screener
+from ..models.screener_run import ScreenerRun
+
+logger = logging.getLogger('trading')
+
+DEFAULT_CHANGES_LIMIT = 500
+
+
+def diff_symbols(previous_symbols, prices):
+    """
+    ({symbol: price} that entered, sorted [symbol] that exited) going from
+    previous_symbols to the symbols in prices.
+    """
+    previous = set(previous_symbols)
+    current = set(prices)
+    entered = {symbol: prices[symbol] for symbol in sorted(current - previous)}
+    return entered, sorted(previous - current)
+
+
+def apply_deltas(runs):
+    """
+    Fill entered/exited/count/clause_changed on unsaved successful runs from each
+    screener's newest saved successful run. Returns the ids of those previous runs, to
+    pass to compact_runs() once the new runs are saved.
+    """
+    if not runs:
+        return []
+    latest = ScreenerRun.objects.filter(screener=OuterRef('pk'), error__isnull=True).order_by('-ran_at')
+    previous_ids = dict(
+        Screener.objects.filter(screener_name__in=[run.screener_id for run in runs])
+        .annotate(previous_id=Subquery(latest.values('pk')[:1]))
+        .values_list('screener_name', 'previous_id')
+    )
+    previous_runs = ScreenerRun.objects.in_bulk([pk for pk in previous_ids.values() if pk])
+
+    for run in runs:
+        previous = previous_runs.get(previous_ids.get(run.screener_id))
+        run.count = len(run.symbols)
+        run.entered, run.exited = diff_symbols(previous.symbols if previous else [], run.prices)
+        run.clause_changed = previous is not None and previous.clause_hash != run.clause_hash
+    return list(previous_runs)
+
+
+def compact_runs(run_ids):
+    """
+    Drop the full results of superseded runs, keeping their deltas.
+    """
+    if run_ids:
+        ScreenerRun.objects.filter(pk__in=run_ids).update(symbols=[], prices={})
+
+
+def net_changes(runs):
+    """
+    Net effect of consecutive runs (oldest first): a symbol that entered and exited again
+    is left out, and one that exited and came back is neither entered nor exited.
+    """
+    entered = {}
+    exited = set()
+    for run in runs:
+        for symbol in run.exited:
+            if symbol in entered:
+                del entered[symbol]
+            else:
+                exited.add(symbol)
+        for symbol, price in run.entered.items():
+            if symbol in exited:
+                exited.discard(symbol)
+            else:
+                entered[symbol] = price
+    return entered, sorted(exited)
+
+
+def screener_changes(screener_name, since=None, limit=None):
+    """
+    Deltas of a screener's successful runs after `since` (an aware datetime), oldest
+    first, or of its latest run if since is None.
+
+    Returns:
+        dict: {
+            "screener_name", "count" (symbols in the latest run), "latest_run_at",
+            "entered": {symbol: price}, "exited": [symbol]  (net over all the runs),
+            "runs": [{"ran_at", "entered", "exited", "count", "clause_changed"}, ...]
+                (only runs that changed something),
+            "truncated": true if more than `limit` runs (at most 500) matched,
+        }
+    """
+    limit = max(1, min(limit or DEFAULT_CHANGES_LIMIT, DEFAULT_CHANGES_LIMIT))
+    runs = ScreenerRun.objects.filter(screener_id=screener_name, error__isnull=True).only(
+        'ran_at', 'entered', 'exited', 'count', 'clause_changed'
+    )
+    if since is None:
+        runs = list(runs.order_by('-ran_at')[:1])
+        truncated = False
+    else:
+        runs = list(runs.filter(ran_at__gt=since).order_by('-ran_at')[:limit + 1])
+        truncated = len(runs) > limit
+        runs = runs[:limit][::-1]
+
+    entered, exited = net_changes(runs)
+    latest = runs[-1] if runs else None
+    return {
+        "screener_name": screener_name,
+        "count": latest.count if latest else None,
+        "latest_run_at": latest.ran_at.isoformat() if latest else None,
+        "entered": entered,
+        "exited": exited,
+        "runs": [
+            {
+                "ran_at": run.ran_at.isoformat(),
+                "entered": run.entered,
+                "exited": run.exited,
+                "count": run.count,
+                "clause_changed": run.clause_changed,
+            }
+            for run in runs if run.entered or run.exited or run.clause_changed
+        ],
+        "truncated": truncated,
+    }
@@ -0,0 +1,137 @@
+"""
+Scheduled screener runs.
+
+Every stored Screener is run again once the candle its scan clause looks at has closed
+(next_candle_close + SCREENER_CACHE_CLOSE_GRACE) and once at each 09:15 IST open, so the
+results are ready before users ask for them. Each run is saved as a ScreenerRun
+(latency, expiry, and the symbols that entered or exited since the previous run; see
+screener_changes) and sets Screener.last_run. It is also put in this process's
+screener cache, and /api/stocks in other processes loads it from the table.
+
+A screener is due when it has no successful run of its current scan clause, or its last
+one has expired. After a failed run it is retried after SCREENER_SCHEDULER_RETRY_DELAY
+seconds.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from ..models.screener import Screener
+from ..models.screener_run import ScreenerRun
+from .chartink_screener import run_scan_clause
+from .market_calendar import IST
+from .screener_cache import clause_key, screener_cache
+from .screener_changes import apply_deltas, compact_runs
+
+logger = logging.getLogger('trading')
+
+
+def run_expiry(scan_clause, ran_at):
+    """
+    When results fetched at `ran_at` stop being current (see ScreenerCache.expiry_for).
+    """
+    return datetime.fromtimestamp(screener_cache.expiry_for(scan_clause, ran_at.astimezone(IST)), tz=dt_timezone.utc)
+
+
+def due_screeners(now=None):
+    """
+    Screeners that need a run at `now`, as [(screener_name, scan_clause), ...].
+    """
+    now = now or timezone.now()
+    runs = ScreenerRun.objects.filter(screener=OuterRef('pk')).order_by('-ran_at')
+    screeners = Screener.objects.annotate(
+        last_expires_at=Subquery(runs.filter(error__isnull=True).values('expires_at')[:1]),
+        last_clause_hash=Subquery(runs.filter(error__isnull=True).values('clause_hash')[:1]),
+        last_failed_at=Subquery(runs.filter(error__isnull=False).values('ran_at')[:1]),
+        last_ran_at=Subquery(runs.values('ran_at')[:1]),
+    ).values_list('screener_name', 'scan_clause', 'last_expires_at', 'last_clause_hash', 'last_failed_at', 'last_ran_at')
+
+    due = []
+    retry_after = timedelta(seconds=settings.SCREENER_SCHEDULER_RETRY_DELAY)
+    for name, scan_clause, expires_at, last_hash, failed_at, ran_at in screeners:
+        if not scan_clause or not scan_clause.strip():
+            continue
+        current = last_hash == clause_key(scan_clause) and expires_at is not None and expires_at > now
+        if current:
+            continue
+        if failed_at is not None and failed_at == ran_at and now - failed_at < retry_after:
+            continue
+        due.append((name, scan_clause))
+    return due
+
+
+def _fetch(screener):
+    name, scan_clause = screener
+    started = time.monotonic()
+    try:
+        stocks, error = run_scan_clause(scan_clause, name), None
+    except Exception as e:
+        stocks, error = [], str(e)
+    return name, scan_clause, stocks, error, int((time.monotonic() - started) * 1000)
+
+
+def run_screeners(screeners, max_workers=None):
+    """
+    Run [(screener_name, scan_clause), ...] concurrently on Chartink, save a ScreenerRun
+    for each and cache the results. Returns the saved runs.
+    """
+    if not screeners:
+        return []
+    workers = min(max_workers or settings.CHARTINK_MAX_CONNECTIONS, len(screeners))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='screener-run') as executor:
+        fetched = list(executor.map(_fetch, screeners))
+
+    runs = []
+    for name, scan_clause, stocks, error, latency_ms in fetched:
+        ran_at = timezone.now()
+        run = ScreenerRun(
+            screener_id=name,
+            clause_hash=clause_key(scan_clause),
+            ran_at=ran_at,
+            latency_ms=latency_ms,
+            error=error,
+        )
+        if error is None:
+            run.expires_at = run_expiry(scan_clause, ran_at)
+            run.symbols = [stock["symbol"] for stock in stocks]
+            run.prices = {stock["symbol"]: stock["price"] for stock in stocks}
+            screener_cache.put(scan_clause, stocks, ran_at.timestamp(), run.expires_at.timestamp())
+        else:
+            logger.warning(f"Screener {name} failed after {latency_ms}ms: {error}")
+        runs.append(run)
+    with transaction.atomic():
+        superseded = apply_deltas([run for run in runs if run.error is None])
+        ScreenerRun.objects.bulk_create(runs)
+        compact_runs(superseded)
+
+    for run in runs:
+        if run.error is None:
+            logger.info(
+                f"Screener {run.screener_id}: {run.count} stocks (+{len(run.entered)} -{len(run.exited)}) in {run.latency_ms}ms"
+            )
+    succeeded = [run.screener_id for run in runs if run.error is None]
+    if succeeded:
+        Screener.objects.filter(screener_name__in=succeeded).update(last_run=timezone.localdate(timezone=IST))
+    return runs
+
+
+def run_due_screeners(now=None, force=False):
+    """
+    Run every screener that is due (or every screener with force=True). Returns the saved runs.
+    """
+    if force:
+        screeners = [
+            (name, scan_clause)
+            for name, scan_clause in Screener.objects.values_list('screener_name', 'scan_clause')
+            if scan_clause and scan_clause.strip()
+        ]
+    else:
+        screeners = due_screeners(now)
+    return run_screeners(screeners)
+
@@ -0,0 +1,66 @@
+"""
+Fill Trade.rsi and Trade.volume ("Yes" / "No") from the OHLCV store.
+
+rsi is "Yes" when TRADE_RSI_CLAUSE matches the stock on its entry date (by default
+RSI(14) above 60) and volume is "Yes" when TRADE_VOLUME_CLAUSE does (volume above 1.5x
+the previous 20-day average). Both clauses run on the local scan engine over the stored
+daily candles up to the entry date. Values the user typed are kept, and a field stays
+empty when the store has no candle for the stock on that date.
+"""
+import logging
+
+from django.conf import settings
+
+from .ohlcv_store import get_ohlcv_store
+from .scan_engine import ScanClauseError, evaluate_many
+
+logger = logging.getLogger('trading')
+
+INDICATOR_FIELDS = ('rsi', 'volume')
+
+
+def _clauses():
+    return {
+        'rsi': settings.TRADE_RSI_CLAUSE,
+        'volume': settings.TRADE_VOLUME_CLAUSE,
+    }
+
+
+def indicator_flags(stock, entry_date, fields=INDICATOR_FIELDS):
+    """
+    {field: "Yes" | "No"} for the stock on entry_date, or {} if the store has no daily
+    candle for it on that date.
+    """
+    clauses = {field: clause for field, clause in _clauses().items() if field in fields and clause}
+    symbol = str(stock).split(':')[-1].strip().upper()
+    if not clauses or not symbol:
+        return {}
+    try:
+        panel = get_ohlcv_store().panel([symbol], end=entry_date)
+    except ValueError:
+        return {}
+    if panel.latest_date != entry_date:
+        return {}
+    try:
+        results = evaluate_many(list(clauses.values()), panel)
+    except ScanClauseError as e:
+        logger.error(f"Trade indicator clause is not supported locally: {e}")
+        return {}
+    return {field: 'Yes' if matches else 'No' for field, matches in zip(clauses, results)}
+
+
+def autofill_indicators(data, instance=None):
+    """
+    Fill the empty rsi / volume of validated Trade data (merged over `instance` for
+    updates) from the OHLCV store. Returns data.
+    """
+    def current(field):
+        if field in data:
+            return data[field]
+        return getattr(instance, field, None)
+
+    stock, entry_date = current('stock'), current('entry_date')
+    missing = [field for field in INDICATOR_FIELDS if not current(field)]
+    if missing and stock and entry_date:
+        data.update(indicator_flags(stock, entry_date, missing))
+    return data
@@ -1,18 +1,63 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import Trade, GlobalParameters, User
+from .models import Trade, GlobalParameters, User, Screener
 from .serializers import TradeSerializer
 from .models import GlobalParameters
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
 import json
-from .utils.chartink_screener import fetch_chartink_screener
-from .utils.kite_transaction_manager import place_market_order, set_gtt_oco
+import math
+from .utils.chartink_screener import (
+    batch_screener_results, screener_results, stream_batch_screener_results, stream_screener_results,
+)
+from .utils.json_stream import ndjson_line
+from .utils.screener_changes import screener_changes
+from .utils.market_calendar import IST
+from .utils.kite_transaction_manager import place_market_order, set_gtt_oco, get_kite_client
+from .utils.quote_service import normalize_symbols
+from .utils.quote_cache import quote_cache
+from .utils.instrument_master import get_instrument_master
+from .utils.ohlcv_store import FIELDS as OHLCV_FIELDS, INTERVALS as OHLCV_INTERVALS, get_ohlcv_store
+from .utils.ltp_cache import get_ltp_table, get_symbol_ltp
+from .utils.bulk_orders import place_market_orders_bulk
+from .utils.bulk_gtt import arm_open_trades
+from .utils.gtt_reconciler import reconcile_user
+from .utils.portfolio_sync import sync_user
+from .utils.order_jobs import submit_order_job
+from .utils.gtt_watcher import handle_postback
+from .utils.idempotency import idempotent, mark_not_placed
+from .utils.circuit_breaker import BrokerUnavailable, breaker_states, order_not_placed
+from .utils.kite_client_pool import KiteSessionMissing
+from .utils.rate_limiter import RateLimitTimeout
+from .models import OrderJob
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime
+from django.conf import settings
+
+def _broker_unavailable(e):
+    """
+    503 for a Kite call that was never made: the circuit breaker is open or the rate
+    limiter wait ran out. Safe for the client to retry (with the same Idempotency-Key).
+    """
+    response = JsonResponse({"error": str(e)}, status=503)
+    response["Retry-After"] = str(max(1, math.ceil(getattr(e, "retry_after", None) or 1)))
+    return mark_not_placed(response)
+
+def _order_failed(e, error=None):
+    """
+    500 for a failed order request. Its Idempotency-Key is released only if nothing was
+    placed (no Kite session, or Kite rejected the order); after a timeout or a Kite 5xx
+    the order may exist, so the 500 is replayed to retries instead of ordering again.
+    """
+    response = JsonResponse({"error": error or str(e)}, status=500)
+    if isinstance(e, KiteSessionMissing) or order_not_placed(e):
+        mark_not_placed(response)
+    return response
 
 @api_view(['GET'])
 def health_check(request):
@@ -217,26 +262,231 @@ def global_parameters(request):
         except GlobalParameters.DoesNotExist:
             return Response({'error': 'Key not found.'}, status=status.HTTP_404_NOT_FOUND)
 
+def _flag(value):
+    return (value or '').lower() in ('1', 'true', 'yes')
+
+def _ndjson_response(records):
+    response = StreamingHttpResponse((ndjson_line(record) for record in records), content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    # Ask nginx-style proxies not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @csrf_exempt
 @require_GET
 def stocks_by_screener(request):
     """
-    GET /stocks?screener_name=...  -> returns list of stocks for the screener_name
+    GET /stocks?screener_name=...&refresh=1  -> returns list of stocks for the screener_name
+    Results are cached until the screener's next candle closes, and the latest run saved by
+    the screener scheduler is served without calling Chartink; the response says whether
+    they came from the cache ("cached", "stale") and how old they are ("age_seconds").
+    refresh=1 bypasses the cache.
+    stream=1 returns newline-delimited JSON instead, one {"type": "stock", ...} record per
+    stock as Chartink's response is parsed, then a {"type": "screener", ...} record with
+    the cache fields (or {"type": "error", ...})
     """
     screener_name = request.GET.get('screener_name')
     if not screener_name:
         return JsonResponse({'error': 'Missing screener_name parameter'}, status=400)
     try:
-        stocks = fetch_chartink_screener(screener_name)
-        return JsonResponse({'stocks': stocks}, status=200)
+        refresh = _flag(request.GET.get('refresh'))
+        if _flag(request.GET.get('stream')):
+            return _ndjson_response(stream_screener_results(screener_name, refresh=refresh))
+        return JsonResponse(screener_results(screener_name, refresh=refresh), status=200)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_GET
+def stocks_by_screener_batch(request):
+    """
+    GET /stocks/batch?screener_name=a&screener_name=b&refresh=1  -> runs the screeners
+    concurrently and merges their stocks; each symbol lists the screeners that matched it
+    ("screeners") and "overlap" counts the symbols every pair of screeners has in common.
+    screener_name may also be comma separated: ?screener_name=a,b
+    stream=1 returns newline-delimited JSON, sending each screener's stocks as soon as it
+    finishes and a final {"type": "summary", "overlap", "matched_by"} record
+    """
+    screener_names = [
+        name.strip() for value in request.GET.getlist('screener_name') for name in value.split(',') if name.strip()
+    ]
+    if not screener_names:
+        return JsonResponse({'error': 'Missing screener_name parameter'}, status=400)
+    try:
+        refresh = _flag(request.GET.get('refresh'))
+        if _flag(request.GET.get('stream')):
+            return _ndjson_response(stream_batch_screener_results(screener_names, refresh=refresh))
+        return JsonResponse(batch_screener_results(screener_names, refresh=refresh), status=200)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_GET
+def screener_run_changes(request, screener_name):
+    """
+    GET /screener/<screener_name>/changes?since=2024-06-03T09:15&limit=100  -> symbols that
+    entered/exited the screener in scheduled runs after `since` (ISO datetime, IST if no
+    offset, or unix seconds), net and per run; without since, the latest run's changes
+    """
+    if not Screener.objects.filter(screener_name=screener_name).exists():
+        return JsonResponse({'error': 'screener is not present. Please verify the screener name'}, status=404)
+    since = request.GET.get('since')
+    if since:
+        try:
+            try:
+                since = datetime.fromtimestamp(float(since), tz=IST)
+            except ValueError:
+                since = parse_datetime(since)
+        except (ValueError, OverflowError, OSError):
+            # Out-of-range timestamps (inf, 1e20) and well-formed but invalid dates (month 13)
+            since = None
+        if since is None:
+            return JsonResponse({'error': 'since must be an ISO datetime or unix seconds'}, status=400)
+        if timezone.is_naive(since):
+            since = since.replace(tzinfo=IST)
+    try:
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    try:
+        return JsonResponse(screener_changes(screener_name, since=since or None, limit=limit), status=200)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_GET
+def quotes(request):
+    """
+    GET /quotes?user_id=...&symbols=INFY,TCS  -> last prices for many symbols in one Kite call
+    (symbols quoted within QUOTE_CACHE_TTL are served from the quote cache)
+    symbols may also be repeated: ?symbols=INFY&symbols=TCS
+    """
+    user_id = request.GET.get('user_id')
+    symbols = normalize_symbols(
+        symbol for value in request.GET.getlist('symbols') for symbol in value.split(',')
+    )
+    if not user_id or not symbols:
+        return JsonResponse({'error': 'Missing user_id or symbols parameter'}, status=400)
+    try:
+        kite = get_kite_client(user_id)
+        prices = quote_cache.get_many(kite, symbols)
+        missing = [symbol for symbol in symbols if symbol not in prices]
+        return JsonResponse({'quotes': prices, 'missing': missing}, status=200)
+    except (BrokerUnavailable, RateLimitTimeout) as e:
+        return _broker_unavailable(e)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@csrf_exempt
+@require_GET
+def quote_cache_stats(request):
+    """
+    GET /quotes/cache-stats  -> hit/miss counters of the quote cache in the worker serving the request
+    """
+    return JsonResponse(quote_cache.stats(), status=200)
+
+@csrf_exempt
+@require_GET
+def kite_breakers(request):
+    """
+    GET /kite/breakers?user_id=...  (user_id optional)
+    Circuit breaker state per user and Kite endpoint class in this process.
+    """
+    return JsonResponse({"breakers": breaker_states(request.GET.get("user_id"))}, status=200)
+
+@csrf_exempt
+@require_GET
+def ltp(request):
+    """
+    GET /ltp?symbols=INFY,TCS  -> streamed last prices from the shared LTP table (no Kite call)
+    Symbols the stream does not cover are listed in "missing"; use /quotes for those.
+    """
+    symbols = normalize_symbols(
+        symbol for value in request.GET.getlist('symbols') for symbol in value.split(',')
+    )
+    if not symbols:
+        return JsonResponse({'error': 'Missing symbols parameter'}, status=400)
+    table = get_ltp_table()
+    prices = {}
+    for symbol in symbols:
+        last_price = get_symbol_ltp(symbol)
+        if last_price is not None:
+            prices[symbol] = last_price
+    return JsonResponse({
+        'ltp': prices,
+        'missing': [symbol for symbol in symbols if symbol not in prices],
+        'streaming': table is not None and table.is_live()
+    }, status=200)
+
+@csrf_exempt
+@require_GET
+def search_instruments(request):
+    """
+    GET /instruments/search?q=INF&exchange=NSE&limit=20  -> symbol autocomplete from the local master
+    """
+    prefix = request.GET.get('q', '').strip()
+    if not prefix:
+        return JsonResponse({'error': 'Missing q parameter'}, status=400)
+    master = get_instrument_master()
+    if master is None:
+        return JsonResponse({'error': 'Instrument master not available. Run refresh_instruments.'}, status=503)
+    try:
+        limit = min(int(request.GET.get('limit', 20)), 100)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    results = master.search_prefix(prefix, exchange=request.GET.get('exchange'), limit=limit)
+    return JsonResponse({'instruments': results, 'version': master.version}, status=200)
+
+# Most candles one /ohlcv request returns (the latest ones of the range)
+MAX_OHLCV_CANDLES = 5000
+
+@csrf_exempt
+@require_GET
+def ohlcv(request, symbol):
+    """
+    GET /ohlcv/<symbol>?interval=day&from=2024-01-01&to=2024-06-30&limit=500  -> stored
+    candles for charts, as columns: {"time": [...], "open": [...], ..., "volume": [...]}.
+    from/to are dates or ISO datetimes (IST); limit keeps the latest candles of the range.
+    """
+    interval = request.GET.get('interval', 'day')
+    if interval not in OHLCV_INTERVALS:
+        return JsonResponse({'error': f"interval must be one of {', '.join(OHLCV_INTERVALS)}"}, status=400)
+    bounds = {}
+    for name in ('from', 'to'):
+        value = request.GET.get(name)
+        if value:
+            try:
+                bounds[name] = parse_date(value) or parse_datetime(value)
+            except ValueError:
+                bounds[name] = None
+            if bounds[name] is None:
+                return JsonResponse({'error': f'{name} must be a date or ISO datetime'}, status=400)
+    try:
+        limit = min(int(request.GET.get('limit', 500)), MAX_OHLCV_CANDLES)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    try:
+        candles = get_ohlcv_store().candles(symbol, interval, start=bounds.get('from'), end=bounds.get('to'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    candles = candles[-limit:] if limit > 0 else candles[:0]
+    unit = 'D' if interval == 'day' else 's'
+    return JsonResponse({
+        'symbol': symbol.upper(),
+        'interval': interval,
+        'count': len(candles),
+        'time': [str(time) for time in candles['time'].astype(f'M8[{unit}]')],
+        **{field: candles[field].tolist() for field in OHLCV_FIELDS},
+    }, status=200)
+
 @csrf_exempt
 @require_POST
+@idempotent
 def buy_stock(request):
     """
     POST /stock/buy with JSON: {"user_id": ..., "stock_name": ..., "quantity": ...}
+    Send an Idempotency-Key header and reuse it on retries: a repeated key returns the
+    original response without placing the order again.
     """
     try:
         data = json.loads(request.body.decode())
@@ -245,13 +495,212 @@ def buy_stock(request):
         quantity = data.get("quantity")
         if not user_id or not stock_name or not quantity:
             return JsonResponse({"error": "Missing required parameters"}, status=400)
-        place_market_order(user_id, stock_name, quantity, "BUY")
-        return JsonResponse({"message": f"Buy order placed for {stock_name}, quantity {quantity}"}, status=200)
+        order_id = place_market_order(user_id, stock_name, quantity, "BUY")
+        return JsonResponse({"message": f"Buy order placed for {stock_name}, quantity {quantity}", "order_id": order_id}, status=200)
+    except (BrokerUnavailable, RateLimitTimeout) as e:
+        return _broker_unavailable(e)
+    except Exception as e:
+        return _order_failed(e)
+
+@csrf_exempt
+@require_POST
+@idempotent
+def buy_stock_bulk(request):
+    """
+    POST /stock/buy/bulk with JSON: {"user_id": ..., "orders": [{"stock_name": ..., "quantity": ...}, ...]}
+    Orders are sent concurrently within Kite's orders-per-second limit; one result per order is returned.
+    """
+    try:
+        data = json.loads(request.body.decode())
+        user_id = data.get("user_id")
+        orders = data.get("orders")
+        if not user_id or not isinstance(orders, list) or not orders:
+            return JsonResponse({"error": "Missing required parameters. Required: user_id, orders"}, status=400)
+        if len(orders) > settings.BULK_ORDER_MAX_BASKET:
+            return JsonResponse({"error": f"At most {settings.BULK_ORDER_MAX_BASKET} orders per request"}, status=400)
+
+        results = [None] * len(orders)
+        valid = []
+        for index, order in enumerate(orders):
+            stock_name = order.get("stock_name") if isinstance(order, dict) else None
+            try:
+                quantity = int(order.get("quantity")) if isinstance(order, dict) else 0
+            except (ValueError, TypeError):
+                quantity = 0
+            if not stock_name or quantity <= 0:
+                results[index] = {"stock_name": stock_name, "status": "error", "error": "stock_name and a positive quantity are required"}
+            else:
+                valid.append((index, {"stock_name": stock_name, "quantity": quantity, "transaction_type": "BUY"}))
+
+        placed = place_market_orders_bulk(user_id, [order for _, order in valid])
+        for (index, _), result in zip(valid, placed):
+            results[index] = result
+
+        succeeded = sum(1 for result in results if result["status"] == "success")
+        return JsonResponse({
+            "message": f"{succeeded} of {len(results)} buy orders placed",
+            "placed": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results
+        }, status=200)
+    except (BrokerUnavailable, RateLimitTimeout) as e:
+        return _broker_unavailable(e)
+    except Exception as e:
+        return _order_failed(e)
+
+@csrf_exempt
+@require_POST
+@idempotent
+def submit_order(request):
+    """
+    POST /orders/jobs with JSON: {"user_id": ..., "kind": "market_buy"|"limit_with_gtt"|"gtt_oco", ...}
+    market_buy: stock_name, quantity
+    limit_with_gtt: stock_name, quantity, buy_price, stop_loss, target
+    gtt_oco: stock_name, quantity, stop_loss, target
+    Returns 202 with the job id; poll /jobs/<id> for progress.
+    """
+    try:
+        data = json.loads(request.body.decode())
+        user_id = data.get("user_id")
+        if not user_id:
+            return JsonResponse({"error": "Missing required parameter: user_id"}, status=400)
+        job = submit_order_job(user_id, data.get("kind"), data)
+        return JsonResponse({
+            "job_id": str(job.id),
+            "status": job.status,
+            "status_url": f"/api/jobs/{job.id}/"
+        }, status=202)
+    except ValueError as e:
+        return JsonResponse({"error": f"Validation error: {str(e)}"}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt
+@require_GET
+def job_status(request, job_id):
+    """
+    GET /jobs/<id>  -> current status, step and result of an order job
+    """
+    try:
+        job = OrderJob.objects.get(pk=job_id)
+    except OrderJob.DoesNotExist:
+        return JsonResponse({"error": "Job not found"}, status=404)
+    return JsonResponse({
+        "job_id": str(job.id),
+        "user_id": job.user_id,
+        "kind": job.kind,
+        "status": job.status,
+        "step": job.step,
+        "payload": job.payload,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }, status=200)
+
+@csrf_exempt
+@require_POST
+def kite_postback(request):
+    """
+    POST /kite/postback  <- Kite order postback (set as the app's postback URL)
+    Order updates for watched limit buys are applied immediately, so GTTs are
+    placed on fill without waiting for the next watcher poll.
+    """
+    try:
+        order = json.loads(request.body.decode())
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    try:
+        if not handle_postback(order):
+            return JsonResponse({"error": "Invalid checksum"}, status=403)
+        return JsonResponse({"status": "ok"}, status=200)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt
+@require_POST
+@idempotent
+def set_gtt_bulk(request):
+    """
+    POST /gtt/bulk with JSON: {"user_id": ..., "dry_run": false, "skip_protected": true}
+    Places an OCO GTT (slp/tgtp) for every open trade of the user and reports per trade.
+    """
+    try:
+        data = json.loads(request.body.decode())
+        user_id = data.get("user_id")
+        if not user_id:
+            return JsonResponse({"error": "Missing required parameter: user_id"}, status=400)
+        results = arm_open_trades(
+            user_id,
+            dry_run=bool(data.get("dry_run", False)),
+            skip_protected=bool(data.get("skip_protected", True))
+        )
+        counts = {}
+        for result in results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        return JsonResponse({
+            "message": f"Processed {len(results)} open trades",
+            "counts": counts,
+            "results": results
+        }, status=200)
+    except (BrokerUnavailable, RateLimitTimeout) as e:
+        return _broker_unavailable(e)
+    except Exception as e:
+        return _order_failed(e)
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def reconcile_gtts(request):
+    """
+    GET /gtt/reconcile?user_id=...  -> report only; nothing is saved
+    POST /gtt/reconcile with JSON: {"user_id": ..., "fix": false, "delete_stale": false}
+    Diffs the user's active GTTs against open trades: ok, unprotected, mismatched, stale.
+    POST also saves the trade <-> GTT links it finds.
+    """
+    try:
+        if request.method == "GET":
+            data = request.GET
+        else:
+            data = json.loads(request.body.decode())
+        user_id = data.get("user_id")
+        if not user_id:
+            return JsonResponse({"error": "Missing required parameter: user_id"}, status=400)
+        report = reconcile_user(
+            user_id,
+            fix=request.method == "POST" and bool(data.get("fix", False)),
+            delete_stale=request.method == "POST" and bool(data.get("delete_stale", False)),
+            save_links=request.method == "POST"
+        )
+        return JsonResponse(report, status=200)
+    except (BrokerUnavailable, RateLimitTimeout) as e:
+        return _broker_unavailable(e)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt
+@require_POST
+def sync_portfolio(request):
+    """
+    POST /portfolio/sync with JSON: {"user_id": ..., "full": false}
+    Upserts the user's Kite holdings and positions into Trade rows; closes synced trades
+    that were sold. A no-op (unchanged: true) if nothing moved since the last sync.
+    """
+    try:
+        data = json.loads(request.body.decode())
+        user_id = data.get("user_id")
+        if not user_id:
+            return JsonResponse({"error": "Missing required parameter: user_id"}, status=400)
+        report = sync_user(user_id, full=bool(data.get("full", False)))
+        return JsonResponse(report, status=200)
+    except (BrokerUnavailable, RateLimitTimeout) as e:
+        return _broker_unavailable(e)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
 @csrf_exempt
 @require_POST
+@idempotent
 def set_gtt(request):
     """
     POST /gtt with JSON: {
@@ -302,5 +751,7 @@ def set_gtt(request):
         
     except ValueError as e:
         return JsonResponse({"error": f"Validation error: {str(e)}"}, status=400)
+    except (BrokerUnavailable, RateLimitTimeout) as e:
+        return _broker_unavailable(e)
     except Exception as e:
-        return JsonResponse({"error": f"Failed to set GTT: {str(e)}"}, status=500)
+        return _order_failed(e, f"Failed to set GTT: {str(e)}")
@@ -49,6 +49,12 @@ import Brightness4Icon from "@mui/icons-material/Brightness4";
 import Brightness7Icon from "@mui/icons-material/Brightness7";
 import LogoutIcon from "@mui/icons-material/Logout";
 
+// Idempotency-Key for order requests; randomUUID needs a secure context (https or localhost)
+const newIdempotencyKey = () =>
+  (window.crypto && window.crypto.randomUUID)
+    ? window.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 const AppProvider = () => {
   const [drawerOpen, setDrawerOpen] = useState(false); // Drawer is collapsed (closed) by default
   const [darkMode, setDarkMode] = useState(false); // Theme state
@@ -404,12 +410,20 @@ const AppProvider = () => {
       stock_name: row.stock,
       quantity: row.sb && Number(row.sb) > 0 ? Number(row.sb) : 1
     };
+    // Clicking Buy again for the same row and quantity replays the first order instead of buying twice
+    const buyKey = row.buyKey || newIdempotencyKey();
+    if (!row.buyKey) {
+      // Kept on the row before sending, so a retry after a timeout reuses it
+      setEntries(prev => prev.map((r, i) => (i === idx ? { ...r, buyKey } : r)));
+    }
     try {
-      const response = await axios.post(getApiUrl('api/stock/buy'), payload);
+      const response = await axios.post(getApiUrl('api/stock/buy'), payload, {
+        headers: { 'Idempotency-Key': `${buyKey}:${payload.quantity}` }
+      });
       if (response.status === 200) {
         // Simulate DB save: set id to a dummy value to show Save button
         const updated = [...entries];
-        updated[idx] = { ...row, id: Date.now() };
+        updated[idx] = { ...row, id: Date.now(), buyKey };
         setEntries(updated);
         alert(`Buy order placed for ${row.stock}`);
       } else {
@@ -449,8 +463,14 @@ const AppProvider = () => {
       target: Number(row.tgtp)
     };
     
+    const gttKey = row.gttKey || newIdempotencyKey();
+    if (!row.gttKey) {
+      setEntries(prev => prev.map((r, i) => (i === idx ? { ...r, gttKey } : r)));
+    }
     try {
-      const response = await axios.post(getApiUrl('api/gtt/'), payload);
+      const response = await axios.post(getApiUrl('api/gtt/'), payload, {
+        headers: { 'Idempotency-Key': `${gttKey}:${payload.quantity}:${payload.stop_loss}:${payload.target}` }
+      });
       if (response.status === 200) {
         alert(`GTT order set successfully for ${row.stock}\nGTT ID: ${response.data.gtt_id}\nStop Loss: ${response.data.stop_loss}\nTarget: ${response.data.target}`);
       } else {